@@ -1,20 +1,116 @@
+import asyncio
 import os
 import time
 import re
-from typing import Dict, List, Optional
+from collections import OrderedDict
+from concurrent.futures import Executor
+from functools import partial
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
 from loguru import logger
 import fitz  # PyMuPDF
 
 from models import AgentConfig, AgentMessage
 from constants import (
+    MODEL_NAME,
     BASE_SYSTEM_PROMPT, 
     CLOSING_SYSTEM_PROMPT,
     SUPPORTED_REFERENCE_FORMATS, 
-    MAX_REFERENCE_LENGTH,
+    REFERENCE_TOKEN_BUDGET,
+    SYSTEM_PROMPT_CACHE_SIZE,
+    REFERENCE_RETRIEVAL_ENABLED,
+    REFERENCE_TOP_K,
+    REFERENCE_REDUCTION_MODE,
+    REFERENCE_READ_BLOCK_SIZE,
     ERROR_REFERENCE_LOADING
 )
-from utils.content_reducer import reduce_content
+from utils.content_reducer import REDUCER_VERSION, reduce_content, reduce_content_stream
+from utils.reference_cache import ReferenceCache
+from utils.reference_index import ReferenceIndex, build_reference_index
+from utils.token_budget import TokenBudgetManager, tokens_to_chars
+
+
+def extract_pdf_text(filepath: str) -> str:
+    """Extract text content from a PDF file"""
+    with fitz.open(filepath) as doc:
+        return "".join(page.get_text() for page in doc)
+
+
+def read_reference_file(filepath: str) -> str:
+    """Read the text of a supported reference file"""
+    if filepath.endswith(".pdf"):
+        return extract_pdf_text(filepath)
+    with open(filepath, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def iter_reference_file(filepath: str) -> Iterator[str]:
+    """Read the text of a supported reference file a page or block at a time"""
+    if filepath.endswith(".pdf"):
+        with fitz.open(filepath) as doc:
+            for page in doc:
+                yield page.get_text()
+        return
+    with open(filepath, "r", encoding="utf-8") as f:
+        yield from iter(lambda: f.read(REFERENCE_READ_BLOCK_SIZE), "")
+
+
+def format_reference_tags(filename: str) -> Tuple[str, str]:
+    """Opening and closing text wrapped around a reference, marking it as information only"""
+    return f"<ReferenceMaterials>\n <!--- From: '{filename}' --->\n ", "\n</ReferenceMaterials>"
+
+
+def iter_formatted_references(files: List[Tuple[str, str]]) -> Iterator[str]:
+    """
+    Yield the combined, formatted text of reference files piece by piece
+    
+    The pieces add up to the same text as combining the formatted references in full,
+    but only one page or block of a file is read at a time.
+    
+    Args:
+        files: Tuples of (filename, path) of the reference files
+    
+    Yields:
+        Consecutive pieces of the combined text
+    """
+    for index, (filename, filepath) in enumerate(files):
+        opening, closing = format_reference_tags(filename)
+        if index:
+            yield "\n\n"
+        yield opening
+        try:
+            yield from iter_reference_file(filepath)
+        except Exception as e:
+            logger.error(ERROR_REFERENCE_LOADING.format(str(e)))
+            yield f"[Error extracting content from {filename}]"
+        yield closing
+
+
+def reduce_reference_files(files: List[Tuple[str, str]], max_length: int) -> str:
+    """
+    Reduce reference files to max_length, reading them only until the budget is filled
+    
+    Memory use depends on max_length rather than on the size or number of the files.
+    
+    Args:
+        files: Tuples of (filename, path) of the reference files
+        max_length: Maximum length of the reduced content
+    
+    Returns:
+        Reduced reference content
+    """
+    pieces = iter_formatted_references(files)
+    try:
+        return reduce_content_stream(pieces, max_length)
+    finally:
+        pieces.close()
+
+
+def run_blocking(executor: Optional[Executor], func: Callable[..., Any], *args) -> Any:
+    """Call a function in the executor and wait for it, or call it directly without one"""
+    if executor is None:
+        return func(*args)
+    return executor.submit(func, *args).result()
 
 
 class Agent:
@@ -22,7 +118,14 @@ class Agent:
     Represents an AI agent with a specific configuration and reference materials
     """
     
-    def __init__(self, agent_id: str, config: AgentConfig, references_dir: str):
+    def __init__(
+        self,
+        agent_id: str,
+        config: AgentConfig,
+        references_dir: str,
+        reference_cache: Optional[ReferenceCache] = None,
+        token_budget: Optional[TokenBudgetManager] = None
+    ):
         """
         Initialize an agent with its configuration
         
@@ -30,102 +133,249 @@ class Agent:
             agent_id: Unique identifier for the agent
             config: Agent configuration
             references_dir: Directory containing reference materials
+            reference_cache: Optional cache of extracted reference text
+            token_budget: Context window budget shared by the agents, a default one is created if omitted
         """
         self.id = agent_id
         self.config = config
         self.references_dir = references_dir
+        self.reference_cache = reference_cache
+        self.token_budget = token_budget or TokenBudgetManager()
+        self._reference_budget: Optional[int] = None
         self.reference_content: Optional[str] = None
+        self._static_prompt: Optional[str] = None
+        self.reference_index: Optional[ReferenceIndex] = None
+        self._prompt_cache: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
     
-    async def initialize(self):
-        """Initialize agent by loading reference materials"""
-        await self._load_references()
+    async def initialize(self, executor: Optional[Executor] = None):
+        """
+        Initialize agent by loading reference materials and precomputing its prompt
+        
+        Args:
+            executor: Optional process pool for CPU-heavy extraction and reduction
+        """
+        await self._load_references(executor)
+        self._static_prompt = self._build_static_prompt()
+        self._prompt_cache.clear()
     
-    async def _load_references(self):
-        """Load and process reference materials from the references directory"""
-        if not os.path.exists(self.references_dir):
-            logger.info(f"References directory not found for agent {self.id}. Creating it.")
-            os.makedirs(self.references_dir, exist_ok=True)
-            return
+    async def _load_references(self, executor: Optional[Executor] = None):
+        """
+        Load and process reference materials from the references directory
         
-        reference_files = [
-            f for f in os.listdir(self.references_dir) 
-            if os.path.isfile(os.path.join(self.references_dir, f)) and 
-            any(f.endswith(ext) for ext in SUPPORTED_REFERENCE_FORMATS)
-        ]
+        File I/O runs on worker threads and extraction, indexing and reduction run in
+        the executor, so the event loop stays free while agents load.
+        
+        Args:
+            executor: Optional process pool for CPU-heavy work
+        """
+        loop = asyncio.get_event_loop()
+        reference_files = await loop.run_in_executor(None, self._list_reference_files)
         
         if not reference_files:
             logger.info(f"No reference materials found for agent {self.id}")
             return
         
-        all_content = []
-        
-        for filename in reference_files:
-            filepath = os.path.join(self.references_dir, filename)
-            try:
-                if filename.endswith(".pdf"):
-                    content = self._extract_pdf_content(filepath)
-                elif filename.endswith(".md") or filename.endswith(".txt"):
-                    with open(filepath, "r", encoding="utf-8") as f:
-                        content = f.read()
-                else:
-                    logger.warning(f"Unsupported file format: {filename}")
-                    continue
-                
-                all_content.append(f"""<ReferenceMaterials>
- <!--- From: '{filename}' --->
- {content}
-</ReferenceMaterials>""")
-            except Exception as e:
-                logger.error(ERROR_REFERENCE_LOADING.format(str(e)))
+        if not REFERENCE_RETRIEVAL_ENABLED and REFERENCE_REDUCTION_MODE == "streaming":
+            await self._stream_references(reference_files, executor)
+            return
         
-        # Combine all reference content
-        if all_content:
-            combined = "\n\n".join(all_content)
-            # Use agent-specific max token if available, otherwise use default
-            max_length = self.config.max_tokens if hasattr(self.config, 'max_tokens') else MAX_REFERENCE_LENGTH
-            
-            # Apply intelligent content reduction if needed
-            if len(combined) > max_length:
-                logger.warning(f"Reference content for agent '{self.config.name}' exceeds limit ({len(combined)}/{max_length}). Applying intelligent reduction.")
-                combined = self._reduce_content(combined, max_length)
+        results = await asyncio.gather(
+            *(
+                loop.run_in_executor(
+                    None, self._read_reference, os.path.join(self.references_dir, filename), executor
+                )
+                for filename in reference_files
+            ),
+            return_exceptions=True
+        )
+        
+        documents = []
+        digests = []
+        
+        for filename, result in zip(reference_files, results):
+            if isinstance(result, Exception):
+                logger.error(ERROR_REFERENCE_LOADING.format(str(result)))
+                continue
             
-            self.reference_content = combined
-            logger.info(f"Loaded {len(reference_files)} reference files for agent '{self.config.name}' ({len(combined)}/{max_length}).")
+            digest, content = result
+            documents.append((filename, content))
+            digests.append(digest)
+        
+        if not documents:
+            return
+        
+        # Index chunks so each query only pulls in the relevant parts
+        if REFERENCE_RETRIEVAL_ENABLED:
+            self.reference_index = await loop.run_in_executor(executor, build_reference_index, documents)
+            logger.info(f"Indexed {len(documents)} reference files for agent '{self.config.name}' into {len(self.reference_index)} chunks.")
+            return
+        
+        # Combine all reference content
+        combined = "\n\n".join(
+            self._format_reference(filename, content) for filename, content in documents
+        )
+        # Reduction works on text length, so convert the token budget to characters
+        max_length = tokens_to_chars(self.reference_budget)
+        
+        # Apply intelligent content reduction if needed
+        if len(combined) > max_length:
+            logger.warning(f"Reference content for agent '{self.config.name}' exceeds limit ({len(combined)}/{max_length}). Applying intelligent reduction.")
+            if self.reference_cache and all(digests):
+                key = self.reference_cache.derived_key(
+                    "reduced",
+                    digests,
+                    filenames=[filename for filename, _ in documents],
+                    max_length=max_length,
+                    mode=REFERENCE_REDUCTION_MODE,
+                    reducer=REDUCER_VERSION
+                )
+                combined = await loop.run_in_executor(
+                    None,
+                    self.reference_cache.get_derived,
+                    key,
+                    partial(run_blocking, executor, reduce_content, combined, max_length)
+                )
+            else:
+                combined = await loop.run_in_executor(executor, reduce_content, combined, max_length)
+        
+        self.reference_content = combined
+        logger.info(f"Loaded {len(reference_files)} reference files for agent '{self.config.name}' ({len(combined)}/{max_length}).")
     
-    def _reduce_content(self, content: str, max_length: int) -> str:
+    async def _stream_references(self, reference_files: List[str], executor: Optional[Executor] = None):
         """
-        Intelligently reduce content size while maintaining readability
+        Reduce reference files without loading them, reading each only as far as needed
+        
+        Files are only hashed here, to look up a previously reduced result. On a miss
+        the executor reads them page by page until the reference budget is filled.
         
         Args:
-            content: The original content text
-            max_length: Maximum allowed length
+            reference_files: Names of the reference files
+            executor: Optional process pool for reading and reduction
+        """
+        loop = asyncio.get_event_loop()
+        files = [(filename, os.path.join(self.references_dir, filename)) for filename in reference_files]
+        max_length = tokens_to_chars(self.reference_budget)
+        reduce = partial(run_blocking, executor, reduce_reference_files, files, max_length)
+        
+        digests = []
+        if self.reference_cache:
+            digests = await asyncio.gather(
+                *(loop.run_in_executor(None, self.reference_cache.file_digest, path) for _, path in files),
+                return_exceptions=True
+            )
+        
+        if digests and not any(isinstance(digest, Exception) for digest in digests):
+            key = self.reference_cache.derived_key(
+                "reduced-stream",
+                digests,
+                filenames=reference_files,
+                max_length=max_length,
+                mode=REFERENCE_REDUCTION_MODE,
+                reducer=REDUCER_VERSION
+            )
+            content = await loop.run_in_executor(None, self.reference_cache.get_derived, key, reduce)
+        else:
+            content = await loop.run_in_executor(None, reduce)
+        
+        self.reference_content = content
+        logger.info(f"Streamed {len(reference_files)} reference files for agent '{self.config.name}' ({len(content)}/{max_length}).")
+    
+    def _list_reference_files(self) -> List[str]:
+        """List supported reference files, creating the references directory if missing"""
+        if not os.path.exists(self.references_dir):
+            logger.info(f"References directory not found for agent {self.id}. Creating it.")
+            os.makedirs(self.references_dir, exist_ok=True)
+            return []
+        
+        return [
+            f for f in os.listdir(self.references_dir) 
+            if os.path.isfile(os.path.join(self.references_dir, f)) and 
+            any(f.endswith(ext) for ext in SUPPORTED_REFERENCE_FORMATS)
+        ]
+    
+    def _format_reference(self, filename: str, content: str) -> str:
+        """Wrap reference content in tags marking it as information only"""
+        opening, closing = format_reference_tags(filename)
+        return f"{opening}{content}{closing}"
+    
+    def _format_reference_section(self, content: str) -> str:
+        """Build the reference data section of the system prompt"""
+        return f"""### START REFERENCE DATA - INFORMATION ONLY ###
+{content}
+### END REFERENCE DATA - INFORMATION ONLY ###
+"""
+    
+    def _read_reference(
+        self,
+        filepath: str,
+        executor: Optional[Executor] = None
+    ) -> Tuple[Optional[str], str]:
+        """
+        Read a reference file, going through the reference cache when available
+        
+        Blocks until done, so it is meant to run on a worker thread.
+        
+        Args:
+            filepath: Path of the reference file
+            executor: Optional process pool running the extraction
         
         Returns:
-            Reduced content that fits within max_length
+            Tuple of (content hash or None if not cached, text)
         """
-        return reduce_content(content, max_length)
-    
-    def _extract_pdf_content(self, filepath: str) -> str:
-        """Extract text content from a PDF file"""
+        extract = partial(run_blocking, executor, read_reference_file)
         try:
-            doc = fitz.open(filepath)
-            text = ""
-            for page in doc:
-                text += page.get_text()
-            return text
+            if self.reference_cache:
+                return self.reference_cache.get_text(filepath, extract)
+            return None, extract(filepath)
         except Exception as e:
+            if not filepath.endswith(".pdf"):
+                raise
             logger.error(f"Error extracting PDF content: {str(e)}")
-            return f"[Error extracting content from {os.path.basename(filepath)}]"
+            return None, f"[Error extracting content from {os.path.basename(filepath)}]"
+    
+    @property
+    def model(self) -> str:
+        """Ollama model the agent uses"""
+        return self.config.model or MODEL_NAME
     
-    def get_system_prompt(self, user_system_instruction: Optional[str] = None) -> str:
+    @property
+    def reference_budget(self) -> int:
         """
-        Generate the system prompt for this agent
+        Tokens of reference material included in the system prompt
+        
+        The agent's reference_budget, or REFERENCE_TOKEN_BUDGET, is lowered when the
+        context window left after the prompt and the response cannot hold it.
+        """
+        if self._reference_budget is None:
+            plan = self.token_budget.plan(
+                system_tokens=self.token_budget.count(
+                    self._build_static_prompt(include_references=False) + CLOSING_SYSTEM_PROMPT
+                ),
+                max_tokens=self.config.max_tokens,
+                reference_tokens=self.config.reference_budget or REFERENCE_TOKEN_BUDGET
+            )
+            self._reference_budget = plan.references
+        return self._reference_budget
+    
+    @property
+    def static_system_prompt(self) -> str:
+        """The part of the system prompt that does not depend on the request"""
+        if self._static_prompt is None:
+            self._static_prompt = self._build_static_prompt()
+        return self._static_prompt
+    
+    def _build_static_prompt(self, include_references: bool = True) -> str:
+        """
+        Assemble the static part of the system prompt
+        
+        The long, unchanging sections come first so the model server can reuse its
+        cached prefix across rounds and requests.
         
         Args:
-            user_system_instruction: Optional user-provided system instruction
-            
+            include_references: Whether to add the loaded reference content
+        
         Returns:
-            Complete system prompt string
+            Static system prompt string
         """
         prompts = [BASE_SYSTEM_PROMPT]
         
@@ -144,26 +394,77 @@ Areas of Expertise: {', '.join(self.config.expertise)}
             prompts.append(f"""## AGENT-SPECIFIC SYSTEM INSTRUCTIONS ##
 {self.config.system_prompt}""")
         
-        # Add user system instruction if available
-        if user_system_instruction:
-            prompts.append(f"## USER SYSTEM INSTRUCTIONS ##\n{user_system_instruction}")
-        
         # Add reference materials if available
-        if self.reference_content:
-            prompts.append(f"""### START REFERENCE DATA - INFORMATION ONLY ###
-{self.reference_content}
-### END REFERENCE DATA - INFORMATION ONLY ###
-""")
-            
+        if include_references and self.reference_content:
+            prompts.append(self._format_reference_section(self.reference_content))
             prompts.append(CLOSING_SYSTEM_PROMPT)
         
         return "\n\n".join(prompts)
     
-    def create_message(self, content: str) -> AgentMessage:
-        """Create a message from this agent"""
-        return AgentMessage(
+    def get_system_prompt(
+        self,
+        user_system_instruction: Optional[str] = None,
+        query: Optional[str] = None
+    ) -> str:
+        """
+        Generate the system prompt for this agent
+        
+        Assembled prompts are memoized per user instruction, and per query only when
+        reference retrieval makes the prompt depend on it.
+        
+        Args:
+            user_system_instruction: Optional user-provided system instruction
+            query: Discussion query used to retrieve relevant reference chunks
+            
+        Returns:
+            Complete system prompt string
+        """
+        retrieves = self.reference_index is not None and bool(query)
+        key = (user_system_instruction or "", query if retrieves else "")
+        prompt = self._prompt_cache.get(key)
+        if prompt is not None:
+            self._prompt_cache.move_to_end(key)
+            return prompt
+        
+        prompt = self.static_system_prompt
+        
+        # Add the reference chunks relevant to the query
+        if retrieves:
+            chunks = self.reference_index.select(
+                query, self.reference_budget, REFERENCE_TOP_K, measure=self.token_budget.count
+            )
+            if chunks:
+                references = "\n\n".join(
+                    self._format_reference(chunk.source, chunk.text) for chunk in chunks
+                )
+                prompt = "\n\n".join([
+                    prompt, self._format_reference_section(references), CLOSING_SYSTEM_PROMPT
+                ])
+        
+        # Add user system instruction last, after everything that can be reused
+        if user_system_instruction:
+            prompt = f"{prompt}\n\n## USER SYSTEM INSTRUCTIONS ##\n{user_system_instruction}"
+        
+        self._prompt_cache[key] = prompt
+        while len(self._prompt_cache) > SYSTEM_PROMPT_CACHE_SIZE:
+            self._prompt_cache.popitem(last=False)
+        
+        return prompt
+    
+    def create_message(
+        self,
+        content: str,
+        message_id: Optional[str] = None,
+        round_num: int = 0
+    ) -> AgentMessage:
+        """Create a message from this agent for a discussion round"""
+        message = AgentMessage(
             agent_id=self.id,
             agent_name=self.config.name,
             content=content,
-            timestamp=int(time.time() * 1000)
+            timestamp=int(time.time() * 1000),
+            round=round_num
         )
+        if message_id:
+            message.message_id = message_id
+        return message
@@ -1,19 +1,52 @@
+import asyncio
 import os
 import yaml
-from typing import Dict, List, Optional
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
 
 from loguru import logger
 
 from agent import Agent
 from models import AgentConfig, AgentInfo
-from constants import AGENT_INSTANCES_DIR, ERROR_AGENT_CONFIG
+from ollama_service import OllamaService
+from constants import (
+    AGENT_INSTANCES_DIR,
+    AGENT_RELOAD_INTERVAL,
+    REFERENCE_CACHE_ENABLED,
+    REFERENCE_WORKERS,
+    ERROR_AGENT_CONFIG
+)
+from utils.reference_cache import ReferenceCache
+from utils.token_budget import TokenBudgetManager
 
 
 class AgentManager:
     """Manages agent instances and their configurations"""
     
-    def __init__(self):
+    def __init__(
+        self,
+        token_budget: Optional[TokenBudgetManager] = None,
+        ollama_service: Optional[OllamaService] = None
+    ):
+        """
+        Initialize the agent manager
+        
+        Args:
+            token_budget: Context window budget passed to every agent, a default one is created if omitted
+            ollama_service: Service used to pull the model of a reloaded agent when it changes
+        """
+        self.token_budget = token_budget or TokenBudgetManager()
+        self.ollama_service = ollama_service
         self.agents: Dict[str, Agent] = {}
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._fingerprints: Dict[str, Tuple] = {}
+        self._watch_task: Optional[asyncio.Task] = None
+        self.reference_cache: Optional[ReferenceCache] = None
+        if REFERENCE_CACHE_ENABLED:
+            try:
+                self.reference_cache = ReferenceCache()
+            except Exception as e:
+                logger.error(f"Error opening reference cache: {str(e)}")
     
     async def initialize_agents(self):
         """Load all agent configurations from the agent_instances directory"""
@@ -35,32 +68,202 @@ class AgentManager:
             await self._create_default_agents()
             return
             
-        # Load each agent configuration
-        for agent_dir in agent_dirs:
-            config_path = os.path.join(AGENT_INSTANCES_DIR, agent_dir, "config.yml")
+        # Load all agents concurrently
+        await asyncio.gather(*(self._load_agent(agent_dir) for agent_dir in agent_dirs))
+    
+    async def _load_agent(self, agent_dir: str):
+        """
+        Load, initialize and register a single agent
+        
+        Args:
+            agent_dir: Name of the agent's folder under the agent instances directory
+        """
+        agent = await self._build_agent(agent_dir)
+        if agent:
+            self._register(agent)
+            logger.info(f"Loaded agent: '{agent.config.name}', id: {agent.id}, model: {agent.model}, max_tokens: {agent.config.max_tokens}, temperature: {agent.config.temperature}")
+    
+    async def _build_agent(self, agent_dir: str) -> Optional[Agent]:
+        """
+        Create and initialize an agent from its folder without registering it
+        
+        The folder's fingerprint is recorded first, so edits made while the agent
+        loads are picked up by the next reload check.
+        
+        Args:
+            agent_dir: Name of the agent's folder under the agent instances directory
             
-            if not os.path.exists(config_path):
+        Returns:
+            The initialized agent, or None if it could not be loaded
+        """
+        loop = asyncio.get_event_loop()
+        self._fingerprints[agent_dir] = await loop.run_in_executor(None, self._fingerprint, agent_dir)
+        
+        config_path = os.path.join(AGENT_INSTANCES_DIR, agent_dir, "config.yml")
+        
+        try:
+            config_data = await loop.run_in_executor(None, self._read_config, config_path)
+            if config_data is None:
                 logger.warning(f"No config.yml found for agent: {agent_dir}")
-                continue
+                return None
                 
+            agent_config = AgentConfig(**config_data)
+            
+            # Create agent instance
+            agent_id = agent_dir
+            references_dir = os.path.join(AGENT_INSTANCES_DIR, agent_dir, "references")
+            agent = Agent(agent_id, agent_config, references_dir, self.reference_cache, self.token_budget)
+            
+            # Initialize agent (load references, etc.)
+            await agent.initialize(self._get_executor())
+            return agent
+        except Exception as e:
+            logger.error(ERROR_AGENT_CONFIG.format(str(e)))
+            return None
+    
+    @staticmethod
+    def _read_config(config_path: str) -> Optional[Dict[str, Any]]:
+        """
+        Read and parse an agent's config file
+        
+        Args:
+            config_path: Path to the config.yml file
+            
+        Returns:
+            The parsed config, or None if the file does not exist
+        """
+        if not os.path.exists(config_path):
+            return None
+        with open(config_path, "r") as f:
+            return yaml.safe_load(f)
+    
+    def _register(self, agent: Agent):
+        """
+        Add or replace an agent
+        
+        The agents dict is replaced rather than mutated, so lists handed out by
+        get_all_agents() to running discussions keep their snapshot.
+        """
+        self.agents = {**self.agents, agent.id: agent}
+    
+    def _unregister(self, agent_id: str):
+        """Remove an agent if it is registered"""
+        if agent_id in self.agents:
+            self.agents = {k: v for k, v in self.agents.items() if k != agent_id}
+            logger.info(f"Removed agent: {agent_id}")
+    
+    def start_watching(self, interval: float = AGENT_RELOAD_INTERVAL):
+        """
+        Start polling the agent instances directory for changes
+        
+        Args:
+            interval: Seconds between checks
+        """
+        if self._watch_task is None:
+            self._watch_task = asyncio.create_task(self._watch(interval))
+    
+    async def _watch(self, interval: float):
+        """Reload changed agents until cancelled"""
+        while True:
+            await asyncio.sleep(interval)
             try:
-                with open(config_path, "r") as f:
-                    config_data = yaml.safe_load(f)
-                    
-                agent_config = AgentConfig(**config_data)
-                
-                # Create agent instance
-                agent_id = agent_dir
-                references_dir = os.path.join(AGENT_INSTANCES_DIR, agent_dir, "references")
-                agent = Agent(agent_id, agent_config, references_dir)
-                
-                # Initialize agent (load references, etc.)
-                await agent.initialize()
-                
-                self.agents[agent_id] = agent
-                logger.info(f"Loaded agent: '{agent.config.name}', id: {agent_id}, max_tokens: {agent_config.max_tokens}, temperature: {agent_config.temperature}")
+                await self.reload_changed_agents()
             except Exception as e:
-                logger.error(ERROR_AGENT_CONFIG.format(str(e)))
+                logger.error(f"Error reloading agents: {str(e)}")
+    
+    async def reload_changed_agents(self) -> List[str]:
+        """
+        Rebuild agents whose config or references changed and drop removed ones
+        
+        Only the affected agents are rebuilt; unchanged reference files come from the
+        reference cache. A rebuilt agent is swapped in once it is fully initialized
+        and its model has been pulled if it changed, and if it fails to load the
+        previous version stays active.
+        
+        Returns:
+            IDs of agents that were added, rebuilt or removed
+        """
+        loop = asyncio.get_event_loop()
+        fingerprints = await loop.run_in_executor(None, self._scan)
+        
+        changed = [d for d, fingerprint in fingerprints.items() if self._fingerprints.get(d) != fingerprint]
+        removed = [d for d in self._fingerprints if d not in fingerprints]
+        
+        for agent_dir in removed:
+            del self._fingerprints[agent_dir]
+            self._unregister(agent_dir)
+        
+        for agent_dir in changed:
+            agent = await self._build_agent(agent_dir)
+            if agent:
+                previous = self.agents.get(agent.id)
+                if self.ollama_service and (previous is None or previous.model != agent.model):
+                    await self.ollama_service.ensure_model_exists(agent.model)
+                self._register(agent)
+                logger.info(f"Reloaded agent: '{agent.config.name}', id: {agent.id}")
+            elif not os.path.exists(os.path.join(AGENT_INSTANCES_DIR, agent_dir, "config.yml")):
+                self._unregister(agent_dir)
+        
+        return changed + removed
+    
+    def _scan(self) -> Dict[str, Tuple]:
+        """Fingerprint every agent folder"""
+        if not os.path.exists(AGENT_INSTANCES_DIR):
+            return {}
+        
+        return {
+            d: self._fingerprint(d)
+            for d in os.listdir(AGENT_INSTANCES_DIR)
+            if os.path.isdir(os.path.join(AGENT_INSTANCES_DIR, d))
+        }
+    
+    def _fingerprint(self, agent_dir: str) -> Tuple:
+        """
+        Summarize an agent folder's config and reference files by size and mtime
+        
+        Args:
+            agent_dir: Name of the agent's folder
+            
+        Returns:
+            Sorted tuple of (relative path, mtime, size) entries
+        """
+        base = os.path.join(AGENT_INSTANCES_DIR, agent_dir)
+        paths = ["config.yml"]
+        
+        references_dir = os.path.join(base, "references")
+        if os.path.isdir(references_dir):
+            paths.extend(os.path.join("references", f) for f in os.listdir(references_dir))
+        
+        entries = []
+        for path in paths:
+            try:
+                stat = os.stat(os.path.join(base, path))
+            except OSError:
+                continue
+            entries.append((path, stat.st_mtime_ns, stat.st_size))
+        
+        return tuple(sorted(entries))
+    
+    def _get_executor(self) -> Optional[ProcessPoolExecutor]:
+        """Process pool for reference extraction and reduction, created on first use"""
+        if self._executor is None and REFERENCE_WORKERS != 0:
+            try:
+                self._executor = ProcessPoolExecutor(max_workers=REFERENCE_WORKERS)
+            except (OSError, NotImplementedError) as e:
+                logger.warning(f"Process pool unavailable, loading references on threads: {str(e)}")
+        return self._executor
+    
+    def close(self):
+        """Stop watching for changes and shut down the reference worker processes and cache"""
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            self._watch_task = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self.reference_cache is not None:
+            self.reference_cache.close()
+            self.reference_cache = None
     
     async def _create_default_agents(self):
         """Create default agents if none exist"""
@@ -97,27 +300,36 @@ class AgentManager:
             }
         ]
         
-        for agent_data in default_agents:
-            agent_id = agent_data["id"]
-            agent_dir = os.path.join(AGENT_INSTANCES_DIR, agent_id)
-            
-            # Create agent directory and references directory
-            os.makedirs(agent_dir, exist_ok=True)
-            os.makedirs(os.path.join(agent_dir, "references"), exist_ok=True)
-            
-            # Create config file
-            config_path = os.path.join(agent_dir, "config.yml")
-            with open(config_path, "w") as f:
-                yaml.dump(agent_data["config"], f)
-            
-            # Initialize agent
-            agent_config = AgentConfig(**agent_data["config"])
-            references_dir = os.path.join(agent_dir, "references")
-            agent = Agent(agent_id, agent_config, references_dir)
-            
-            await agent.initialize()
-            self.agents[agent_id] = agent
-            logger.info(f"Created default agent: {agent_config.name}")
+        await asyncio.gather(*(self._create_default_agent(agent_data) for agent_data in default_agents))
+    
+    async def _create_default_agent(self, agent_data: Dict[str, Any]):
+        """
+        Write a default agent's files and register it
+        
+        Args:
+            agent_data: Agent id and configuration
+        """
+        agent_id = agent_data["id"]
+        agent_dir = os.path.join(AGENT_INSTANCES_DIR, agent_id)
+        
+        # Create agent directory and references directory
+        os.makedirs(agent_dir, exist_ok=True)
+        os.makedirs(os.path.join(agent_dir, "references"), exist_ok=True)
+        
+        # Create config file
+        config_path = os.path.join(agent_dir, "config.yml")
+        with open(config_path, "w") as f:
+            yaml.dump(agent_data["config"], f)
+        
+        # Initialize agent
+        agent_config = AgentConfig(**agent_data["config"])
+        references_dir = os.path.join(agent_dir, "references")
+        agent = Agent(agent_id, agent_config, references_dir, self.reference_cache, self.token_budget)
+        
+        await agent.initialize(self._get_executor())
+        self._fingerprints[agent_id] = self._fingerprint(agent_id)
+        self._register(agent)
+        logger.info(f"Created default agent: {agent_config.name}")
     
     def get_agent(self, agent_id: str) -> Optional[Agent]:
         """Get agent by ID"""
@@ -134,7 +346,8 @@ class AgentManager:
                 id=agent_id,
                 name=agent.config.name,
                 description=agent.config.description,
-                expertise=agent.config.expertise
+                expertise=agent.config.expertise,
+                model=agent.model
             )
             for agent_id, agent in self.agents.items()
         ]
@@ -1,10 +1,101 @@
 # Model settings
-MODEL_NAME = "llama3:8b"  # Model to use with Ollama
+MODEL_NAME = "llama3:8b"  # Model to use with Ollama, for agents without a model of their own and for round summaries
+CONSENSUS_MODEL_NAME = MODEL_NAME  # Model that writes the consensus
+MODEL_CONTEXT_WINDOW = 8192  # Context length requested from Ollama (num_ctx), in tokens
+
+# Token budget settings
+TOKENIZER_ENCODING = "cl100k_base"  # tiktoken encoding for exact counts when tiktoken is installed, None always estimates
+CHARS_PER_TOKEN = 3.5  # Characters per token assumed by the estimate, on the low side so counts err high
+MESSAGE_TOKEN_OVERHEAD = 4  # Tokens the chat template adds around each message
+CONTEXT_SAFETY_MARGIN = 256  # Tokens of the context window kept free to absorb counting error
+REFERENCE_TOKEN_BUDGET = 1024  # Default tokens of reference material per agent
+REFERENCE_CONTEXT_SHARE = 0.5  # Largest share of the prompt space left after system prompt and response that references may take
+MIN_OUTPUT_TOKENS = 64  # Smallest response length requested when a prompt nearly fills the context
+CONSENSUS_MAX_TOKENS = 2048  # Maximum consensus response length
+
+# Ollama connection settings
+OLLAMA_HOST = "http://localhost:11434"  # Base URL of the default Ollama server
+OLLAMA_HOSTS = [OLLAMA_HOST]  # Ollama servers requests are spread across
+OLLAMA_MAX_CONNECTIONS = 16  # Maximum open connections to each Ollama server
+OLLAMA_MAX_KEEPALIVE_CONNECTIONS = 8  # Idle connections kept open for reuse
+OLLAMA_KEEPALIVE_EXPIRY = 60  # Seconds an idle connection is kept open
+OLLAMA_CONNECT_TIMEOUT = 10  # Seconds to wait when opening a connection
+LLM_MAX_CONCURRENT_REQUESTS = 4  # Requests sent to each Ollama server at once, the rest wait in the scheduler queue
+SCHEDULER_MODEL_AFFINITY_WAIT = 10  # Seconds a queued request may be passed over for requests using an already running model
+OLLAMA_HEALTH_CHECK_INTERVAL = 15  # Seconds between checks of each server's health and loaded models
+OLLAMA_HEALTH_CHECK_TIMEOUT = 5  # Seconds a server has to answer a health check before it is ejected
+OLLAMA_MAX_FAILURES = 3  # Consecutive failed or timed out requests after which a server's circuit opens
+OLLAMA_BREAKER_COOLDOWN = 30  # Seconds an open circuit rejects requests before a single trial request is let through
+
+# Model residency settings
+MODEL_WARMUP_ENABLED = True  # Load every model on every server in the background at startup
+MODEL_IDLE_EVICTION = 30 * 60  # Seconds a model stays loaded after its last request, None keeps models loaded while Ollama runs
+MODEL_KEEPALIVE_INTERVAL = 60  # Seconds between checks that recently used models are still loaded somewhere
+
+# Context reuse settings
+CONTEXT_REUSE_ENABLED = True  # Keep each agent's model state between rounds and send only the messages it has not seen
+
+# Hedged request settings
+HEDGING_ENABLED = True  # Send a duplicate of a late request to another server and keep whichever answers first
+HEDGE_QUANTILE = 0.95  # A request is late once it has waited longer than this share of recent requests
+HEDGE_MIN_DELAY = 0.5  # Seconds a request always gets before it is hedged
+HEDGE_LATENCY_WINDOW = 200  # Recent latencies kept per model and response mode
+HEDGE_MIN_SAMPLES = 20  # Latencies needed before requests are hedged
 
 # Agent and discussion settings
 MAX_DISCUSSION_ROUNDS = 3
-MAX_REFERENCE_LENGTH = 3000  # Maximum length of reference context to include
+REFERENCE_RETRIEVAL_ENABLED = True  # Select reference chunks per query instead of including all references
+REFERENCE_CHUNK_SIZE = 800  # Target length of an indexed reference chunk
+REFERENCE_CHUNK_OVERLAP = 100  # Characters shared between windows of a long paragraph
+REFERENCE_TOP_K = 8  # Maximum reference chunks retrieved for a query
+REFERENCE_CACHE_ENABLED = True  # Keep extracted reference text on disk between restarts
+REFERENCE_CACHE_DIR = ".cache/references"  # Content-addressed store of extracted reference text
+REFERENCE_WORKERS = None  # Processes for reference extraction and reduction, None uses the CPU count, 0 disables the pool
+REFERENCE_REDUCTION_MODE = "streaming"  # Without retrieval, "streaming" reads references only until the budget is filled, "full" reduces their combined text
+REFERENCE_READ_BLOCK_SIZE = 64 * 1024  # Characters read from a text reference at a time when streaming
 DEFAULT_TIMEOUT = 120  # Seconds to wait for model response
+SYSTEM_PROMPT_CACHE_SIZE = 64  # Assembled system prompts memoized per agent
+
+# Round execution settings
+CONCURRENT_ROUNDS = True  # Dispatch every agent in a round at once instead of one after another
+ROUND_MESSAGE_ORDER = "completion"  # "completion" sends messages as agents finish, "agent" keeps agent order
+AGENT_RESPONSE_DELAY = 0.5  # Seconds to pause between agents when rounds run sequentially
+STREAM_TOKENS = True  # Forward partial agent responses to clients as they are generated
+
+# Convergence settings
+CONVERGENCE_ENABLED = True  # Skip the remaining rounds once agents agree and go straight to consensus
+CONVERGENCE_THRESHOLD = 0.8  # Lexical similarity (0-1) between agents or between rounds at which agents have converged
+
+# History compaction settings
+HISTORY_SUMMARY_ENABLED = True  # Replace earlier rounds with a shared summary once the history grows too long
+HISTORY_SUMMARY_THRESHOLD = 2048  # Tokens of verbatim history above which earlier rounds are summarized
+HISTORY_SUMMARY_MAX_TOKENS = 512  # Maximum length of a round summary
+HISTORY_DEDUP_ENABLED = True  # Strip sentences that nearly repeat earlier ones from the history sent to the model
+HISTORY_DEDUP_THRESHOLD = 0.8  # Jaccard similarity of word shingles at which a later sentence is removed
+HISTORY_DEDUP_SHINGLE_SIZE = 3  # Words per shingle
+HISTORY_DEDUP_MIN_WORDS = 6  # Sentences with fewer words are always kept
+HISTORY_DEDUP_PERMUTATIONS = 64  # MinHash functions per sentence signature
+HISTORY_DEDUP_BANDS = 16  # LSH bands the signature is split into, must divide the permutations
+HISTORY_DEDUP_CACHE_SIZE = 32  # Deduplicated histories memoized, shared by the agents of a round
+
+# Response cache settings
+RESPONSE_CACHE_ENABLED = False  # Serve repeated generation requests from the cache
+RESPONSE_CACHE_MAX_ENTRIES = 1024  # Responses kept in the in-memory LRU tier
+RESPONSE_CACHE_TTL = 24 * 60 * 60  # Seconds a cached response stays valid
+RESPONSE_CACHE_PATH = ".cache/responses.sqlite3"  # Persistent tier, set to None to keep the cache in memory only
+
+# Resume settings
+REPLAY_BUFFER_SIZE = 4096  # Updates of a discussion kept for clients that reconnect
+RESUME_GRACE_PERIOD = 30  # Seconds a discussion keeps running with no client connected before it is cancelled
+REPLAY_BUFFER_TTL = 5 * 60  # Seconds the updates of a finished discussion stay available for resuming
+DISCUSSION_COALESCING_ENABLED = True  # Identical queries submitted while one is running join it instead of starting another
+
+# Discussion store settings
+DISCUSSION_STORE_MAX_ENTRIES = 256  # Finished discussions kept in memory
+DISCUSSION_STORE_TTL = 60 * 60  # Seconds a finished discussion stays in memory after its last use
+DISCUSSION_STORE_PATH = ".cache/discussions.sqlite3"  # Append-only event log, set to None to keep discussions in memory only
+DISCUSSION_LOG_RETENTION = 30 * 24 * 60 * 60  # Seconds discussions are kept in the log after their last event
+DISCUSSION_LOG_PRUNE_INTERVAL = 500  # Writes to the log between dropping discussions past the retention
 
 # System prompts
 BASE_SYSTEM_PROMPT = """# AI Agent System Prompt
@@ -35,6 +126,10 @@ that addresses the original query. Integrate the key insights and perspectives s
 Be concise, practical, and ensure the response is comprehensive and directly answers the user's query.
 Outputs should be in Markdown format where applicable."""
 
+HISTORY_SUMMARY_PROMPT = """You summarize a discussion between AI agents so it can continue without the full transcript.
+Write a concise summary of the discussion so far. For each agent, keep its main positions, key arguments and recommendations,
+and note where agents agree or disagree. Include the previous summary's points if one is given. Do not add new opinions."""
+
 # Content reduction common word abbreviations
 COMMON_WORDS = {
     # General terms
@@ -217,6 +312,10 @@ MAX_FILE_SIZE_MB = 10
 AGENT_INSTANCES_DIR = "agent_instances"
 REFERENCES_DIR = "references"
 
+# Agent hot reload
+AGENT_RELOAD_ENABLED = True  # Watch agent folders and rebuild agents when their files change
+AGENT_RELOAD_INTERVAL = 2.0  # Seconds between checks for changed agent folders
+
 # Error messages
 ERROR_MODEL_UNAVAILABLE = "The LLM model is unavailable. Please check your Ollama installation."
 ERROR_AGENT_CONFIG = "Failed to load agent configuration: {}"
@@ -1,41 +1,175 @@
 import asyncio
 import time
-from typing import Dict, List, AsyncGenerator, Any, Tuple
+import uuid
+from typing import Dict, List, AsyncGenerator, Any, Callable, Optional, Set, Tuple
 
 from loguru import logger
 
+from agent import Agent
 from agent_manager import AgentManager
-from models import Discussion, DiscussionRequest, DiscussionStatus, MessageType
-from ollama_service import OllamaService
-from constants import MAX_DISCUSSION_ROUNDS, MODEL_NAME, CONSENSUS_PROMPT
+from models import (
+    AgentMessage,
+    Discussion,
+    DiscussionRequest,
+    DiscussionStatus,
+    MessageType,
+    RequestPriority
+)
+from ollama_service import LLMError, OllamaService
+from request_scheduler import QueueUpdateCallback
+from utils.convergence import Convergence, detect_convergence
+from utils.discussion_store import DiscussionStore
+from utils.discussion_stream import DiscussionStream
+from utils.history_dedup import SentenceDeduplicator
+from constants import (
+    MAX_DISCUSSION_ROUNDS,
+    MODEL_NAME,
+    CONSENSUS_MODEL_NAME,
+    CONSENSUS_PROMPT,
+    CONSENSUS_MAX_TOKENS,
+    HISTORY_SUMMARY_ENABLED,
+    HISTORY_SUMMARY_THRESHOLD,
+    HISTORY_SUMMARY_MAX_TOKENS,
+    HISTORY_SUMMARY_PROMPT,
+    HISTORY_DEDUP_ENABLED,
+    CONVERGENCE_ENABLED,
+    CONVERGENCE_THRESHOLD,
+    REPLAY_BUFFER_TTL,
+    DISCUSSION_COALESCING_ENABLED,
+    CONCURRENT_ROUNDS,
+    ROUND_MESSAGE_ORDER,
+    AGENT_RESPONSE_DELAY,
+    STREAM_TOKENS,
+    CONTEXT_REUSE_ENABLED
+)
 
 
 class DiscussionManager:
     """Manages discussions between agents"""
     
-    def __init__(self, agent_manager: AgentManager, ollama_service: OllamaService):
+    def __init__(
+        self,
+        agent_manager: AgentManager,
+        ollama_service: OllamaService,
+        store: Optional[DiscussionStore] = None
+    ):
         """
         Initialize the discussion manager
         
         Args:
             agent_manager: Manager for agent instances
             ollama_service: Service for LLM interactions
+            store: Store keeping discussions, a default one is created if omitted
         """
         self.agent_manager = agent_manager
         self.ollama_service = ollama_service
-        self.discussions: Dict[str, Discussion] = {}
+        self.store = store or DiscussionStore()
+        self.streams: Dict[str, DiscussionStream] = {}
+        self._running: Dict[Tuple[Any, ...], DiscussionStream] = {}
+        # Messages each agent's kept model state has seen, per discussion
+        self._shown: Dict[str, Dict[str, Set[str]]] = {}
+        self.deduplicator = SentenceDeduplicator(count_tokens=ollama_service.token_budget.count)
+    
+    def start_discussion(
+        self,
+        request: DiscussionRequest,
+        client_id: Optional[str] = None
+    ) -> DiscussionStream:
+        """
+        Run a discussion in the background, publishing its updates to a stream
+        
+        The discussion does not depend on any one connection. Clients subscribe to the
+        stream and can resume it after reconnecting, and the discussion is cancelled
+        once no client has been subscribed for RESUME_GRACE_PERIOD seconds.
+        
+        A request identical to a discussion that is still running gets that
+        discussion's stream, whose buffered updates are replayed to new subscribers,
+        unless it bypasses the cache. When the start of that discussion is no longer
+        buffered, a new discussion is started instead, so joiners never get a
+        transcript with its beginning missing.
+        
+        Args:
+            request: Discussion request with query and system instruction
+            client_id: Connection the discussion runs for, used for fair scheduling
+            
+        Returns:
+            Stream of the discussion's updates
+        """
+        key = self._coalescing_key(request)
+        if key is not None:
+            running = self._running.get(key)
+            if running is not None and not running.done:
+                if not running.missed(0):
+                    logger.info(f"Joined running discussion {running.discussion_id} with {running.subscribers} subscribers")
+                    return running
+                logger.info(f"Not joining running discussion {running.discussion_id}, whose first updates are no longer buffered")
+        
+        stream = DiscussionStream(str(uuid.uuid4()))
+        self.streams[stream.discussion_id] = stream
+        if key is not None:
+            self._running[key] = stream
+        stream.task = asyncio.create_task(self._publish_discussion(stream, request, client_id, key))
+        return stream
+    
+    def _coalescing_key(self, request: DiscussionRequest) -> Optional[Tuple[Any, ...]]:
+        """Fields identifying requests that can share a discussion, or None if the request runs on its own"""
+        if not DISCUSSION_COALESCING_ENABLED or request.bypass_cache:
+            return None
+        return (request.query, request.system_instruction or "", request.convergence_threshold)
+    
+    def get_stream(self, discussion_id: str) -> Optional[DiscussionStream]:
+        """Stream of a running or recently finished discussion"""
+        return self.streams.get(discussion_id)
+    
+    def models(self) -> List[str]:
+        """Models the agents, round summaries and consensus use"""
+        models = [agent.model for agent in self.agent_manager.get_all_agents()]
+        return list(dict.fromkeys(models + [MODEL_NAME, CONSENSUS_MODEL_NAME]))
+    
+    async def _publish_discussion(
+        self,
+        stream: DiscussionStream,
+        request: DiscussionRequest,
+        client_id: Optional[str] = None,
+        key: Optional[Tuple[Any, ...]] = None
+    ):
+        """Run a discussion and publish its updates, keeping them for a while after it ends"""
+        updates = self.run_discussion(stream.discussion_id, request, client_id)
+        try:
+            async for update in updates:
+                stream.publish(update)
+        except asyncio.CancelledError:
+            stream.publish({
+                "type": MessageType.DISCUSSION_CANCELLED,
+                "data": {"discussion_id": stream.discussion_id}
+            })
+            raise
+        finally:
+            # Closing the updates stops the LLM requests still in flight
+            await updates.aclose()
+            if key is not None and self._running.get(key) is stream:
+                del self._running[key]
+            stream.close()
+            asyncio.get_event_loop().call_later(
+                REPLAY_BUFFER_TTL, self.streams.pop, stream.discussion_id, None
+            )
     
     async def run_discussion(
         self, 
         discussion_id: str, 
-        request: DiscussionRequest
+        request: DiscussionRequest,
+        client_id: Optional[str] = None
     ) -> AsyncGenerator[Dict[str, Any], None]:
         """
         Run a discussion between agents
         
+        Closing the generator or cancelling the task consuming it cancels the LLM
+        requests in flight and marks the discussion as cancelled.
+        
         Args:
             discussion_id: Unique ID for this discussion
             request: Discussion request with query and system instruction
+            client_id: Connection the discussion runs for, used for fair scheduling
             
         Yields:
             Dictionary with update type and data
@@ -45,11 +179,17 @@ class DiscussionManager:
             id=discussion_id,
             query=request.query,
             system_instruction=request.system_instruction,
+            bypass_cache=request.bypass_cache,
             status=DiscussionStatus.IN_PROGRESS
         )
-        self.discussions[discussion_id] = discussion
+        self.store.create(discussion)
         
         try:
+            yield {
+                "type": MessageType.DISCUSSION_STARTED,
+                "data": {"discussion_id": discussion_id, "query": request.query}
+            }
+            
             agents = self.agent_manager.get_all_agents()
             if not agents:
                 yield {
@@ -60,63 +200,44 @@ class DiscussionManager:
                 return
             
             # Initial round - each agent responds to the query
-            for agent in agents:
-                # Generate agent response
-                system_prompt = agent.get_system_prompt(discussion.system_instruction)
-                messages = [{"role": "user", "content": request.query}]
-                # print(system_prompt)
-                response = await self.ollama_service.generate_response(
-                    model=MODEL_NAME,
-                    system_prompt=system_prompt,
-                    messages=messages,
-                    temperature=agent.config.temperature,
-                    max_tokens=agent.config.max_tokens
-                )
-                
-                # Create and add message
-                agent_message = agent.create_message(response)
-                discussion.messages.append(agent_message)
-                
-                # Send update
-                yield {
-                    "type": MessageType.AGENT_MESSAGE,
-                    "data": agent_message.dict()
-                }
-                
-                # Brief pause between agents for better UX
-                await asyncio.sleep(0.5)
+            async for update in self._run_round(discussion, agents, 0, client_id):
+                yield update
                 
             # Discussion rounds - agents respond to each other
-            for round_num in range(MAX_DISCUSSION_ROUNDS - 1):
-                for agent in agents:
-                    # Build message history
-                    messages = self._format_messages_for_agent(discussion, agent.id)
-                    
-                    # Generate agent response
-                    system_prompt = agent.get_system_prompt(discussion.system_instruction)
-                    response = await self.ollama_service.generate_response(
-                        model=MODEL_NAME,
-                        system_prompt=system_prompt,
-                        messages=messages,
-                        temperature=agent.config.temperature,
-                        max_tokens=agent.config.max_tokens
-                    )
-                    
-                    # Create and add message
-                    agent_message = agent.create_message(response)
-                    discussion.messages.append(agent_message)
-                    
-                    # Send update
+            for round_num in range(1, MAX_DISCUSSION_ROUNDS):
+                # Stop early once the agents have converged
+                convergence = self._check_convergence(discussion, round_num - 1, request.convergence_threshold)
+                if convergence:
+                    logger.info(f"Discussion {discussion_id} converged after round {round_num - 1}: {convergence.description}")
                     yield {
-                        "type": MessageType.AGENT_MESSAGE,
-                        "data": agent_message.dict()
+                        "type": MessageType.CONVERGED,
+                        "data": {
+                            "round": round_num - 1,
+                            "skipped_rounds": MAX_DISCUSSION_ROUNDS - round_num,
+                            "reason": convergence.reason,
+                            "score": round(convergence.score, 3),
+                            "description": convergence.description
+                        }
                     }
-                    
-                    # Brief pause between agents
-                    await asyncio.sleep(0.5)
+                    break
+                
+                async for update in self._run_round(discussion, agents, round_num, client_id):
+                    yield update
+            
+            # Generate consensus, forwarding queue updates while it waits for a slot
+            updates: asyncio.Queue = asyncio.Queue()
+            consensus_task = asyncio.create_task(
+                self._generate_consensus(discussion, client_id, updates.put_nowait)
+            )
+            consensus_task.add_done_callback(updates.put_nowait)
+            try:
+                while (update := await updates.get()) is not consensus_task:
+                    yield update
+            finally:
+                if not consensus_task.done():
+                    consensus_task.cancel()
             
-            # Generate consensus
-            consensus = await self._generate_consensus(discussion)
+            consensus = consensus_task.result()
             discussion.consensus = consensus
             discussion.status = DiscussionStatus.COMPLETED
             
@@ -130,28 +251,548 @@ class DiscussionManager:
             logger.error(f"Error in discussion {discussion_id}: {str(e)}")
             discussion.status = DiscussionStatus.FAILED
             
+            data = {"message": f"Discussion failed: {str(e)}"}
+            if isinstance(e, LLMError):
+                data["error"] = e.kind
             yield {
                 "type": MessageType.ERROR,
-                "data": {"message": f"Discussion failed: {str(e)}"}
+                "data": data
             }
+        finally:
+            # Discussions stopped midway were cancelled, and every finished one becomes evictable
+            if discussion.status == DiscussionStatus.IN_PROGRESS:
+                discussion.status = DiscussionStatus.CANCELLED
+                logger.info(f"Discussion {discussion_id} cancelled")
+            self.store.finish(discussion)
+            self._shown.pop(discussion_id, None)
+            self.ollama_service.release_contexts(discussion_id)
+    
+    async def _run_round(
+        self,
+        discussion: Discussion,
+        agents: List[Agent],
+        round_num: int,
+        client_id: Optional[str] = None
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Run a single discussion round
+        
+        In concurrent mode every agent is dispatched at once against a snapshot of the
+        discussion taken when the round starts. Otherwise agents respond one after another
+        and later agents see the messages produced earlier in the same round. The round
+        raises LLMError if no agent could respond.
+        
+        Args:
+            discussion: Discussion being run
+            agents: Agents taking part in the round
+            round_num: Index of the round, 0 is the initial round where agents only see the query
+            client_id: Connection the discussion runs for
+            
+        Yields:
+            Dictionary with update type and data
+        """
+        initial = round_num == 0
+        priority = RequestPriority.INITIAL if initial else RequestPriority.DISCUSSION
+        
+        # Summarize earlier rounds once, before any agent in this round needs them
+        if not initial and HISTORY_SUMMARY_ENABLED:
+            await self._compact_history(discussion, round_num, client_id)
+        
+        if not CONCURRENT_ROUNDS:
+            history = [] if initial else discussion.messages
+            for agent in agents:
+                async for update in self._run_agents(discussion, [agent], history, round_num, priority, client_id):
+                    yield update
+                
+                # Brief pause between agents for better UX
+                await asyncio.sleep(AGENT_RESPONSE_DELAY)
+        else:
+            snapshot = [] if initial else list(discussion.messages)
+            async for update in self._run_agents(discussion, agents, snapshot, round_num, priority, client_id):
+                yield update
+        
+        if agents and not any(msg.round == round_num for msg in discussion.messages):
+            raise LLMError(LLMError.UNAVAILABLE, f"No agent could respond in round {round_num}")
     
-    def _format_messages_for_agent(self, discussion: Discussion, agent_id: str) -> List[Dict[str, str]]:
-        """Format discussion messages for an agent"""
+    async def _run_agents(
+        self,
+        discussion: Discussion,
+        agents: List[Agent],
+        history: List[AgentMessage],
+        round_num: int,
+        priority: RequestPriority,
+        client_id: Optional[str] = None
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Generate responses for a group of agents at once
+        
+        Token and queue updates are forwarded as soon as they arrive. Completed messages
+        are added to the discussion and sent in the order configured by ROUND_MESSAGE_ORDER.
+        An agent whose response fails gets an error update instead, and the others go on.
+        
+        Args:
+            discussion: Discussion being run
+            agents: Agents to generate responses for
+            history: Messages the agents get to see
+            round_num: Index of the round the responses belong to
+            priority: Scheduling priority of the agents' requests
+            client_id: Connection the discussion runs for
+            
+        Yields:
+            Dictionary with update type and data
+        """
+        updates: asyncio.Queue = asyncio.Queue()
+        tasks = []
+        message_ids = [str(uuid.uuid4()) for _ in agents]
+        for agent, message_id in zip(agents, message_ids):
+            task = asyncio.create_task(
+                self._generate_agent_message(
+                    discussion, agent, history, round_num, priority, client_id, message_id, updates.put_nowait
+                )
+            )
+            task.add_done_callback(updates.put_nowait)
+            tasks.append(task)
+        
+        remaining = len(tasks)
+        next_index = 0
+        try:
+            while remaining:
+                update = await updates.get()
+                if not isinstance(update, asyncio.Task):
+                    yield update
+                    continue
+                
+                if ROUND_MESSAGE_ORDER == "agent":
+                    finished = []
+                    while next_index < len(tasks) and tasks[next_index].done():
+                        finished.append(tasks[next_index])
+                        next_index += 1
+                else:
+                    finished = [update]
+                
+                for task in finished:
+                    remaining -= 1
+                    try:
+                        agent_message = task.result()
+                    except LLMError as e:
+                        index = tasks.index(task)
+                        agent = agents[index]
+                        logger.warning(f"Agent {agent.id} failed to respond in round {round_num} of discussion {discussion.id}: {str(e)}")
+                        yield {
+                            "type": MessageType.AGENT_ERROR,
+                            "data": {
+                                "message_id": message_ids[index],
+                                "agent_id": agent.id,
+                                "agent_name": agent.config.name,
+                                "round": round_num,
+                                **e.to_dict()
+                            }
+                        }
+                        continue
+                    
+                    self.store.add_message(discussion, agent_message)
+                    yield {
+                        "type": MessageType.AGENT_MESSAGE,
+                        "data": agent_message.dict()
+                    }
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+    
+    async def _generate_agent_message(
+        self,
+        discussion: Discussion,
+        agent: Agent,
+        history: List[AgentMessage],
+        round_num: int,
+        priority: RequestPriority,
+        client_id: Optional[str],
+        message_id: str,
+        emit: Callable[[Dict[str, Any]], None]
+    ) -> AgentMessage:
+        """
+        Generate a single agent response
+        
+        Args:
+            discussion: Discussion being run
+            agent: Agent to respond
+            history: Messages the agent gets to see
+            round_num: Index of the round the response belongs to
+            priority: Scheduling priority of the request
+            client_id: Connection the discussion runs for
+            message_id: ID of the message, also carried by its token updates
+            emit: Callback receiving token and queue updates while the response is generated
+            
+        Returns:
+            The agent's message
+        """
+        system_prompt = agent.get_system_prompt(discussion.system_instruction, discussion.query)
+        budget = self.ollama_service.token_budget
+        shown = self._shown.get(discussion.id, {}).get(agent.id) if CONTEXT_REUSE_ENABLED else None
+        messages, keep_first, new_messages = self._format_messages_for_agent(
+            discussion, agent.id, history, round_num, shown
+        )
+        context_key = self._context_key(discussion, agent.id, round_num, shown)
+        messages = budget.fit_messages(
+            messages,
+            budget.history_budget(system_prompt, agent.config.max_tokens),
+            keep_first
+        )
+        on_queue_update = self._queue_status_callback(emit, {
+            "stage": "agent",
+            "message_id": message_id,
+            "agent_id": agent.id,
+            "agent_name": agent.config.name
+        })
+        
+        if not STREAM_TOKENS:
+            response = await self.ollama_service.generate_response(
+                model=agent.model,
+                system_prompt=system_prompt,
+                messages=messages,
+                temperature=agent.config.temperature,
+                max_tokens=agent.config.max_tokens,
+                priority=priority,
+                client_id=client_id,
+                on_queue_update=on_queue_update,
+                use_cache=not discussion.bypass_cache,
+                context_key=context_key,
+                new_messages=new_messages
+            )
+        else:
+            chunks = []
+            async for chunk in self.ollama_service.stream_response(
+                model=agent.model,
+                system_prompt=system_prompt,
+                messages=messages,
+                temperature=agent.config.temperature,
+                max_tokens=agent.config.max_tokens,
+                priority=priority,
+                client_id=client_id,
+                on_queue_update=on_queue_update,
+                use_cache=not discussion.bypass_cache,
+                context_key=context_key,
+                new_messages=new_messages
+            ):
+                chunks.append(chunk)
+                emit({
+                    "type": MessageType.AGENT_TOKEN,
+                    "data": {
+                        "message_id": message_id,
+                        "agent_id": agent.id,
+                        "agent_name": agent.config.name,
+                        "delta": chunk
+                    }
+                })
+            response = "".join(chunks)
+        
+        if context_key is not None:
+            self._shown.setdefault(discussion.id, {})[agent.id] = {msg.message_id for msg in history}
+        return agent.create_message(response, message_id, round_num)
+    
+    def _check_convergence(
+        self,
+        discussion: Discussion,
+        round_num: int,
+        threshold: Optional[float] = None
+    ) -> Optional[Convergence]:
+        """
+        Check whether the agents converged in a completed round
+        
+        Args:
+            discussion: Discussion being run
+            round_num: Index of the round that just completed
+            threshold: Similarity override from the request, CONVERGENCE_THRESHOLD if None
+            
+        Returns:
+            The convergence found, or None if the discussion should go on
+        """
+        if not CONVERGENCE_ENABLED:
+            return None
+        
+        rounds: Dict[int, Dict[str, str]] = {round_num: {}, round_num - 1: {}}
+        for msg in discussion.messages:
+            if msg.round in rounds:
+                rounds[msg.round][msg.agent_id] = msg.content
+        
+        return detect_convergence(
+            rounds[round_num],
+            rounds[round_num - 1],
+            CONVERGENCE_THRESHOLD if threshold is None else threshold
+        )
+    
+    def _queue_status_callback(
+        self,
+        emit: Callable[[Dict[str, Any]], None],
+        data: Dict[str, Any]
+    ) -> QueueUpdateCallback:
+        """
+        Build a scheduler callback that reports queue position to the client
+        
+        Args:
+            emit: Callback receiving the queue status update
+            data: Fields identifying the request the update is about
+            
+        Returns:
+            Callback for OllamaService queue updates
+        """
+        def on_queue_update(position: int, waited: float):
+            emit({
+                "type": MessageType.QUEUE_STATUS,
+                "data": {**data, "position": position, "wait_ms": int(waited * 1000)}
+            })
+        
+        return on_queue_update
+    
+    def _format_messages_for_agent(
+        self,
+        discussion: Discussion,
+        agent_id: str,
+        history: List[AgentMessage],
+        round_num: int,
+        shown: Optional[Set[str]] = None
+    ) -> Tuple[List[Dict[str, str]], int, Optional[List[Dict[str, str]]]]:
+        """
+        Format discussion messages for an agent, starting with the query
+        
+        Rounds before the previous one are replaced by their summary when one exists,
+        so only the latest round is included verbatim. Sentences repeating earlier ones
+        are left out.
+        
+        The agent's kept model state holds the query, the messages it was shown and its
+        own responses, so only the other agents' messages it was not shown are sent on
+        top of it, formatted the same way. Once a summary replaces messages the state
+        has seen, the state no longer matches and cannot be continued.
+        
+        Args:
+            discussion: Discussion being run
+            agent_id: Agent the messages are formatted for
+            history: Messages the agent gets to see
+            round_num: Index of the round the agent responds in
+            shown: Messages the agent's kept model state has seen, None if it has none
+            
+        Returns:
+            Tuple of (formatted messages, number of leading query and summary messages,
+            messages the kept state has not seen or None when it cannot be continued)
+        """
         formatted_messages = [
             {"role": "user", "content": discussion.query}
         ]
         
-        for msg in discussion.messages:
+        summary, recent = self._summarized_history(discussion, history, round_num - 2)
+        if summary:
+            formatted_messages.append(self._summary_message(summary))
+            recent_ids = {msg.message_id for msg in recent}
+            if shown is not None and any(
+                msg.message_id in shown and msg.message_id not in recent_ids for msg in history
+            ):
+                shown = None
+        keep_first = len(formatted_messages)
+        recent = self._deduplicate(discussion, recent)
+        
+        new_messages = None if shown is None else []
+        for msg in recent:
             role = "assistant" if msg.agent_id == agent_id else "user"
             prefix = "" if msg.agent_id == agent_id else f"{msg.agent_name}: "
-            formatted_messages.append({
+            formatted_message = {
                 "role": role,
                 "content": f"{prefix}{msg.content}"
-            })
+            }
+            formatted_messages.append(formatted_message)
+            if new_messages is not None and msg.agent_id != agent_id and msg.message_id not in shown:
+                new_messages.append(formatted_message)
             
-        return formatted_messages
+        return formatted_messages, keep_first, new_messages
     
-    async def _generate_consensus(self, discussion: Discussion) -> str:
+    def _context_key(
+        self,
+        discussion: Discussion,
+        agent_id: str,
+        round_num: int,
+        shown: Optional[Set[str]]
+    ) -> Optional[Tuple[str, str]]:
+        """
+        Key of an agent's kept model state, or None when no state is kept for this request
+        
+        With no state to continue from, one is only started if another round may follow.
+        
+        Args:
+            discussion: Discussion being run
+            agent_id: Agent about to respond
+            round_num: Index of the round the agent responds in
+            shown: Messages the agent's kept state has seen, None if it has none
+            
+        Returns:
+            The (discussion, agent) key, or None
+        """
+        if not CONTEXT_REUSE_ENABLED:
+            return None
+        if shown is None and round_num >= MAX_DISCUSSION_ROUNDS - 1:
+            return None
+        return (discussion.id, agent_id)
+    
+    def _summarized_history(
+        self,
+        discussion: Discussion,
+        history: List[AgentMessage],
+        last_round: int
+    ) -> Tuple[Optional[str], List[AgentMessage]]:
+        """
+        Find the latest summary covering at most last_round and the messages after it
+        
+        Args:
+            discussion: Discussion being run
+            history: Messages to split
+            last_round: Last round the summary may cover
+            
+        Returns:
+            Tuple of (summary or None, messages from rounds the summary does not cover)
+        """
+        rounds = [summarized for summarized in discussion.summaries if summarized <= last_round]
+        if not rounds:
+            return None, history
+        
+        summarized = max(rounds)
+        return discussion.summaries[summarized], [msg for msg in history if msg.round > summarized]
+    
+    def _deduplicate(self, discussion: Discussion, history: List[AgentMessage]) -> List[AgentMessage]:
+        """
+        Strip sentences that nearly repeat earlier ones from the history
+        
+        The result is shared by every prompt built from the same messages, and the
+        tokens it saves are added to the discussion's history_tokens_saved.
+        
+        Args:
+            discussion: Discussion being run
+            history: Messages in chronological order
+            
+        Returns:
+            Copies of the messages with repeated sentences removed, leaving out messages with nothing new
+        """
+        if not HISTORY_DEDUP_ENABLED or len(history) < 2:
+            return history
+        
+        result, cached = self.deduplicator.deduplicate_cached(
+            tuple(msg.message_id for msg in history),
+            [msg.content for msg in history]
+        )
+        if not result.removed_sentences:
+            return history
+        
+        discussion.history_tokens_saved += result.tokens_saved
+        if not cached:
+            logger.info(f"Removed {result.removed_sentences} repeated sentences from the history of discussion {discussion.id}, saving about {result.tokens_saved} tokens per prompt")
+        return [
+            msg.model_copy(update={"content": text})
+            for msg, text in zip(history, result.texts) if text
+        ]
+    
+    def _summary_message(self, summary: str) -> Dict[str, str]:
+        """Message carrying the summary of earlier rounds"""
+        return {"role": "user", "content": f"Summary of earlier discussion rounds:\n{summary}"}
+    
+    def _transcript(self, messages: List[AgentMessage]) -> List[Dict[str, str]]:
+        """Format agent messages as a transcript attributed to each agent"""
+        return [
+            {"role": "user", "content": f"{msg.agent_name}: {msg.content}"}
+            for msg in messages
+        ]
+    
+    async def _compact_history(
+        self,
+        discussion: Discussion,
+        round_num: int,
+        client_id: Optional[str] = None
+    ):
+        """
+        Summarize the rounds before the previous one once the history grows too long
+        
+        Each summary extends the previous one with the rounds after it, so a round is
+        only summarized once and the summary is shared by every agent.
+        
+        Args:
+            discussion: Discussion being run
+            round_num: Index of the round about to start
+            client_id: Connection the discussion runs for
+        """
+        last_round = round_num - 2
+        if last_round < 0 or last_round in discussion.summaries:
+            return
+        
+        previous, verbatim = self._summarized_history(discussion, discussion.messages, last_round)
+        budget = self.ollama_service.token_budget
+        if budget.count_messages(self._transcript(verbatim)) <= HISTORY_SUMMARY_THRESHOLD:
+            return
+        
+        pending = [msg for msg in verbatim if msg.round <= last_round]
+        if not pending:
+            return
+        
+        try:
+            summary = await self._generate_summary(discussion, previous, pending, client_id)
+        except LLMError as e:
+            # Agents get the verbatim history, fitted to their context, instead
+            logger.warning(f"Could not summarize discussion {discussion.id} up to round {last_round}: {str(e)}")
+            return
+        if summary:
+            self.store.add_summary(discussion, last_round, summary)
+            logger.info(f"Summarized {len(pending)} messages up to round {last_round} of discussion {discussion.id}")
+    
+    async def _generate_summary(
+        self,
+        discussion: Discussion,
+        previous: Optional[str],
+        messages: List[AgentMessage],
+        client_id: Optional[str] = None
+    ) -> str:
+        """
+        Generate a summary of agent messages, extending a previous summary
+        
+        Args:
+            discussion: Discussion being run
+            previous: Summary of the rounds before the messages, if any
+            messages: Agent messages to summarize
+            client_id: Connection the discussion runs for
+            
+        Returns:
+            Summary text
+        """
+        context = [{"role": "user", "content": f"Original Query: {discussion.query}"}]
+        if previous:
+            context.append(self._summary_message(previous))
+        request = {
+            "role": "user",
+            "content": "Summarize the discussion above."
+        }
+        
+        budget = self.ollama_service.token_budget
+        messages = budget.fit_messages(
+            context + self._transcript(messages),
+            budget.history_budget(HISTORY_SUMMARY_PROMPT, HISTORY_SUMMARY_MAX_TOKENS) - budget.count_messages([request]),
+            len(context)
+        )
+        messages.append(request)
+        
+        summary = await self.ollama_service.generate_response(
+            model=MODEL_NAME,
+            system_prompt=HISTORY_SUMMARY_PROMPT,
+            messages=messages,
+            temperature=0.3,  # Stay close to what the agents said
+            max_tokens=HISTORY_SUMMARY_MAX_TOKENS,
+            priority=RequestPriority.SUMMARY,
+            client_id=client_id,
+            use_cache=not discussion.bypass_cache
+        )
+        
+        return summary.strip()
+    
+    async def _generate_consensus(
+        self,
+        discussion: Discussion,
+        client_id: Optional[str] = None,
+        emit: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> str:
         """Generate consensus from agent messages"""
         system_prompt = CONSENSUS_PROMPT
         
@@ -160,26 +801,39 @@ class DiscussionManager:
             {"role": "user", "content": f"Original Query: {discussion.query}"}
         ]
         
-        # Add all agent messages
-        for msg in discussion.messages:
-            messages.append({
-                "role": "user", 
-                "content": f"{msg.agent_name}: {msg.content}"
-            })
+        # Add the latest summary and the agent messages it does not cover
+        summary, history = self._summarized_history(discussion, discussion.messages, MAX_DISCUSSION_ROUNDS)
+        if summary:
+            messages.append(self._summary_message(summary))
+        keep_first = len(messages)
+        messages.extend(self._transcript(self._deduplicate(discussion, history)))
         
         # Add request for consensus
-        messages.append({
+        request = {
             "role": "user",
             "content": "Based on the discussion above, please provide a final consensus response."
-        })
+        }
+        
+        # Keep the latest agent messages that fit next to the prompt and the response
+        budget = self.ollama_service.token_budget
+        messages = budget.fit_messages(
+            messages,
+            budget.history_budget(system_prompt, CONSENSUS_MAX_TOKENS) - budget.count_messages([request]),
+            keep_first
+        )
+        messages.append(request)
         
         # Generate consensus
         consensus = await self.ollama_service.generate_response(
-            model=MODEL_NAME,
+            model=CONSENSUS_MODEL_NAME,
             system_prompt=system_prompt,
             messages=messages,
             temperature=0.5,  # Lower temperature for more focused consensus
-            max_tokens=2048   # Allow longer consensus response
+            max_tokens=CONSENSUS_MAX_TOKENS,  # Allow longer consensus response
+            priority=RequestPriority.CONSENSUS,
+            client_id=client_id,
+            on_queue_update=self._queue_status_callback(emit, {"stage": "consensus"}) if emit else None,
+            use_cache=not discussion.bypass_cache
         )
         
         return consensus
@@ -0,0 +1,190 @@
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from loguru import logger
+
+from ollama_pool import OllamaBackend, OllamaPool
+from utils.token_budget import TokenBudgetManager
+from constants import (
+    MODEL_IDLE_EVICTION,
+    MODEL_KEEPALIVE_INTERVAL,
+    MODEL_WARMUP_ENABLED
+)
+
+
+class ModelResidency:
+    """
+    Keeps the models discussions use loaded on the Ollama servers
+    
+    Every request asks Ollama to keep its model loaded for idle_eviction seconds, so
+    a model nobody uses is unloaded once that time has passed. A model used more
+    recently than that is loaded again when no server has it anymore, for example
+    after a restart or when another model took its memory. This happens only on a
+    server with no requests in flight, so it does not slow down running generations.
+    """
+    
+    def __init__(
+        self,
+        pool: OllamaPool,
+        token_budget: TokenBudgetManager,
+        idle_eviction: Optional[float] = MODEL_IDLE_EVICTION
+    ):
+        """
+        Initialize the residency policy
+        
+        Args:
+            pool: Ollama servers the models are loaded on
+            token_budget: Budget whose context window models are loaded with, so requests do not reload them
+            idle_eviction: Seconds a model stays loaded after its last request, None while the server runs
+        """
+        self.pool = pool
+        self.token_budget = token_budget
+        self.idle_eviction = idle_eviction
+        self._last_used: Dict[str, float] = {}
+        self._warming: Set[Tuple[str, str]] = set()
+        self._task: Optional[asyncio.Task] = None
+    
+    @property
+    def keep_alive(self) -> int:
+        """Seconds Ollama keeps a model loaded after a request, -1 for as long as Ollama runs"""
+        return -1 if self.idle_eviction is None else int(self.idle_eviction)
+    
+    def record(self, model: str):
+        """Note that a request used a model"""
+        self._last_used[model] = time.monotonic()
+    
+    def is_recent(self, model: str, now: float) -> bool:
+        """Whether a model was used within the idle eviction time"""
+        last_used = self._last_used.get(model)
+        if last_used is None:
+            return False
+        return self.idle_eviction is None or now - last_used < self.idle_eviction
+    
+    async def load(self, backend: OllamaBackend, model: str):
+        """
+        Load a model into a server's memory
+        
+        Args:
+            backend: Server to load the model on
+            model: Name of the model
+        """
+        # A request without a prompt only loads the model, which can take a while for large ones
+        response = await backend.client.post(
+            "/api/generate",
+            json={
+                "model": model,
+                "keep_alive": self.keep_alive,
+                "options": {"num_ctx": self.token_budget.context_window}
+            },
+            timeout=None
+        )
+        response.raise_for_status()
+        backend.loaded_models.add(model)
+    
+    async def warm_up(self, models: List[str]):
+        """
+        Load models on every healthy server
+        
+        Servers are warmed up at once, each one a model at a time. Warming up counts
+        as a use, so the models stay loaded for the idle eviction time even before
+        the first request.
+        
+        Args:
+            models: Models to load
+        """
+        started = time.monotonic()
+        for model in models:
+            self.record(model)
+        await asyncio.gather(*(
+            self._warm(backend, models)
+            for backend in self.pool.backends if backend.healthy
+        ))
+        logger.info(f"Warmed up {len(models)} models in {time.monotonic() - started:.1f} seconds")
+    
+    async def refresh(self, models: List[str]):
+        """
+        Reload recently used models that no healthy server has loaded anymore
+        
+        Args:
+            models: Models the discussions use
+        """
+        now = time.monotonic()
+        healthy = [backend for backend in self.pool.backends if backend.healthy]
+        missing = [
+            model for model in models
+            if self.is_recent(model, now) and not any(backend.has_model(model) for backend in healthy)
+        ]
+        idle = [backend for backend in healthy if backend.outstanding == 0]
+        if not missing or not idle:
+            return
+        
+        # The idle server with the fewest models loaded has the most room
+        backend = min(idle, key=lambda backend: len(backend.loaded_models))
+        logger.info(f"Reloading {', '.join(missing)} on {backend.host}, which no server had loaded anymore")
+        await self._warm(backend, missing)
+    
+    def start(
+        self,
+        models: Callable[[], List[str]],
+        warm_up: bool = MODEL_WARMUP_ENABLED,
+        interval: float = MODEL_KEEPALIVE_INTERVAL
+    ):
+        """
+        Start warming up models in the background, then reloading recently used ones periodically
+        
+        Args:
+            models: Returns the models the discussions currently use
+            warm_up: Whether to load the models first, so the first queries need not wait for it
+            interval: Seconds between checks
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._keep_loaded(models, warm_up, interval))
+    
+    def stats(self) -> Dict[str, Any]:
+        """Idle time of each model used and the servers it is loaded on"""
+        now = time.monotonic()
+        return {
+            model: {
+                "idle_seconds": int(now - last_used),
+                "loaded_on": [backend.host for backend in self.pool.backends if backend.has_model(model)]
+            }
+            for model, last_used in self._last_used.items()
+        }
+    
+    def close(self):
+        """Stop reloading models"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+    
+    async def _keep_loaded(self, models: Callable[[], List[str]], warm_up: bool, interval: float):
+        """Warm up models, then reload recently used ones until cancelled"""
+        if warm_up:
+            try:
+                await self.warm_up(models())
+            except Exception as e:
+                logger.error(f"Error warming up models: {str(e)}")
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh(models())
+            except Exception as e:
+                logger.error(f"Error keeping models loaded: {str(e)}")
+    
+    async def _warm(self, backend: OllamaBackend, models: List[str]):
+        """Load models on one server, skipping ones already being loaded there"""
+        for model in models:
+            key = (backend.host, model)
+            if key in self._warming:
+                continue
+            
+            self._warming.add(key)
+            try:
+                started = time.monotonic()
+                await self.load(backend, model)
+                logger.info(f"Warmed up {model} on {backend.host} in {time.monotonic() - started:.1f} seconds")
+            except Exception as e:
+                logger.warning(f"Error warming up {model} on {backend.host}: {str(e) or type(e).__name__}")
+            finally:
+                self._warming.discard(key)
@@ -1,4 +1,4 @@
-from enum import Enum
+from enum import Enum, IntEnum
 from typing import Dict, List, Optional, Any
 from datetime import datetime
 import uuid
@@ -10,11 +10,27 @@ import time
 class MessageType(str, Enum):
     """Types of messages that can be sent via WebSocket"""
     QUERY = "query"
+    CANCEL = "cancel"
+    RESUME = "resume"
+    DISCUSSION_STARTED = "discussion_started"
+    DISCUSSION_CANCELLED = "discussion_cancelled"
     AGENT_MESSAGE = "agent_message"
+    AGENT_TOKEN = "agent_token"
+    AGENT_ERROR = "agent_error"
+    QUEUE_STATUS = "queue_status"
+    CONVERGED = "converged"
     CONSENSUS = "consensus"
     ERROR = "error"
 
 
+class RequestPriority(IntEnum):
+    """Scheduling priority of LLM requests, lower values are served first"""
+    CONSENSUS = 0
+    SUMMARY = 1
+    DISCUSSION = 2
+    INITIAL = 3
+
+
 class AgentMessage(BaseModel):
     """Represents a message from an agent in a discussion"""
     agent_id: str
@@ -22,6 +38,7 @@ class AgentMessage(BaseModel):
     content: str  # Add the missing content attribute
     timestamp: int = Field(default_factory=lambda: int(time.time() * 1000))
     message_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    round: int = 0  # Discussion round the message was produced in, starting at 0
 
     def to_dict(self) -> Dict[str, Any]:
         """Convert message to dictionary representation"""
@@ -30,7 +47,8 @@ class AgentMessage(BaseModel):
             "agent_name": self.agent_name,
             "content": self.content,
             "timestamp": self.timestamp,
-            "message_id": self.message_id
+            "message_id": self.message_id,
+            "round": self.round
         }
 
     @classmethod
@@ -41,7 +59,8 @@ class AgentMessage(BaseModel):
             agent_name=data["agent_name"],
             content=data["content"],
             timestamp=data["timestamp"],
-            message_id=data.get("message_id")
+            message_id=data.get("message_id"),
+            round=data.get("round", 0)
         )
 
 
@@ -49,12 +68,16 @@ class WebSocketMessage(BaseModel):
     """Message sent through WebSocket"""
     type: str
     data: Dict[str, Any]
+    discussion_id: Optional[str] = None
+    seq: Optional[int] = None  # Position of the update in its discussion, starting at 1
 
 
 class DiscussionRequest(BaseModel):
     """Request to start a new discussion"""
     query: str
     system_instruction: Optional[str] = None
+    bypass_cache: bool = False
+    convergence_threshold: Optional[float] = None  # Overrides CONVERGENCE_THRESHOLD, above 1 never stops early
 
 
 class DiscussionStatus(str, Enum):
@@ -63,6 +86,7 @@ class DiscussionStatus(str, Enum):
     IN_PROGRESS = "in_progress"
     COMPLETED = "completed"
     FAILED = "failed"
+    CANCELLED = "cancelled"
 
 
 class Discussion(BaseModel):
@@ -70,7 +94,10 @@ class Discussion(BaseModel):
     id: str
     query: str
     system_instruction: Optional[str] = None
+    bypass_cache: bool = False
     messages: List[AgentMessage] = Field(default_factory=list)
+    summaries: Dict[int, str] = Field(default_factory=dict)  # Summary of rounds 0..N, keyed by N
+    history_tokens_saved: int = 0  # Prompt tokens saved by removing repeated sentences from the history
     consensus: Optional[str] = None
     status: DiscussionStatus = DiscussionStatus.PENDING
 
@@ -83,6 +110,8 @@ class AgentConfig(BaseModel):
     expertise: List[str]
     temperature: float = 0.7
     max_tokens: int = 1024
+    reference_budget: Optional[int] = None
+    model: Optional[str] = None  # Ollama model the agent uses, MODEL_NAME if omitted
     system_prompt: Optional[str] = None
 
 
@@ -92,3 +121,4 @@ class AgentInfo(BaseModel):
     name: str
     description: str
     expertise: List[str]
+    model: str
@@ -0,0 +1,298 @@
+import asyncio
+import itertools
+import time
+from contextlib import asynccontextmanager
+from enum import Enum
+from typing import AsyncIterator, Collection, Dict, List, Optional, Sequence, Set
+
+import httpx
+from loguru import logger
+
+from constants import (
+    DEFAULT_TIMEOUT,
+    OLLAMA_HOSTS,
+    OLLAMA_MAX_CONNECTIONS,
+    OLLAMA_MAX_KEEPALIVE_CONNECTIONS,
+    OLLAMA_KEEPALIVE_EXPIRY,
+    OLLAMA_CONNECT_TIMEOUT,
+    OLLAMA_HEALTH_CHECK_INTERVAL,
+    OLLAMA_HEALTH_CHECK_TIMEOUT,
+    OLLAMA_MAX_FAILURES,
+    OLLAMA_BREAKER_COOLDOWN,
+    LLM_MAX_CONCURRENT_REQUESTS
+)
+
+
+class CircuitState(str, Enum):
+    """Whether a backend receives requests"""
+    CLOSED = "closed"  # Healthy, receives requests
+    OPEN = "open"  # Failing, receives no requests until the cooldown ends
+    HALF_OPEN = "half_open"  # Receives one trial request that decides whether it recovered
+
+
+class OllamaBackend:
+    """One Ollama server in the pool, with its connections and routing state"""
+    
+    def __init__(
+        self,
+        host: str,
+        max_connections: int,
+        max_keepalive_connections: int,
+        keepalive_expiry: float
+    ):
+        """
+        Initialize the backend with a pooled HTTP client
+        
+        Args:
+            host: Base URL of the Ollama server
+            max_connections: Maximum open connections to the server
+            max_keepalive_connections: Idle connections kept open for reuse
+            keepalive_expiry: Seconds an idle connection is kept open
+        """
+        self.host = host
+        self.client = httpx.AsyncClient(
+            base_url=host,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry
+            ),
+            timeout=httpx.Timeout(DEFAULT_TIMEOUT, connect=OLLAMA_CONNECT_TIMEOUT)
+        )
+        self.outstanding = 0
+        self.state = CircuitState.CLOSED
+        self.opened_at = 0.0
+        self.probing = False
+        self.failures = 0
+        self.loaded_models: Set[str] = set()
+        self.requests = 0
+        self.errors = 0
+        self.last_checked: Optional[float] = None
+    
+    @property
+    def healthy(self) -> bool:
+        """Whether the backend's circuit is not open"""
+        return self.state != CircuitState.OPEN
+    
+    def has_model(self, model: str) -> bool:
+        """Whether the model is loaded in the server's memory, as of the last report"""
+        return model in self.loaded_models or f"{model}:latest" in self.loaded_models
+    
+    def stats(self) -> Dict[str, object]:
+        """Routing state and counters"""
+        return {
+            "host": self.host,
+            "healthy": self.healthy,
+            "state": self.state.value,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "errors": self.errors,
+            "loaded_models": sorted(self.loaded_models)
+        }
+
+
+class OllamaPool:
+    """
+    Pool of Ollama servers that requests are spread across
+    
+    Each request goes to a healthy backend that has the model loaded and a free slot,
+    or else to the backend with the fewest requests in flight. Among those with the
+    model loaded, a request can favour the backend that holds its model state.
+    
+    Every backend has a circuit breaker. Its circuit opens after OLLAMA_MAX_FAILURES
+    consecutive connection errors, server errors or timeouts, or a failed health
+    check, and the backend then gets no requests. Once the cooldown ends or a health
+    check succeeds, a single trial request is let through, and its outcome closes
+    the circuit again or reopens it.
+    """
+    
+    def __init__(
+        self,
+        hosts: Sequence[str] = OLLAMA_HOSTS,
+        max_connections: int = OLLAMA_MAX_CONNECTIONS,
+        max_keepalive_connections: int = OLLAMA_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry: float = OLLAMA_KEEPALIVE_EXPIRY,
+        max_concurrent_requests: int = LLM_MAX_CONCURRENT_REQUESTS,
+        max_failures: int = OLLAMA_MAX_FAILURES,
+        cooldown: float = OLLAMA_BREAKER_COOLDOWN
+    ):
+        """
+        Initialize the pool
+        
+        Args:
+            hosts: Base URLs of the Ollama servers
+            max_connections: Maximum open connections to each server
+            max_keepalive_connections: Idle connections kept open for reuse, per server
+            keepalive_expiry: Seconds an idle connection is kept open
+            max_concurrent_requests: Generations each server runs at once before others are preferred
+            max_failures: Consecutive failed requests after which a server's circuit opens
+            cooldown: Seconds an open circuit rejects requests before a trial request
+        """
+        if not hosts:
+            raise ValueError("At least one Ollama host is required")
+        self.backends: List[OllamaBackend] = [
+            OllamaBackend(host, max_connections, max_keepalive_connections, keepalive_expiry)
+            for host in dict.fromkeys(hosts)
+        ]
+        self.max_concurrent_requests = max_concurrent_requests
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+        self._turn = itertools.count()
+        self._health_task: Optional[asyncio.Task] = None
+    
+    def select(
+        self,
+        model: str,
+        exclude: Collection[OllamaBackend] = (),
+        prefer: Optional[str] = None
+    ) -> OllamaBackend:
+        """
+        Pick the backend for a request
+        
+        Args:
+            model: Model the request is for
+            exclude: Backends to avoid unless no other one can take the request
+            prefer: Host to favour when it has a free slot, such as the one holding a conversation's model state
+        
+        Returns:
+            The chosen backend, from all of them if none is available
+        """
+        now = time.monotonic()
+        available = [backend for backend in self.backends if self._available(backend, now)] or self.backends
+        candidates = [backend for backend in available if backend not in exclude] or available
+        # Rotate the starting point so equally loaded backends take turns
+        offset = next(self._turn) % len(candidates)
+        rotated = candidates[offset:] + candidates[:offset]
+        return min(
+            rotated,
+            key=lambda backend: (
+                backend.outstanding >= self.max_concurrent_requests,
+                not backend.has_model(model),
+                backend.host != prefer,
+                backend.outstanding
+            )
+        )
+    
+    @asynccontextmanager
+    async def acquire(
+        self,
+        model: str,
+        exclude: Collection[OllamaBackend] = (),
+        prefer: Optional[str] = None
+    ) -> AsyncIterator[OllamaBackend]:
+        """
+        Route a request to a backend for the duration of the block
+        
+        Connection errors, server errors and timeouts raised inside the block count
+        against the backend. A block that completes closes its circuit and marks the
+        model as loaded there.
+        
+        Args:
+            model: Model the request is for
+            exclude: Backends to avoid unless no other one can take the request
+            prefer: Host to favour when it has a free slot
+        
+        Yields:
+            The backend to send the request to
+        """
+        backend = self.select(model, exclude, prefer)
+        probe = backend.state == CircuitState.HALF_OPEN and not backend.probing
+        if probe:
+            backend.probing = True
+        backend.outstanding += 1
+        backend.requests += 1
+        try:
+            yield backend
+        except (httpx.TransportError, httpx.HTTPStatusError, asyncio.TimeoutError) as e:
+            if not isinstance(e, httpx.HTTPStatusError) or e.response.status_code >= 500:
+                self._record_failure(backend, e)
+            raise
+        else:
+            self._record_success(backend)
+            backend.loaded_models.add(model)
+        finally:
+            backend.outstanding -= 1
+            if probe:
+                backend.probing = False
+    
+    def start_health_checks(self, interval: float = OLLAMA_HEALTH_CHECK_INTERVAL):
+        """
+        Start checking every backend periodically
+        
+        Args:
+            interval: Seconds between checks
+        """
+        if self._health_task is None:
+            self._health_task = asyncio.create_task(self._check_periodically(interval))
+    
+    async def check_health(self):
+        """Ask every backend which models it has loaded, opening the circuit of those that do not answer"""
+        await asyncio.gather(*(self._check(backend) for backend in self.backends))
+    
+    def stats(self) -> List[Dict[str, object]]:
+        """Routing state and counters of every backend"""
+        return [backend.stats() for backend in self.backends]
+    
+    async def close(self):
+        """Stop the health checks and close all pooled connections"""
+        if self._health_task is not None:
+            self._health_task.cancel()
+            self._health_task = None
+        await asyncio.gather(*(backend.client.aclose() for backend in self.backends))
+    
+    async def _check_periodically(self, interval: float):
+        """Check backends until cancelled"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.check_health()
+            except Exception as e:
+                logger.error(f"Error checking Ollama hosts: {str(e)}")
+    
+    async def _check(self, backend: OllamaBackend):
+        """Refresh a backend's loaded models, opening its circuit or letting a trial request through"""
+        backend.last_checked = time.time()
+        try:
+            response = await backend.client.get("/api/ps", timeout=OLLAMA_HEALTH_CHECK_TIMEOUT)
+            response.raise_for_status()
+            models = response.json().get("models", [])
+        except Exception as e:
+            if backend.state != CircuitState.OPEN:
+                self._open(backend, f"failed health check: {str(e) or type(e).__name__}")
+            return
+        
+        backend.loaded_models = {model.get("name") or model.get("model") for model in models}
+        if backend.state == CircuitState.OPEN:
+            logger.info(f"Ollama host {backend.host} answers health checks again, letting a trial request through")
+            backend.state = CircuitState.HALF_OPEN
+    
+    def _available(self, backend: OllamaBackend, now: float) -> bool:
+        """Whether a backend may take a request, moving an open circuit to half-open after the cooldown"""
+        if backend.state == CircuitState.OPEN and now - backend.opened_at >= self.cooldown:
+            backend.state = CircuitState.HALF_OPEN
+        if backend.state == CircuitState.HALF_OPEN:
+            return not backend.probing
+        return backend.state == CircuitState.CLOSED
+    
+    def _open(self, backend: OllamaBackend, reason: str):
+        """Stop sending requests to a backend until the cooldown ends"""
+        logger.warning(f"Opening circuit of Ollama host {backend.host} after {reason}")
+        backend.state = CircuitState.OPEN
+        backend.opened_at = time.monotonic()
+    
+    def _record_success(self, backend: OllamaBackend):
+        """Reset a backend's failure count, closing its circuit"""
+        backend.failures = 0
+        if backend.state != CircuitState.CLOSED:
+            logger.info(f"Closing circuit of Ollama host {backend.host}")
+            backend.state = CircuitState.CLOSED
+    
+    def _record_failure(self, backend: OllamaBackend, error: Exception):
+        """Count a failed request, opening the circuit after too many in a row or a failed trial"""
+        backend.errors += 1
+        backend.failures += 1
+        reason = str(error) or type(error).__name__
+        if backend.state == CircuitState.HALF_OPEN:
+            self._open(backend, f"failed trial request: {reason}")
+        elif backend.state == CircuitState.CLOSED and backend.failures >= self.max_failures:
+            self._open(backend, f"{backend.failures} failed requests: {reason}")
@@ -1,47 +1,342 @@
 import asyncio
 import json
-from typing import Dict, List, Optional, AsyncGenerator
+from typing import Dict, List, Optional, AsyncGenerator, Any, Callable, Sequence, Tuple
 
-import ollama
+import httpx
 from loguru import logger
 
-from constants import DEFAULT_TIMEOUT, ERROR_MODEL_UNAVAILABLE
+from models import RequestPriority
+from model_residency import ModelResidency
+from ollama_pool import OllamaBackend, OllamaPool
+from request_scheduler import QueueUpdateCallback, RequestScheduler
+from utils.latency_tracker import LatencyTracker
+from utils.response_cache import ResponseCache
+from utils.token_budget import TokenBudgetManager
+from constants import (
+    DEFAULT_TIMEOUT,
+    ERROR_MODEL_UNAVAILABLE,
+    OLLAMA_HOSTS,
+    OLLAMA_MAX_CONNECTIONS,
+    OLLAMA_MAX_KEEPALIVE_CONNECTIONS,
+    OLLAMA_KEEPALIVE_EXPIRY,
+    LLM_MAX_CONCURRENT_REQUESTS,
+    RESPONSE_CACHE_ENABLED,
+    HEDGING_ENABLED,
+    HEDGE_QUANTILE,
+    HEDGE_MIN_DELAY
+)
+
+# Mark the end of an attempt's response, and the moment a late request is hedged
+_DONE = object()
+_HEDGE = object()
+
+
+class LLMError(Exception):
+    """A request to the LLM that produced no usable response"""
+    
+    TIMEOUT = "timeout"  # No response within DEFAULT_TIMEOUT
+    UNAVAILABLE = "unavailable"  # No server could be reached
+    BACKEND = "backend"  # A server answered with an error
+    
+    def __init__(self, kind: str, message: str, host: Optional[str] = None):
+        """
+        Initialize the error
+        
+        Args:
+            kind: What went wrong, one of TIMEOUT, UNAVAILABLE or BACKEND
+            message: Description of the error
+            host: Server the failed request was sent to, if any
+        """
+        super().__init__(message)
+        self.kind = kind
+        self.host = host
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Error details that can be sent to clients"""
+        return {"error": self.kind, "message": str(self)}
+
+
+def _as_llm_error(error: Exception, host: Optional[str]) -> LLMError:
+    """Describe an exception raised by a request as an LLMError"""
+    if isinstance(error, LLMError):
+        return error
+    if isinstance(error, asyncio.TimeoutError):
+        return LLMError(LLMError.TIMEOUT, f"No response within {DEFAULT_TIMEOUT} seconds", host)
+    if isinstance(error, httpx.TransportError):
+        return LLMError(LLMError.UNAVAILABLE, str(error) or type(error).__name__, host)
+    return LLMError(LLMError.BACKEND, str(error) or type(error).__name__, host)
+
+
+def _chunk_text(chunk: Dict[str, Any]) -> str:
+    """Response text in a reply from the chat or the generate endpoint"""
+    if "message" in chunk:
+        return chunk["message"]["content"]
+    return chunk.get("response", "")
+
+
+class _Context:
+    """Model state Ollama returned after a response, from which the conversation can continue"""
+    
+    def __init__(self, model: str, system_prompt: str, tokens: List[int], host: str):
+        self.model = model
+        self.system_prompt = system_prompt
+        self.tokens = tokens
+        self.host = host
+
+
+class _HedgedRequest:
+    """
+    Attempts at one request, possibly on different servers
+    
+    Every attempt puts (attempt index, item) on a shared queue, where an item is a
+    chunk of response text, _DONE once the response is complete, or an LLMError.
+    Attempts that complete keep the host and the model state the server returned.
+    """
+    
+    def __init__(
+        self,
+        pool: OllamaPool,
+        scheduler: RequestScheduler,
+        tracker: LatencyTracker,
+        model: str,
+        endpoint: str,
+        payload: Dict[str, Any],
+        priority: RequestPriority,
+        client_id: Optional[str],
+        deadline: float,
+        prefer: Optional[str] = None
+    ):
+        self.pool = pool
+        self.scheduler = scheduler
+        self.tracker = tracker
+        self.model = model
+        self.endpoint = endpoint
+        self.payload = payload
+        self.priority = priority
+        self.client_id = client_id
+        self.deadline = deadline
+        self.prefer = prefer
+        self.results: asyncio.Queue = asyncio.Queue()
+        self.attempts: List[asyncio.Task] = []
+        self.winner: Optional[int] = None
+        self.contexts: Dict[int, Tuple[str, Optional[List[int]]]] = {}
+        self._used: List[OllamaBackend] = []
+    
+    def launch(self, own_slot: bool = False):
+        """
+        Start another attempt, on a server not tried yet if one is available
+        
+        Args:
+            own_slot: Whether the attempt waits for a scheduler slot of its own instead of using the caller's
+        """
+        index = len(self.attempts)
+        self.attempts.append(asyncio.create_task(self._run(index, own_slot)))
+    
+    def choose(self, index: int):
+        """Keep the attempt that answered first and cancel the others"""
+        self.winner = index
+        self.cancel(keep=index)
+    
+    def cancel(self, keep: Optional[int] = None):
+        """Cancel every attempt except keep, closing their connections"""
+        for index, task in enumerate(self.attempts):
+            if index != keep and not task.done():
+                task.cancel()
+    
+    async def _run(self, index: int, own_slot: bool):
+        """Run an attempt, in a scheduler slot of its own if requested"""
+        if not own_slot:
+            await self._attempt(index)
+            return
+        async with self.scheduler.slot(self.priority, self.client_id, model=self.model):
+            await self._attempt(index)
+    
+    async def _attempt(self, index: int):
+        """Send the request to a server, putting its response on the queue"""
+        loop = asyncio.get_event_loop()
+        started = loop.time()
+        answered = False
+        host = None
+        try:
+            async with self.pool.acquire(self.model, self._used, self.prefer) as backend:
+                host = backend.host
+                self._used.append(backend)
+                async for content in self._chunks(index, backend):
+                    if not answered:
+                        answered = True
+                        self.tracker.record(loop.time() - started)
+                    self.results.put_nowait((index, content))
+            if not answered:
+                self.tracker.record(loop.time() - started)
+            self.results.put_nowait((index, _DONE))
+        except asyncio.CancelledError:
+            if not answered and self.winner is not None and index < self.winner:
+                # A late attempt that lost still tells how long requests can take
+                self.tracker.record(loop.time() - started)
+            raise
+        except Exception as e:
+            self.results.put_nowait((index, _as_llm_error(e, host)))
+    
+    async def _chunks(self, index: int, backend: OllamaBackend) -> AsyncGenerator[str, None]:
+        """Send the request to a server, yielding response text as it arrives"""
+        loop = asyncio.get_event_loop()
+        
+        def remaining() -> float:
+            return max(self.deadline - loop.time(), 0)
+        
+        if not self.payload["stream"]:
+            response = await asyncio.wait_for(
+                backend.client.post(self.endpoint, json=self.payload),
+                timeout=remaining()
+            )
+            response.raise_for_status()
+            body = response.json()
+            self.contexts[index] = (backend.host, body.get("context"))
+            yield _chunk_text(body)
+            return
+        
+        # Connecting and waiting for the headers must not outlast the deadline either
+        async with backend.client.stream(
+            "POST", self.endpoint, json=self.payload, timeout=httpx.Timeout(remaining())
+        ) as response:
+            response.raise_for_status()
+            lines = response.aiter_lines()
+            
+            while True:
+                try:
+                    line = await asyncio.wait_for(lines.__anext__(), timeout=remaining())
+                except StopAsyncIteration:
+                    break
+                if not line:
+                    continue
+                
+                chunk = json.loads(line)
+                if "error" in chunk:
+                    raise LLMError(LLMError.BACKEND, chunk["error"], backend.host)
+                
+                content = _chunk_text(chunk)
+                if content:
+                    yield content
+                if chunk.get("done"):
+                    self.contexts[index] = (backend.host, chunk.get("context"))
+                    break
 
 
 class OllamaService:
     """Service for interacting with Ollama LLM API"""
     
-    async def ensure_model_exists(self, model_name: str) -> bool:
+    def __init__(
+        self,
+        hosts: Sequence[str] = OLLAMA_HOSTS,
+        max_connections: int = OLLAMA_MAX_CONNECTIONS,
+        max_keepalive_connections: int = OLLAMA_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry: float = OLLAMA_KEEPALIVE_EXPIRY,
+        max_concurrent_requests: int = LLM_MAX_CONCURRENT_REQUESTS,
+        token_budget: Optional[TokenBudgetManager] = None
+    ):
+        """
+        Initialize the service with a pool of Ollama servers
+        
+        Args:
+            hosts: Base URLs of the Ollama servers requests are spread across
+            max_connections: Maximum open connections to each server
+            max_keepalive_connections: Idle connections kept open for reuse, per server
+            keepalive_expiry: Seconds an idle connection is kept open
+            max_concurrent_requests: Generations running at once on each server, across all clients
+            token_budget: Context window budget requests are fitted to, a default one is created if omitted
+        """
+        self.token_budget = token_budget or TokenBudgetManager()
+        self.pool = OllamaPool(
+            hosts,
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+            max_concurrent_requests=max_concurrent_requests
+        )
+        self.scheduler = RequestScheduler(max_concurrent_requests * len(self.pool.backends))
+        self.residency = ModelResidency(self.pool, self.token_budget)
+        self.cache: Optional[ResponseCache] = ResponseCache() if RESPONSE_CACHE_ENABLED else None
+        self._latency: Dict[Tuple[str, bool], LatencyTracker] = {}
+        self._contexts: Dict[str, Dict[str, _Context]] = {}
+        self.context_continuations = 0
+        self.context_tokens_reused = 0
+    
+    async def close(self):
+        """Stop keeping models loaded and close all pooled connections and the response cache"""
+        self.residency.close()
+        await self.pool.close()
+        if self.cache:
+            self.cache.close()
+    
+    async def ensure_model_exists(self, model_name: str, preload: bool = False) -> bool:
         """
-        Check if model exists locally and pull if not
+        Check if model exists on every Ollama server and pull it where it does not
         
         Args:
             model_name: Name of the model to check/pull
+            preload: Whether to also load the model into memory
             
         Returns:
-            True if model is available, False otherwise
+            True if model is available on at least one server, False otherwise
+        """
+        return (await self.ensure_models_exist([model_name], preload))[model_name]
+    
+    async def ensure_models_exist(self, model_names: Sequence[str], preload: bool = True) -> Dict[str, bool]:
         """
+        Check that models exist on every Ollama server, pulling them where they do not
+        
+        Servers are prepared at once, but each one handles the models one after
+        another so that pulls and loads do not compete for the same server.
+        
+        Args:
+            model_names: Names of the models to check/pull
+            preload: Whether to also load the models into memory, so the first requests do not wait for it
+            
+        Returns:
+            Whether each model is available on at least one server, by model name
+        """
+        async def prepare(backend: OllamaBackend) -> List[bool]:
+            return [await self._ensure_model_on(backend, name, preload) for name in model_names]
+        
+        results = await asyncio.gather(*(prepare(backend) for backend in self.pool.backends))
+        available = {
+            name: any(result[index] for result in results)
+            for index, name in enumerate(model_names)
+        }
+        for name, ok in available.items():
+            if not ok:
+                logger.error(f"{ERROR_MODEL_UNAVAILABLE} ({name})")
+        return available
+    
+    async def _ensure_model_on(self, backend: OllamaBackend, model_name: str, preload: bool) -> bool:
+        """Check if model exists on one server, pull it if not and optionally load it"""
         try:
-            # Check if model exists in a non-blocking way
-            loop = asyncio.get_event_loop()
-            models = await loop.run_in_executor(
-                None, lambda: ollama.list()
-            )
+            response = await backend.client.get("/api/tags")
+            response.raise_for_status()
+            models = response.json()
             
             model_exists = any(model["name"] == model_name for model in models.get("models", []))
             
             if not model_exists:
-                logger.info(f"Model {model_name} not found. Downloading...")
-                await loop.run_in_executor(
-                    None, lambda: ollama.pull(model_name)
+                logger.info(f"Model {model_name} not found on {backend.host}. Downloading...")
+                # Pulling can take far longer than a generation, so it is not time limited
+                response = await backend.client.post(
+                    "/api/pull",
+                    json={"name": model_name, "stream": False},
+                    timeout=None
                 )
-                logger.info(f"Model {model_name} downloaded successfully")
+                response.raise_for_status()
+                logger.info(f"Model {model_name} downloaded successfully to {backend.host}")
             else:
-                logger.info(f"Model {model_name} already exists")
+                logger.info(f"Model {model_name} already exists on {backend.host}")
+            
+            if preload:
+                await self.residency.load(backend, model_name)
+                logger.info(f"Model {model_name} loaded on {backend.host}")
                 
             return True
         except Exception as e:
-            logger.error(f"Error checking/pulling model: {str(e)}")
+            logger.error(f"Error checking/pulling model on {backend.host}: {str(e)}")
             return False
             
     async def generate_response(
@@ -50,49 +345,476 @@ class OllamaService:
         system_prompt: str, 
         messages: List[Dict[str, str]],
         temperature: float = 0.7,
-        max_tokens: int = 1024
+        max_tokens: int = 1024,
+        priority: RequestPriority = RequestPriority.DISCUSSION,
+        client_id: Optional[str] = None,
+        on_queue_update: Optional[QueueUpdateCallback] = None,
+        use_cache: bool = True,
+        context_key: Optional[Tuple[str, str]] = None,
+        new_messages: Optional[List[Dict[str, str]]] = None
     ) -> str:
         """
         Generate a response from the LLM
         
+        The request waits in the scheduler queue until a slot is free, then goes to the
+        least loaded server in the pool and is hedged if it runs late. Cancelling the
+        calling task or hitting the timeout closes the underlying connections, which
+        makes Ollama abort the generation. Raises LLMError if no response was produced.
+        
+        With a context_key, the model state Ollama returns is kept, and the next request
+        for the same key sends only new_messages on top of it.
+        
         Args:
             model: Name of the model to use
             system_prompt: System instructions for the model
             messages: List of conversation messages
             temperature: Sampling temperature (0.0-1.0)
             max_tokens: Maximum response length
+            priority: Scheduling priority of the request
+            client_id: Connection the request is made for, used for fair scheduling
+            on_queue_update: Callback receiving (queue position, seconds waited)
+            use_cache: Whether the response cache may serve and store this request
+            context_key: (conversation, participant) whose model state is kept between requests
+            new_messages: Messages since the participant's last response, sent instead of messages when its model state is kept
             
         Returns:
             Generated response text
         """
+        chunks = []
+        generation = self._respond(
+            model, system_prompt, messages, temperature, max_tokens, False,
+            priority, client_id, on_queue_update, use_cache, context_key, new_messages
+        )
         try:
-            loop = asyncio.get_event_loop()
+            async for chunk in generation:
+                chunks.append(chunk)
+        finally:
+            await generation.aclose()
+        return "".join(chunks)
+    
+    async def stream_response(
+        self, 
+        model: str, 
+        system_prompt: str, 
+        messages: List[Dict[str, str]],
+        temperature: float = 0.7,
+        max_tokens: int = 1024,
+        priority: RequestPriority = RequestPriority.DISCUSSION,
+        client_id: Optional[str] = None,
+        on_queue_update: Optional[QueueUpdateCallback] = None,
+        use_cache: bool = True,
+        context_key: Optional[Tuple[str, str]] = None,
+        new_messages: Optional[List[Dict[str, str]]] = None
+    ) -> AsyncGenerator[str, None]:
+        """
+        Generate a response from the LLM, yielding partial text as it is produced
+        
+        Raises LLMError if the response could not be produced, possibly after some
+        text was already yielded.
+        
+        Args:
+            model: Name of the model to use
+            system_prompt: System instructions for the model
+            messages: List of conversation messages
+            temperature: Sampling temperature (0.0-1.0)
+            max_tokens: Maximum response length
+            priority: Scheduling priority of the request
+            client_id: Connection the request is made for, used for fair scheduling
+            on_queue_update: Callback receiving (queue position, seconds waited)
+            use_cache: Whether the response cache may serve and store this request
+            context_key: (conversation, participant) whose model state is kept between requests
+            new_messages: Messages since the participant's last response, sent instead of messages when its model state is kept
             
-            formatted_messages = self._format_messages(messages)
+        Yields:
+            Chunks of generated response text
+        """
+        generation = self._respond(
+            model, system_prompt, messages, temperature, max_tokens, True,
+            priority, client_id, on_queue_update, use_cache, context_key, new_messages
+        )
+        try:
+            async for chunk in generation:
+                yield chunk
+        finally:
+            await generation.aclose()
+    
+    def release_contexts(self, conversation_id: str):
+        """
+        Forget the model state kept for a conversation's participants
+        
+        Args:
+            conversation_id: First part of the context keys to release
+        """
+        self._contexts.pop(conversation_id, None)
+    
+    def context_stats(self) -> Dict[str, int]:
+        """Kept model states and how much processing continuing from them saved"""
+        return {
+            "kept": sum(len(contexts) for contexts in self._contexts.values()),
+            "continued": self.context_continuations,
+            "tokens_reused": self.context_tokens_reused
+        }
+    
+    def latency_stats(self) -> Dict[str, Any]:
+        """Recent latencies and hedging delay per model and response mode"""
+        return {
+            f"{model} ({'stream' if stream else 'full'})": {
+                "samples": len(tracker),
+                "p50": tracker.quantile(0.5),
+                "p95": tracker.quantile(0.95),
+                "hedge_delay": self._hedge_delay(tracker)
+            }
+            for (model, stream), tracker in self._latency.items()
+        }
+    
+    async def _respond(
+        self,
+        model: str,
+        system_prompt: str,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        stream: bool,
+        priority: RequestPriority,
+        client_id: Optional[str],
+        on_queue_update: Optional[QueueUpdateCallback],
+        use_cache: bool,
+        context_key: Optional[Tuple[str, str]],
+        new_messages: Optional[List[Dict[str, str]]]
+    ) -> AsyncGenerator[str, None]:
+        """
+        Generate a response, from the cache or on top of kept model state when possible
+        
+        With a context_key, a conversation that only holds its first message goes to
+        the generate endpoint, which returns the model state after the response. The
+        next request sends only new_messages with that state, preferably to the server
+        that produced it, so the earlier conversation is not processed again. When the
+        state is missing, belongs to another model or system prompt, would not fit in
+        the context window or is rejected by the server, the full messages go to the
+        chat endpoint instead and the state is dropped.
+        
+        Args:
+            model: Name of the model to use
+            system_prompt: System instructions for the model
+            messages: Full list of conversation messages
+            temperature: Sampling temperature (0.0-1.0)
+            max_tokens: Maximum response length
+            stream: Whether the response should be streamed
+            priority: Scheduling priority of the request
+            client_id: Connection the request is made for, used for fair scheduling
+            on_queue_update: Callback receiving (queue position, seconds waited)
+            use_cache: Whether the response cache may serve and store this request
+            context_key: (conversation, participant) whose model state is kept between requests
+            new_messages: Messages since the participant's last response
             
-            response = await asyncio.wait_for(
-                loop.run_in_executor(
-                    None,
-                    lambda: ollama.chat(
-                        model=model,
-                        messages=formatted_messages,
-                        options={
-                            "temperature": temperature,
-                            "num_predict": max_tokens,
-                            "system": system_prompt
-                        }
-                    )
-                ),
-                timeout=DEFAULT_TIMEOUT
+        Yields:
+            Chunks of generated response text
+        """
+        cache_key = self._cache_key(model, system_prompt, messages, temperature, max_tokens, use_cache)
+        if cache_key:
+            cached = await self.cache.get(cache_key)
+            if cached is not None:
+                # The kept model state does not include this response anymore
+                self._drop_context(context_key)
+                yield cached
+                return
+        
+        # Requests to try in order, each an (endpoint, payload, preferred host)
+        plans: List[Tuple[str, Dict[str, Any], Optional[str]]] = []
+        context = self._continuable_context(model, system_prompt, max_tokens, context_key, new_messages)
+        if context is not None:
+            payload = self._build_generate_payload(
+                model, None, new_messages, context.tokens, temperature, max_tokens, stream
+            )
+            plans.append(("/api/generate", payload, context.host))
+        if context_key is not None and len(messages) == 1 and messages[0]["role"] == "user":
+            payload = self._build_generate_payload(
+                model, system_prompt, messages, None, temperature, max_tokens, stream
             )
+            plans.append(("/api/generate", payload, None))
+        else:
+            payload = self._build_chat_payload(
+                model, system_prompt, messages, temperature, max_tokens, stream
+            )
+            plans.append(("/api/chat", payload, None))
+        
+        def on_context(host: Optional[str], tokens: Optional[List[int]]):
+            # A server that returns no state cannot be continued from
+            self._keep_context(context_key, _Context(model, system_prompt, tokens, host) if tokens else None)
+        
+        chunks = []
+        for attempt, (endpoint, payload, prefer) in enumerate(plans):
+            if endpoint == "/api/chat":
+                self._drop_context(context_key)
+            generation = self._generate(
+                model, endpoint, payload, priority, client_id, on_queue_update,
+                prefer, on_context if endpoint == "/api/generate" else None
+            )
+            try:
+                async for chunk in generation:
+                    chunks.append(chunk)
+                    yield chunk
+                if context is not None and attempt == 0:
+                    self.context_continuations += 1
+                    self.context_tokens_reused += len(context.tokens)
+                break
+            except LLMError as e:
+                if chunks or attempt == len(plans) - 1 or e.kind != LLMError.BACKEND:
+                    raise
+                logger.warning(f"Could not continue {model} from its kept state, sending the full conversation: {str(e)}")
+                self._drop_context(context_key)
+            finally:
+                await generation.aclose()
+        
+        if cache_key:
+            await self.cache.set(cache_key, "".join(chunks))
+    
+    async def _generate(
+        self,
+        model: str,
+        endpoint: str,
+        payload: Dict[str, Any],
+        priority: RequestPriority,
+        client_id: Optional[str],
+        on_queue_update: Optional[QueueUpdateCallback],
+        prefer: Optional[str] = None,
+        on_context: Optional[Callable[[Optional[str], Optional[List[int]]], None]] = None
+    ) -> AsyncGenerator[str, None]:
+        """
+        Run a request on the pool, hedging it when it runs late
+        
+        The request goes to one server first. If it has produced nothing once the
+        recent HEDGE_QUANTILE latency has passed and a scheduler slot is free, a
+        duplicate goes to another server. An attempt that fails before producing
+        anything is retried on another server right away. The first attempt to produce
+        output is kept and the other one is cancelled.
+        
+        Args:
+            model: Name of the model to use
+            endpoint: Ollama endpoint the request is sent to
+            payload: Request body for the endpoint
+            priority: Scheduling priority of the request
+            client_id: Connection the request is made for, used for fair scheduling
+            on_queue_update: Callback receiving (queue position, seconds waited)
+            prefer: Host to send the request to when it has a free slot
+            on_context: Callback receiving the host and the model state returned with the complete response
             
-            return response["message"]["content"]
-        except asyncio.TimeoutError:
-            logger.error(f"Request to Ollama timed out after {DEFAULT_TIMEOUT} seconds")
-            return "I'm sorry, but I'm taking too long to respond. Please try again with a simpler query."
-        except Exception as e:
-            logger.error(f"Error generating response: {str(e)}")
-            return "I encountered an error while processing your request."
+        Yields:
+            Chunks of generated response text from the attempt that answered first
+        """
+        tracker = self._latency.setdefault((model, payload["stream"]), LatencyTracker())
+        self.residency.record(model)
+        
+        async with self.scheduler.slot(priority, client_id, on_queue_update, model):
+            loop = asyncio.get_event_loop()
+            request = _HedgedRequest(
+                self.pool, self.scheduler, tracker, model, endpoint, payload, priority, client_id,
+                deadline=loop.time() + DEFAULT_TIMEOUT,
+                prefer=prefer
+            )
+            hedge_delay = self._hedge_delay(tracker)
+            timer = None
+            if hedge_delay is not None:
+                timer = loop.call_later(hedge_delay, request.results.put_nowait, (None, _HEDGE))
+            request.launch()
+            failed = 0
+            
+            try:
+                while True:
+                    index, item = await request.results.get()
+                    if item is _HEDGE:
+                        if request.winner is None and len(request.attempts) == 1 and self.scheduler.has_free_slot:
+                            logger.info(f"Hedging {model} request with no response after {hedge_delay:.1f} seconds")
+                            request.launch(own_slot=True)
+                        continue
+                    
+                    if request.winner is None:
+                        if isinstance(item, LLMError):
+                            failed += 1
+                            logger.warning(f"Request to {item.host or 'Ollama'} failed: {str(item)}")
+                            if len(request.attempts) == 1 and item.kind != LLMError.TIMEOUT:
+                                # Nothing was produced yet, so another server can take over
+                                request.launch()
+                            elif failed == len(request.attempts):
+                                raise item
+                            continue
+                        request.choose(index)
+                    
+                    if index != request.winner:
+                        continue
+                    if isinstance(item, LLMError):
+                        raise item
+                    if item is _DONE:
+                        if on_context is not None:
+                            on_context(*request.contexts.get(index, (None, None)))
+                        return
+                    yield item
+            finally:
+                if timer is not None:
+                    timer.cancel()
+                request.cancel()
+    
+    def _hedge_delay(self, tracker: LatencyTracker) -> Optional[float]:
+        """Seconds after which a request without a response is hedged, None to never hedge it"""
+        if not HEDGING_ENABLED:
+            return None
+        latency = tracker.quantile(HEDGE_QUANTILE)
+        if latency is None:
+            return None
+        return max(latency, HEDGE_MIN_DELAY)
+    
+    def _cache_key(
+        self,
+        model: str,
+        system_prompt: str,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        use_cache: bool
+    ) -> Optional[str]:
+        """Cache key for a request, or None when the cache does not apply"""
+        if not self.cache or not use_cache:
+            return None
+        return self.cache.make_key(
+            model, system_prompt, self._format_messages(messages), temperature, max_tokens
+        )
+    
+    def _build_chat_payload(
+        self,
+        model: str,
+        system_prompt: str,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        stream: bool
+    ) -> Dict[str, Any]:
+        """
+        Build the request body for Ollama's chat endpoint
+        
+        The context window is requested explicitly, along with how long the model
+        stays loaded afterwards. Messages that would not fit are dropped oldest first,
+        and the response length is lowered to the room the prompt leaves, so the
+        server never truncates the prompt on its own.
+        
+        Args:
+            model: Name of the model to use
+            system_prompt: System instructions for the model
+            messages: List of conversation messages
+            temperature: Sampling temperature (0.0-1.0)
+            max_tokens: Maximum response length
+            stream: Whether the response should be streamed
+            
+        Returns:
+            JSON-serializable request body
+        """
+        system_message = {"role": "system", "content": system_prompt}
+        budget = self.token_budget
+        formatted = budget.fit_messages(
+            self._format_messages(messages),
+            budget.prompt_budget(max_tokens) - budget.count_messages([system_message])
+        )
+        prompt_tokens = budget.count_messages([system_message] + formatted)
+        
+        return {
+            "model": model,
+            "messages": [system_message] + formatted,
+            "stream": stream,
+            "keep_alive": self.residency.keep_alive,
+            "options": {
+                "temperature": temperature,
+                "num_ctx": budget.context_window,
+                "num_predict": budget.fit_output(prompt_tokens, max_tokens)
+            }
+        }
+    
+    def _build_generate_payload(
+        self,
+        model: str,
+        system_prompt: Optional[str],
+        messages: List[Dict[str, str]],
+        context: Optional[List[int]],
+        temperature: float,
+        max_tokens: int,
+        stream: bool
+    ) -> Dict[str, Any]:
+        """
+        Build the request body for Ollama's generate endpoint, which returns the model state after the response
+        
+        The messages are joined into a single prompt. Continuing from model state
+        leaves out the system prompt, which the state already holds.
+        
+        Args:
+            model: Name of the model to use
+            system_prompt: System instructions for the model, None when continuing from context
+            messages: Messages to send, all from the user
+            context: Model state returned with an earlier response, None to start a conversation
+            temperature: Sampling temperature (0.0-1.0)
+            max_tokens: Maximum response length
+            stream: Whether the response should be streamed
+            
+        Returns:
+            JSON-serializable request body
+        """
+        budget = self.token_budget
+        prompt = "\n\n".join(msg["content"] for msg in messages)
+        prompt_messages = [{"role": "user", "content": prompt}]
+        if system_prompt is not None:
+            prompt_messages.insert(0, {"role": "system", "content": system_prompt})
+        prompt_tokens = len(context or []) + budget.count_messages(prompt_messages)
+        
+        payload = {
+            "model": model,
+            "prompt": prompt,
+            "stream": stream,
+            "keep_alive": self.residency.keep_alive,
+            "options": {
+                "temperature": temperature,
+                "num_ctx": budget.context_window,
+                "num_predict": budget.fit_output(prompt_tokens, max_tokens)
+            }
+        }
+        if system_prompt is not None:
+            payload["system"] = system_prompt
+        if context:
+            payload["context"] = context
+        return payload
+    
+    def _continuable_context(
+        self,
+        model: str,
+        system_prompt: str,
+        max_tokens: int,
+        context_key: Optional[Tuple[str, str]],
+        new_messages: Optional[List[Dict[str, str]]]
+    ) -> Optional[_Context]:
+        """Kept model state the new messages can be sent on top of, or None when the full messages are needed"""
+        if context_key is None or not new_messages:
+            return None
+        context = self._contexts.get(context_key[0], {}).get(context_key[1])
+        if context is None or context.model != model or context.system_prompt != system_prompt:
+            return None
+        
+        budget = self.token_budget
+        tokens = len(context.tokens) + budget.count_messages(self._format_messages(new_messages))
+        if tokens > budget.prompt_budget(max_tokens):
+            logger.debug(f"Kept state of {context_key[1]} in {context_key[0]} is full at {len(context.tokens)} tokens, sending the full conversation")
+            return None
+        return context
+    
+    def _keep_context(self, context_key: Tuple[str, str], context: Optional[_Context]):
+        """Store the model state of a conversation's participant, or drop it when there is none"""
+        if context is None:
+            self._drop_context(context_key)
+            return
+        self._contexts.setdefault(context_key[0], {})[context_key[1]] = context
+    
+    def _drop_context(self, context_key: Optional[Tuple[str, str]]):
+        """Forget the model state of a conversation's participant"""
+        if context_key is None:
+            return
+        contexts = self._contexts.get(context_key[0])
+        if contexts is not None:
+            contexts.pop(context_key[1], None)
     
     def _format_messages(self, messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
         """
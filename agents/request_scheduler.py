@@ -0,0 +1,239 @@
+import asyncio
+import time
+from collections import Counter, OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Callable, Deque, Dict, List, Optional
+
+from loguru import logger
+
+from models import RequestPriority
+from constants import LLM_MAX_CONCURRENT_REQUESTS, SCHEDULER_MODEL_AFFINITY_WAIT
+
+
+# Called with (queue position, seconds waited); position 0 means the request was dispatched
+QueueUpdateCallback = Callable[[int, float], None]
+
+
+class _Ticket:
+    """A request waiting for an execution slot"""
+    
+    def __init__(
+        self,
+        priority: int,
+        client_id: str,
+        model: Optional[str],
+        on_update: Optional[QueueUpdateCallback]
+    ):
+        self.priority = priority
+        self.client_id = client_id
+        self.model = model
+        self.on_update = on_update
+        self.enqueued_at = time.monotonic()
+        self.position = 0
+        self.future: asyncio.Future = asyncio.get_event_loop().create_future()
+    
+    def notify(self, position: int, now: float):
+        """Report a new queue position to the waiting caller"""
+        self.position = position
+        if self.on_update:
+            try:
+                self.on_update(position, now - self.enqueued_at)
+            except Exception as e:
+                logger.error(f"Error reporting queue position: {str(e)}")
+
+
+class RequestScheduler:
+    """
+    Bounded-concurrency scheduler for LLM requests
+    
+    Requests beyond the concurrency limit wait in a queue. Lower priority values are
+    served first, and within a priority level clients are served round-robin so a
+    single connection cannot starve the others.
+    
+    Switching models is expensive for Ollama, so within a priority level a request
+    using a model that is already running goes ahead of the round-robin turn. A
+    request is only passed over this way until it has waited model_affinity_wait
+    seconds.
+    """
+    
+    def __init__(
+        self,
+        max_concurrent: int = LLM_MAX_CONCURRENT_REQUESTS,
+        model_affinity_wait: float = SCHEDULER_MODEL_AFFINITY_WAIT
+    ):
+        """
+        Initialize the scheduler
+        
+        Args:
+            max_concurrent: Maximum number of requests running at once
+            model_affinity_wait: Seconds a request may be passed over for requests using a running model
+        """
+        self.max_concurrent = max_concurrent
+        self.model_affinity_wait = model_affinity_wait
+        self._active = 0
+        self._queues: Dict[int, "OrderedDict[str, Deque[_Ticket]]"] = {}
+        self._running_models: Counter = Counter()
+        self._last_model: Optional[str] = None
+    
+    @property
+    def active(self) -> int:
+        """Number of requests currently holding a slot"""
+        return self._active
+    
+    @property
+    def queued(self) -> int:
+        """Number of requests waiting for a slot"""
+        return sum(
+            len(tickets)
+            for clients in self._queues.values()
+            for tickets in clients.values()
+        )
+    
+    @property
+    def has_free_slot(self) -> bool:
+        """Whether a request would be dispatched right away"""
+        return self._active < self.max_concurrent and not self.queued
+    
+    @asynccontextmanager
+    async def slot(
+        self,
+        priority: int = RequestPriority.DISCUSSION,
+        client_id: Optional[str] = None,
+        on_update: Optional[QueueUpdateCallback] = None,
+        model: Optional[str] = None
+    ):
+        """
+        Hold an execution slot for the duration of the block
+        
+        Args:
+            priority: Request priority, lower values are served first
+            client_id: Identifier of the client the request is made for
+            on_update: Callback receiving queue position updates
+            model: Model the request uses, for grouping requests by model
+        """
+        await self._acquire(int(priority), client_id or "", model, on_update)
+        try:
+            yield
+        finally:
+            self._release(model)
+    
+    async def _acquire(
+        self,
+        priority: int,
+        client_id: str,
+        model: Optional[str],
+        on_update: Optional[QueueUpdateCallback]
+    ):
+        """Wait until a slot is available for the request"""
+        if self._active < self.max_concurrent and not self.queued:
+            self._start(model)
+            return
+        
+        ticket = _Ticket(priority, client_id, model, on_update)
+        self._queues.setdefault(priority, OrderedDict()).setdefault(client_id, deque()).append(ticket)
+        self._notify_positions()
+        
+        try:
+            await ticket.future
+        except asyncio.CancelledError:
+            if ticket.future.done() and not ticket.future.cancelled():
+                # The slot was granted just as the caller was cancelled; pass it on
+                self._release(model)
+            else:
+                self._remove(ticket)
+                self._notify_positions()
+            raise
+    
+    def _start(self, model: Optional[str]):
+        """Take a slot for a request using model"""
+        self._active += 1
+        if model is not None:
+            self._running_models[model] += 1
+            self._last_model = model
+    
+    def _release(self, model: Optional[str]):
+        """Free a slot and dispatch waiting requests"""
+        self._active -= 1
+        if model is not None:
+            self._running_models[model] -= 1
+            if self._running_models[model] <= 0:
+                del self._running_models[model]
+        
+        dispatched = False
+        while self._active < self.max_concurrent:
+            ticket = self._next_ticket()
+            if ticket is None:
+                break
+            
+            self._start(ticket.model)
+            ticket.future.set_result(None)
+            ticket.notify(0, time.monotonic())
+            dispatched = True
+        
+        if dispatched:
+            self._notify_positions()
+    
+    def _next_ticket(self) -> Optional[_Ticket]:
+        """Pop the next request to run, rotating clients within a priority level"""
+        for priority in sorted(self._queues):
+            clients = self._queues[priority]
+            if not clients:
+                continue
+            
+            ticket = self._pick(clients)
+            tickets = clients[ticket.client_id]
+            tickets.remove(ticket)
+            if tickets:
+                clients.move_to_end(ticket.client_id)
+            else:
+                del clients[ticket.client_id]
+            return ticket
+        return None
+    
+    def _pick(self, clients: "OrderedDict[str, Deque[_Ticket]]") -> _Ticket:
+        """
+        Choose the request that runs next within a priority level
+        
+        This is the next request of the client whose turn it is, unless that request
+        uses a model other than the running ones and has waited less than
+        model_affinity_wait seconds. Then the first queued request using a running
+        model goes instead, so requests for the same model run together.
+        """
+        head = next(iter(clients.values()))[0]
+        models = set(self._running_models) or {self._last_model}
+        if head.model is None or head.model in models:
+            return head
+        if time.monotonic() - head.enqueued_at >= self.model_affinity_wait:
+            return head
+        
+        for tickets in clients.values():
+            for ticket in tickets:
+                if ticket.model in models:
+                    return ticket
+        return head
+    
+    def _remove(self, ticket: _Ticket):
+        """Drop a waiting request from the queue"""
+        clients = self._queues.get(ticket.priority, {})
+        tickets = clients.get(ticket.client_id)
+        if tickets and ticket in tickets:
+            tickets.remove(ticket)
+            if not tickets:
+                del clients[ticket.client_id]
+    
+    def _ordered_tickets(self) -> List[_Ticket]:
+        """Waiting requests in the order they will be dispatched"""
+        ordered = []
+        for priority in sorted(self._queues):
+            lanes = list(self._queues[priority].values())
+            depth = max((len(tickets) for tickets in lanes), default=0)
+            for index in range(depth):
+                ordered.extend(tickets[index] for tickets in lanes if index < len(tickets))
+        return ordered
+    
+    def _notify_positions(self):
+        """Tell every waiting request whose position changed where it now stands"""
+        now = time.monotonic()
+        for position, ticket in enumerate(self._ordered_tickets(), start=1):
+            if ticket.position != position:
+                ticket.notify(position, now)
@@ -5,14 +5,17 @@ import uuid
 from typing import Dict, List, Optional
 
 import uvicorn
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from loguru import logger
 
 from agent_manager import AgentManager
 from discussion_manager import DiscussionManager
 from models import DiscussionRequest, MessageType, WebSocketMessage
 from ollama_service import OllamaService
-from constants import MODEL_NAME
+from utils.discussion_stream import DiscussionStream
+from utils.token_budget import TokenBudgetManager
+from constants import AGENT_RELOAD_ENABLED
 
 app = FastAPI(title="AI Agent Council")
 
@@ -26,21 +29,40 @@ app.add_middleware(
 )
 
 # Initialize services
-ollama_service = OllamaService()
-agent_manager = AgentManager()
+token_budget = TokenBudgetManager()
+ollama_service = OllamaService(token_budget=token_budget)
+agent_manager = AgentManager(token_budget, ollama_service)
 discussion_manager = DiscussionManager(agent_manager, ollama_service)
 
 # Active WebSocket connections
 connections: Dict[str, WebSocket] = {}
+# Tasks forwarding discussion updates to each connection, by discussion ID
+connection_tasks: Dict[str, Dict[str, asyncio.Task]] = {}
 
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize services on startup"""
-    # Check if model exists and download if not
-    await ollama_service.ensure_model_exists(MODEL_NAME)
     # Initialize agent instances
     await agent_manager.initialize_agents()
+    # Download every model the agents, summaries and consensus use if missing
+    await ollama_service.ensure_models_exist(discussion_manager.models(), preload=False)
+    # Learn which models each Ollama server has loaded and keep checking their health
+    await ollama_service.pool.check_health()
+    ollama_service.pool.start_health_checks()
+    # Load the models in the background, then keep reloading recently used models that the servers dropped
+    ollama_service.residency.start(discussion_manager.models)
+    # Rebuild agents when their config or references change
+    if AGENT_RELOAD_ENABLED:
+        agent_manager.start_watching()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release service resources on shutdown"""
+    await ollama_service.close()
+    agent_manager.close()
+    discussion_manager.store.close()
 
 
 @app.websocket("/ws")
@@ -49,50 +71,139 @@ async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
     connection_id = str(uuid.uuid4())
     connections[connection_id] = websocket
+    connection_tasks[connection_id] = {}
     
     try:
         while True:
             data = await websocket.receive_text()
             message = json.loads(data)
             
-            if message.get("type") == MessageType.QUERY:
+            if message.get("type") == MessageType.CANCEL:
+                discussion_id = message.get("data", {}).get("discussionId")
+                if not await cancel_discussions(connection_id, discussion_id):
+                    await send_error(websocket, f"No running discussion to cancel: {discussion_id}")
+            
+            elif message.get("type") == MessageType.RESUME:
+                resume_data = message.get("data", {})
+                discussion_id = resume_data.get("discussionId")
+                stream = discussion_manager.get_stream(discussion_id)
+                if not stream:
+                    await send_error(websocket, f"Discussion can no longer be resumed: {discussion_id}")
+                    continue
+                
+                last_seq = resume_data.get("lastSeq", 0)
+                if isinstance(last_seq, bool) or not isinstance(last_seq, int) or last_seq < 0:
+                    await send_error(websocket, f"Invalid lastSeq for discussion {discussion_id}: {last_seq!r}")
+                    continue
+                
+                if stream.missed(last_seq):
+                    await send_error(websocket, f"Some updates of discussion {discussion_id} are no longer buffered, fetch it from /discussions/{discussion_id}")
+                subscribe(connection_id, stream, last_seq)
+            
+            elif message.get("type") == MessageType.QUERY:
                 query_data = message.get("data", {})
                 request = DiscussionRequest(
                     query=query_data.get("query", ""),
-                    system_instruction=query_data.get("systemInstruction")
+                    system_instruction=query_data.get("systemInstruction"),
+                    bypass_cache=bool(query_data.get("bypassCache", False)),
+                    convergence_threshold=query_data.get("convergenceThreshold")
                 )
                 
                 # Start discussion in background task
-                asyncio.create_task(
-                    handle_discussion(connection_id, request)
-                )
+                subscribe(connection_id, discussion_manager.start_discussion(request, connection_id))
     except WebSocketDisconnect:
-        if connection_id in connections:
-            del connections[connection_id]
+        pass
+    finally:
+        # Stop forwarding; discussions left without clients are cancelled after RESUME_GRACE_PERIOD,
+        # or right away if no client ever got an update it could resume from
+        connections.pop(connection_id, None)
+        for task in connection_tasks.pop(connection_id, {}).values():
+            task.cancel()
+
+
+def subscribe(connection_id: str, stream: DiscussionStream, last_seq: int = 0):
+    """
+    Forward a discussion's updates after last_seq to a connection in a background task
+    
+    Args:
+        connection_id: Connection receiving the updates
+        stream: Stream of the discussion
+        last_seq: Sequence number of the last update the connection already has
+    """
+    tasks = connection_tasks[connection_id]
+    previous = tasks.get(stream.discussion_id)
+    if previous:
+        previous.cancel()
+    
+    # Register now, so the discussion counts this connection even if it closes before the task runs
+    queue = stream.subscribe(last_seq)
+    task = asyncio.create_task(forward_discussion(connection_id, stream, queue))
+    tasks[stream.discussion_id] = task
+    
+    def forget(_):
+        stream.unsubscribe(queue)
+        if tasks.get(stream.discussion_id) is task:
+            del tasks[stream.discussion_id]
+    
+    task.add_done_callback(forget)
 
 
-async def handle_discussion(connection_id: str, request: DiscussionRequest):
-    """Process a discussion and send updates through WebSocket"""
+async def cancel_discussions(connection_id: str, discussion_id: Optional[str] = None) -> int:
+    """
+    Cancel discussions a connection is receiving
+    
+    A discussion other connections are also receiving keeps running, and only
+    stops being sent to this connection.
+    
+    Args:
+        connection_id: Connection the discussions are forwarded to
+        discussion_id: Discussion to cancel, or None to cancel all of them
+        
+    Returns:
+        Number of discussions cancelled
+    """
+    tasks = connection_tasks.get(connection_id, {})
+    if discussion_id is None:
+        targets = list(tasks)
+    else:
+        targets = [discussion_id] if discussion_id in tasks else []
+    
+    for target in targets:
+        stream = discussion_manager.get_stream(target)
+        if stream and stream.subscribers <= 1:
+            stream.cancel()
+            continue
+        
+        tasks[target].cancel()
+        websocket = connections.get(connection_id)
+        if websocket:
+            await websocket.send_text(WebSocketMessage(
+                type=MessageType.DISCUSSION_CANCELLED,
+                data={"discussion_id": target, "shared": True},
+                discussion_id=target
+            ).json())
+    return len(targets)
+
+
+async def forward_discussion(connection_id: str, stream: DiscussionStream, queue: asyncio.Queue):
+    """Send the updates of a discussion subscription through WebSocket"""
     websocket = connections.get(connection_id)
     if not websocket:
         return
     
     try:
-        # Create and run discussion
-        discussion_id = str(uuid.uuid4())
-        async for update in discussion_manager.run_discussion(discussion_id, request):
-            message = WebSocketMessage(
-                type=update["type"],
-                data=update["data"]
-            )
-            await websocket.send_text(message.json())
+        async for update in stream.receive(queue):
+            await websocket.send_text(WebSocketMessage(**update).json())
     except Exception as e:
-        # Send error message
-        error_message = WebSocketMessage(
-            type=MessageType.ERROR,
-            data={"message": f"Discussion error: {str(e)}"}
-        )
-        await websocket.send_text(error_message.json())
+        logger.warning(f"Stopped sending discussion {stream.discussion_id} to connection {connection_id}: {str(e)}")
+
+
+async def send_error(websocket: WebSocket, message: str):
+    """Send an error message through WebSocket"""
+    await websocket.send_text(WebSocketMessage(
+        type=MessageType.ERROR,
+        data={"message": message}
+    ).json())
 
 
 @app.get("/agents")
@@ -101,5 +212,33 @@ async def get_agents():
     return {"agents": agent_manager.get_agent_info()}
 
 
+@app.get("/discussions/{discussion_id}")
+async def get_discussion(discussion_id: str):
+    """Get a current or past discussion with its messages"""
+    discussion = await discussion_manager.store.get(discussion_id)
+    if discussion is None:
+        raise HTTPException(status_code=404, detail="Discussion not found")
+    return discussion
+
+
+@app.get("/backends")
+async def get_backends():
+    """Get the health, load and loaded models of each Ollama server, model idle times, kept model state and recent request latencies"""
+    return {
+        "backends": ollama_service.pool.stats(),
+        "models": ollama_service.residency.stats(),
+        "contexts": ollama_service.context_stats(),
+        "latency": ollama_service.latency_stats()
+    }
+
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    """Get response cache hit/miss counters"""
+    if not ollama_service.cache:
+        return {"enabled": False}
+    return {"enabled": True, **ollama_service.cache.stats()}
+
+
 if __name__ == "__main__":
     uvicorn.run("server:app", host="0.0.0.0", port=8000, reload=True)
@@ -0,0 +1,122 @@
+"""Times reduce_content over generated documents of different shapes.
+
+Not collected by pytest. Run it from the agents directory:
+
+    python -m tests.benchmark_content_reducer
+
+To compare with another version of the reducer, write that version to a file
+and pass it with --baseline, e.g.
+
+    git show <rev>:agents/utils/content_reducer.py > /tmp/content_reducer_baseline.py
+    python -m tests.benchmark_content_reducer --baseline /tmp/content_reducer_baseline.py
+"""
+import argparse
+import importlib.util
+import random
+import time
+from typing import Callable, Dict
+
+from utils.content_reducer import reduce_content
+
+WORDS = (
+    "the model should consider important context when it reasons about a healthcare "
+    "information system with traumatic wellness effects and their approximately "
+    "significant implications"
+).split()
+
+
+def sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def prose(rng: random.Random, sentences: int) -> str:
+    return " ".join(sentence(rng, rng.randint(8, 20)) for _ in range(sentences))
+
+
+def bullets(rng: random.Random, items: int, marker: str = "-") -> str:
+    return "\n".join(f"{marker} {sentence(rng, 8)}" for _ in range(items))
+
+
+def markdown(rng: random.Random, index: int) -> str:
+    kind = index % 4
+    if kind == 0:
+        return f"## Section {index}"
+    if kind == 1:
+        return "\n".join(f"{number}. {sentence(rng, 6)}" for number in range(1, 6))
+    return prose(rng, 5)
+
+
+def mixed(rng: random.Random, index: int) -> str:
+    kind = index % 3
+    if kind == 0:
+        return f"# Title {index}\n{prose(rng, 2)}"
+    if kind == 1:
+        return bullets(rng, 5, "*")
+    return prose(rng, 8)
+
+
+# Paragraph generators by shape, each given the random source and the paragraph's index
+SHAPES: Dict[str, Callable[[random.Random, int], str]] = {
+    "short paragraphs": lambda rng, index: prose(rng, 1),
+    "medium paragraphs": lambda rng, index: prose(rng, 6),
+    "long paragraphs": lambda rng, index: prose(rng, 120),
+    "bullet lists": lambda rng, index: bullets(rng, 8),
+    "markdown": markdown,
+    "mixed": mixed,
+}
+
+
+def generate(shape: str, size: int, seed: int = 1) -> str:
+    """Builds a document of about size characters from paragraphs of one shape."""
+    rng = random.Random(seed)
+    paragraphs = []
+    total = 0
+    while total < size:
+        paragraph = SHAPES[shape](rng, len(paragraphs))
+        paragraphs.append(paragraph)
+        total += len(paragraph) + 2
+    return "\n\n".join(paragraphs)
+
+
+def load_baseline(path: str) -> Callable[[str, int], str]:
+    """Imports reduce_content from a content_reducer module at path."""
+    spec = importlib.util.spec_from_file_location("content_reducer_baseline", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.reduce_content
+
+
+def measure(reduce: Callable[[str, int], str], content: str, max_length: int, repeat: int) -> float:
+    """Returns the best of repeat timings of one reduction, in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        reduce(content, max_length)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=float, default=3.0, help="Document size in MB")
+    parser.add_argument("--max-length", type=int, default=4096, help="Characters to reduce each document to")
+    parser.add_argument("--repeat", type=int, default=3, help="Timings per document, the best is reported")
+    parser.add_argument("--baseline", help="content_reducer.py to compare against")
+    args = parser.parse_args()
+
+    baseline = load_baseline(args.baseline) if args.baseline else None
+    size = int(args.size * 1_000_000)
+
+    for shape in SHAPES:
+        content = generate(shape, size)
+        current = measure(reduce_content, content, args.max_length, args.repeat)
+        line = f"{shape:<18} {len(content) / 1_000_000:5.1f}MB  {current:7.3f}s"
+        if baseline:
+            previous = measure(baseline, content, args.max_length, args.repeat)
+            same = baseline(content, args.max_length) == reduce_content(content, args.max_length)
+            line += f"  baseline {previous:7.3f}s  {previous / current:5.1f}x  same output: {same}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+import asyncio
+import json
+
+import httpx
+
+from discussion_manager import DiscussionManager
+from models import AgentMessage, Discussion
+from ollama_service import OllamaService
+from utils.discussion_store import DiscussionStore
+from utils.token_budget import TokenBudgetManager
+
+HOSTS = ["http://a:11434", "http://b:11434"]
+KEY = ("discussion", "agent")
+
+
+class FakeOllama:
+    """Answers chat and generate requests, returning model state that grows by a fixed size"""
+    
+    def __init__(self, service, state_tokens=10, reject_context=False):
+        self.requests = []
+        self.state_tokens = state_tokens
+        self.reject_context = reject_context
+        for backend in service.pool.backends:
+            backend.client = httpx.AsyncClient(
+                base_url=backend.host, transport=httpx.MockTransport(self.handle)
+            )
+    
+    def handle(self, request):
+        body = json.loads(request.content)
+        self.requests.append((request.url.host, request.url.path, body))
+        if request.url.path == "/api/chat":
+            return httpx.Response(200, json={"message": {"role": "assistant", "content": "chat"}, "done": True})
+        if self.reject_context and body.get("context"):
+            return httpx.Response(400, json={"error": "invalid context"})
+        context = body.get("context", []) + list(range(self.state_tokens))
+        return httpx.Response(200, json={"response": "generate", "done": True, "context": context})
+
+
+def make_service(context_window=8192):
+    return OllamaService(HOSTS, token_budget=TokenBudgetManager(context_window, safety_margin=0))
+
+
+def respond(service, messages, context_key=KEY, new_messages=None, system_prompt="system"):
+    return service.generate_response(
+        "llama3", system_prompt, messages, max_tokens=100, use_cache=False,
+        context_key=context_key, new_messages=new_messages
+    )
+
+
+QUERY = [{"role": "user", "content": "Solar or nuclear?"}]
+ROUND_ONE = QUERY + [
+    {"role": "assistant", "content": "Solar."},
+    {"role": "user", "content": "Critic: Nuclear."},
+]
+NEW = [{"role": "user", "content": "Critic: Nuclear."}]
+
+
+def test_first_request_starts_model_state():
+    async def scenario():
+        service = make_service()
+        ollama = FakeOllama(service)
+        await respond(service, QUERY)
+        await service.close()
+        return service, ollama
+    
+    service, ollama = asyncio.run(scenario())
+    _, path, body = ollama.requests[0]
+    
+    assert path == "/api/generate"
+    assert body["system"] == "system" and body["prompt"] == "Solar or nuclear?"
+    assert service.context_stats()["kept"] == 1
+
+
+def test_later_request_sends_only_new_messages_on_kept_state():
+    async def scenario():
+        service = make_service()
+        ollama = FakeOllama(service)
+        await respond(service, QUERY)
+        await respond(service, ROUND_ONE, new_messages=NEW)
+        await service.close()
+        return service, ollama
+    
+    service, ollama = asyncio.run(scenario())
+    (first_host, _, _), (host, path, body) = ollama.requests
+    
+    assert path == "/api/generate"
+    assert host == first_host
+    assert body["prompt"] == "Critic: Nuclear."
+    assert body["context"] == list(range(10))
+    assert "system" not in body
+    assert service.context_stats() == {"kept": 1, "continued": 1, "tokens_reused": 10}
+
+
+def test_state_grows_with_every_continued_round():
+    async def scenario():
+        service = make_service()
+        ollama = FakeOllama(service)
+        await respond(service, QUERY)
+        await respond(service, ROUND_ONE, new_messages=NEW)
+        await respond(service, ROUND_ONE + NEW, new_messages=NEW)
+        await service.close()
+        return service, ollama
+    
+    service, ollama = asyncio.run(scenario())
+    
+    assert [len(body.get("context", [])) for _, _, body in ollama.requests] == [0, 10, 20]
+    assert service.context_stats()["tokens_reused"] == 30
+
+
+def test_without_context_key_the_chat_endpoint_is_used():
+    async def scenario():
+        service = make_service()
+        ollama = FakeOllama(service)
+        await respond(service, QUERY, context_key=None)
+        await service.close()
+        return service, ollama
+    
+    service, ollama = asyncio.run(scenario())
+    
+    assert [path for _, path, _ in ollama.requests] == ["/api/chat"]
+    assert service.context_stats()["kept"] == 0
+
+
+def test_state_is_not_continued_with_another_system_prompt():
+    async def scenario():
+        service = make_service()
+        ollama = FakeOllama(service)
+        await respond(service, QUERY)
+        await respond(service, ROUND_ONE, new_messages=NEW, system_prompt="changed")
+        await service.close()
+        return service, ollama
+    
+    service, ollama = asyncio.run(scenario())
+    _, path, body = ollama.requests[1]
+    
+    assert path == "/api/chat"
+    assert body["messages"][0] == {"role": "system", "content": "changed"}
+    assert len(body["messages"]) == 1 + len(ROUND_ONE)
+    assert service.context_stats()["kept"] == 0
+
+
+def test_full_conversation_is_sent_without_new_messages():
+    async def scenario():
+        service = make_service()
+        ollama = FakeOllama(service)
+        await respond(service, QUERY)
+        # The caller found earlier turns changed, for example replaced by a round summary
+        await respond(service, ROUND_ONE, new_messages=None)
+        await service.close()
+        return service, ollama
+    
+    service, ollama = asyncio.run(scenario())
+    
+    assert [path for _, path, _ in ollama.requests] == ["/api/generate", "/api/chat"]
+    assert service.context_stats()["kept"] == 0
+
+
+def test_state_that_would_overflow_the_context_window_is_dropped():
+    async def scenario():
+        # 900 prompt tokens once 100 are reserved for the response
+        service = make_service(context_window=1000)
+        ollama = FakeOllama(service, state_tokens=450)
+        await respond(service, QUERY)
+        await respond(service, ROUND_ONE, new_messages=NEW)
+        await respond(service, ROUND_ONE + NEW, new_messages=NEW)
+        await service.close()
+        return service, ollama
+    
+    service, ollama = asyncio.run(scenario())
+    
+    assert [path for _, path, _ in ollama.requests] == ["/api/generate", "/api/generate", "/api/chat"]
+    assert service.context_stats() == {"kept": 0, "continued": 1, "tokens_reused": 450}
+
+
+def test_rejected_state_falls_back_to_full_conversation():
+    async def scenario():
+        service = make_service()
+        ollama = FakeOllama(service, reject_context=True)
+        await respond(service, QUERY)
+        response = await respond(service, ROUND_ONE, new_messages=NEW)
+        await service.close()
+        return service, ollama, response
+    
+    service, ollama, response = asyncio.run(scenario())
+    
+    assert response == "chat"
+    assert [path for _, path, _ in ollama.requests][-1] == "/api/chat"
+    assert service.context_stats() == {"kept": 0, "continued": 0, "tokens_reused": 0}
+
+
+def test_released_conversation_forgets_its_state():
+    async def scenario():
+        service = make_service()
+        FakeOllama(service)
+        await respond(service, QUERY)
+        service.release_contexts(KEY[0])
+        await service.close()
+        return service
+    
+    assert asyncio.run(scenario()).context_stats()["kept"] == 0
+
+
+def make_manager():
+    service = make_service()
+    return DiscussionManager(None, service, DiscussionStore(path=None))
+
+
+def message(agent_id, content, round_num):
+    return AgentMessage(agent_id=agent_id, agent_name=agent_id.title(), content=content, round=round_num)
+
+
+REPEATED = "Rooftop solar pays back within eight years for most households in sunny regions."
+
+
+def test_new_messages_match_the_formatted_history():
+    manager = make_manager()
+    discussion = Discussion(id="d", query="Solar or nuclear?")
+    own = message("analyst", REPEATED, 0)
+    other = message("critic", f"{REPEATED} Nuclear gives steady baseload power at any hour.", 0)
+    
+    formatted, keep_first, new_messages = manager._format_messages_for_agent(
+        discussion, "analyst", [own, other], 1, shown=set()
+    )
+    
+    assert keep_first == 1
+    assert new_messages == [formatted[2]]
+    # The repeated sentence is left out of both, so the kept state sees what a full prompt would
+    assert new_messages[0]["content"] == "Critic: Nuclear gives steady baseload power at any hour."
+
+
+def test_messages_already_shown_are_not_sent_again():
+    manager = make_manager()
+    discussion = Discussion(id="d", query="Solar or nuclear?")
+    first = message("critic", "Nuclear gives steady baseload power at any hour.", 0)
+    second = message("critic", "Storage costs are falling quickly for grid batteries.", 1)
+    
+    _, _, new_messages = manager._format_messages_for_agent(
+        discussion, "analyst", [first, second], 2, shown={first.message_id}
+    )
+    
+    assert new_messages == [{"role": "user", "content": "Critic: Storage costs are falling quickly for grid batteries."}]
+
+
+def test_state_is_abandoned_once_a_summary_replaces_shown_messages():
+    manager = make_manager()
+    discussion = Discussion(id="d", query="Solar or nuclear?", summaries={0: "Solar versus nuclear."})
+    first = message("critic", "Nuclear gives steady baseload power at any hour.", 0)
+    second = message("critic", "Storage costs are falling quickly for grid batteries.", 1)
+    
+    formatted, keep_first, new_messages = manager._format_messages_for_agent(
+        discussion, "analyst", [first, second], 2, shown={first.message_id}
+    )
+    
+    assert new_messages is None
+    assert keep_first == 2
+    assert formatted[1]["content"].endswith("Solar versus nuclear.")
+
+
+def test_state_is_only_started_when_another_round_follows():
+    manager = make_manager()
+    discussion = Discussion(id="d", query="Solar or nuclear?")
+    
+    assert manager._context_key(discussion, "analyst", 0, None) == ("d", "analyst")
+    assert manager._context_key(discussion, "analyst", 99, None) is None
+    assert manager._context_key(discussion, "analyst", 99, set()) == ("d", "analyst")
@@ -0,0 +1,62 @@
+from utils.convergence import detect_convergence
+
+SOLAR = "Rooftop solar pays back within eight years for most households in sunny regions."
+NUCLEAR = "Nuclear plants give steady baseload power that intermittent sources cannot match."
+
+
+def test_opening_round_never_converges_on_markers():
+    current = {
+        "a": "I agree that I support the adoption of rooftop panels.",
+        "b": "I agree: nuclear is better; this aligns with grid stability needs.",
+    }
+    
+    assert detect_convergence(current) is None
+    assert detect_convergence(current, {}) is None
+
+
+def test_generic_support_is_not_agreement():
+    previous = {"a": SOLAR, "b": NUCLEAR}
+    current = {
+        "a": "I support the adoption of rooftop panels.",
+        "b": "Nuclear is better; this aligns with grid stability needs.",
+    }
+    
+    assert detect_convergence(current, previous) is None
+
+
+def test_stated_agreement_converges_after_opening_round():
+    previous = {"a": SOLAR, "b": NUCLEAR}
+    current = {
+        "a": "I agree with the other agents that a mix of both is best.",
+        "b": "I share the view raised by the analyst; a mix of both sources works.",
+    }
+    
+    convergence = detect_convergence(current, previous)
+    
+    assert convergence is not None and convergence.reason == "markers"
+
+
+def test_pushback_blocks_marker_convergence():
+    previous = {"a": SOLAR, "b": NUCLEAR}
+    current = {
+        "a": "I agree with the other agents on costs.",
+        "b": "I agree with what was said, however storage remains unsolved.",
+    }
+    
+    assert detect_convergence(current, previous) is None
+
+
+def test_similar_responses_converge():
+    convergence = detect_convergence({"a": SOLAR, "b": SOLAR})
+    
+    assert convergence is not None and convergence.reason == "agreement"
+
+
+def test_unchanged_positions_converge():
+    convergence = detect_convergence({"a": SOLAR, "b": NUCLEAR}, {"a": SOLAR, "b": NUCLEAR})
+    
+    assert convergence is not None and convergence.reason == "stable"
+
+
+def test_threshold_above_one_never_converges():
+    assert detect_convergence({"a": SOLAR, "b": SOLAR}, {"a": SOLAR, "b": SOLAR}, threshold=1.01) is None
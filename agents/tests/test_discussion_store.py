@@ -0,0 +1,126 @@
+import asyncio
+import sqlite3
+from types import SimpleNamespace
+
+from models import AgentMessage, Discussion, DiscussionStatus
+from utils import discussion_store
+from utils.discussion_store import DiscussionStore
+
+
+def make_discussion(discussion_id="d1"):
+    return Discussion(id=discussion_id, query="Solar or nuclear?", status=DiscussionStatus.IN_PROGRESS)
+
+
+def run_discussion(store, discussion):
+    store.create(discussion)
+    store.add_message(discussion, AgentMessage(agent_id="analyst", agent_name="Analyst", content="Solar.", round=0))
+    store.add_message(discussion, AgentMessage(agent_id="critic", agent_name="Critic", content="Nuclear.", round=0))
+    store.add_summary(discussion, 0, "Solar versus nuclear.")
+    discussion.history_tokens_saved = 12
+    discussion.consensus = "A mix of both."
+    discussion.status = DiscussionStatus.COMPLETED
+    store.finish(discussion)
+
+
+def test_reopened_log_replays_discussion_to_same_state(tmp_path):
+    path = str(tmp_path / "discussions.sqlite3")
+    discussion = make_discussion()
+    store = DiscussionStore(path=path)
+    run_discussion(store, discussion)
+    store.close()
+    
+    reopened = DiscussionStore(path=path)
+    replayed = asyncio.run(reopened.get("d1"))
+    stats = reopened.stats()
+    reopened.close()
+    
+    assert replayed == discussion
+    assert stats["log_hits"] == 1
+
+
+def test_running_discussions_are_pinned_in_memory():
+    store = DiscussionStore(max_entries=0, ttl=0, path=None)
+    discussion = make_discussion()
+    store.create(discussion)
+    
+    assert asyncio.run(store.get("d1")) is discussion
+    
+    store.finish(discussion)
+    assert asyncio.run(store.get("d1")) is None
+
+
+def test_finished_discussions_expire_from_memory(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(discussion_store, "time", SimpleNamespace(time=lambda: now[0]))
+    store = DiscussionStore(ttl=60, path=None)
+    discussion = make_discussion()
+    store.create(discussion)
+    store.finish(discussion)
+    
+    now[0] += 59
+    kept = asyncio.run(store.get("d1"))
+    now[0] += 61
+    expired = asyncio.run(store.get("d1"))
+    
+    assert kept is discussion
+    assert expired is None
+
+
+def test_least_recently_used_finished_discussion_is_evicted():
+    store = DiscussionStore(max_entries=1, path=None)
+    for discussion_id in ("d1", "d2"):
+        discussion = make_discussion(discussion_id)
+        store.create(discussion)
+        store.finish(discussion)
+    
+    assert asyncio.run(store.get("d1")) is None
+    assert asyncio.run(store.get("d2")) is not None
+
+
+def test_evicted_discussion_is_rebuilt_from_log(tmp_path):
+    store = DiscussionStore(max_entries=1, path=str(tmp_path / "discussions.sqlite3"))
+    first = make_discussion("d1")
+    run_discussion(store, first)
+    second = make_discussion("d2")
+    store.create(second)
+    store.finish(second)
+    
+    replayed = asyncio.run(store.get("d1"))
+    store.close()
+    
+    assert replayed == first and replayed is not first
+
+
+def test_interrupted_discussion_is_marked_failed_on_startup(tmp_path):
+    path = str(tmp_path / "discussions.sqlite3")
+    store = DiscussionStore(path=path)
+    store.create(make_discussion())
+    store.close()
+    
+    reopened = DiscussionStore(path=path)
+    replayed = asyncio.run(reopened.get("d1"))
+    reopened.close()
+    
+    assert replayed.status == DiscussionStatus.FAILED
+
+
+def test_expired_discussions_are_pruned_while_running(tmp_path):
+    path = str(tmp_path / "discussions.sqlite3")
+    store = DiscussionStore(path=path, retention=60, prune_interval=2)
+    old = make_discussion("old")
+    store.create(old)
+    store.finish(old)
+    store._writer.submit(lambda: None).result()
+    with sqlite3.connect(path) as db:
+        db.execute("UPDATE discussion_events SET created_at = created_at - 120")
+    
+    # The second write after the update triggers a prune
+    recent = make_discussion("recent")
+    store.create(recent)
+    store.finish(recent)
+    store.close()
+    
+    with sqlite3.connect(path) as db:
+        remaining = {row[0] for row in db.execute("SELECT DISTINCT discussion_id FROM discussion_events")}
+    
+    assert remaining == {"recent"}
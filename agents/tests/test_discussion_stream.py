@@ -0,0 +1,164 @@
+import asyncio
+
+from models import MessageType
+from utils.discussion_stream import DiscussionStream
+
+
+def token(message_id, delta="x"):
+    return {"type": MessageType.AGENT_TOKEN, "data": {"message_id": message_id, "delta": delta}}
+
+
+def message(message_id):
+    return {"type": MessageType.AGENT_MESSAGE, "data": {"message_id": message_id, "content": "done"}}
+
+
+def buffered(stream, last_seq=0):
+    """Updates a subscriber resuming after last_seq gets from the buffer"""
+    queue = stream.subscribe(last_seq)
+    events = []
+    while not queue.empty():
+        event = queue.get_nowait()
+        if event is not None:
+            events.append(event)
+    stream.unsubscribe(queue)
+    return events
+
+
+async def collect(stream, queue):
+    return [event async for event in stream.receive(queue)]
+
+
+def test_publish_numbers_updates():
+    stream = DiscussionStream("d1")
+    
+    first = stream.publish(message("m1"))
+    second = stream.publish(message("m2"))
+    
+    assert (first["seq"], second["seq"]) == (1, 2)
+    assert first["discussion_id"] == "d1"
+    assert stream.last_seq == 2
+
+
+def test_resume_replays_updates_after_last_seq_then_live_ones():
+    async def scenario():
+        stream = DiscussionStream("d1")
+        for message_id in ("m1", "m2", "m3"):
+            stream.publish(message(message_id))
+        
+        queue = stream.subscribe(last_seq=1)
+        stream.publish(message("m4"))
+        stream.close()
+        return await collect(stream, queue)
+    
+    events = asyncio.run(scenario())
+    
+    assert [event["seq"] for event in events] == [2, 3, 4]
+
+
+def test_subscribing_to_finished_stream_replays_and_ends():
+    async def scenario():
+        stream = DiscussionStream("d1")
+        stream.publish(message("m1"))
+        stream.close()
+        return await collect(stream, stream.subscribe())
+    
+    assert [event["seq"] for event in asyncio.run(scenario())] == [1]
+
+
+def test_finished_message_replaces_its_tokens_in_the_buffer():
+    async def scenario():
+        stream = DiscussionStream("d1")
+        stream.publish(token("m1"))
+        stream.publish(token("m2"))
+        stream.publish(token("m1"))
+        stream.publish(message("m1"))
+        return buffered(stream)
+    
+    events = asyncio.run(scenario())
+    
+    assert [(event["type"], event["data"]["message_id"]) for event in events] == [
+        (MessageType.AGENT_TOKEN, "m2"),
+        (MessageType.AGENT_MESSAGE, "m1"),
+    ]
+
+
+def test_full_buffer_drops_tokens_before_messages():
+    async def scenario():
+        stream = DiscussionStream("d1", max_events=3)
+        stream.publish(message("m1"))
+        stream.publish(token("m2"))
+        stream.publish(token("m2"))
+        stream.publish(token("m2"))
+        return stream, buffered(stream)
+    
+    stream, events = asyncio.run(scenario())
+    
+    assert [event["seq"] for event in events] == [1, 3, 4]
+    assert not stream.missed(0)
+
+
+def test_missed_reports_updates_dropped_from_full_buffer():
+    stream = DiscussionStream("d1", max_events=2)
+    for message_id in ("m1", "m2", "m3", "m4"):
+        stream.publish(message(message_id))
+    
+    assert stream.missed(0)
+    assert stream.missed(1)
+    assert not stream.missed(2)
+    assert not stream.missed(4)
+
+
+def test_last_subscriber_leaving_before_any_update_cancels_right_away():
+    async def scenario():
+        stream = DiscussionStream("d1", grace_period=60)
+        stream.task = asyncio.create_task(asyncio.sleep(60))
+        stream.unsubscribe(stream.subscribe())
+        await asyncio.sleep(0)
+        return stream.task.cancelled()
+    
+    assert asyncio.run(scenario())
+
+
+def test_last_subscriber_leaving_after_updates_cancels_after_grace_period():
+    async def scenario():
+        stream = DiscussionStream("d1", grace_period=0.05)
+        stream.task = asyncio.create_task(asyncio.sleep(60))
+        stream.publish(message("m1"))
+        stream.publish(message("m2"))
+        
+        queue = stream.subscribe()
+        updates = stream.receive(queue)
+        await updates.__anext__()
+        await updates.__anext__()
+        await updates.aclose()
+        stream.unsubscribe(queue)
+        
+        await asyncio.sleep(0)
+        running_during_grace = not stream.task.done()
+        await asyncio.sleep(0.1)
+        return running_during_grace, stream.task.cancelled()
+    
+    assert asyncio.run(scenario()) == (True, True)
+
+
+def test_resubscribing_within_grace_period_keeps_discussion_running():
+    async def scenario():
+        stream = DiscussionStream("d1", grace_period=0.05)
+        stream.task = asyncio.create_task(asyncio.sleep(60))
+        stream.publish(message("m1"))
+        stream.publish(message("m2"))
+        
+        queue = stream.subscribe()
+        updates = stream.receive(queue)
+        await updates.__anext__()
+        await updates.__anext__()
+        await updates.aclose()
+        stream.unsubscribe(queue)
+        
+        stream.subscribe(last_seq=2)
+        await asyncio.sleep(0.1)
+        cancelled = stream.task.done()
+        stream.task.cancel()
+        return cancelled
+    
+    assert not asyncio.run(scenario())
@@ -0,0 +1,71 @@
+import pytest
+
+from utils.history_dedup import SentenceDeduplicator, sentence_shingles
+
+REPEATED = "Renewable energy adoption depends heavily on upfront installation costs."
+OTHER = "Public transport reduces emissions in dense cities with good planning."
+
+
+def count_words(text):
+    return len(text.split())
+
+
+def test_short_sentences_have_no_shingles():
+    assert sentence_shingles("I agree with that.") == frozenset()
+    assert sentence_shingles(REPEATED)
+
+
+def test_shingles_ignore_case_and_punctuation():
+    assert sentence_shingles(REPEATED.upper().rstrip(".")) == sentence_shingles(REPEATED)
+
+
+def test_removes_repeated_sentence_from_later_text():
+    deduplicator = SentenceDeduplicator(count_tokens=count_words)
+    
+    result = deduplicator.deduplicate([REPEATED, f"{OTHER} {REPEATED}"])
+    
+    assert result.texts == [REPEATED, OTHER]
+    assert result.removed_sentences == 1
+    assert result.tokens_saved == count_words(REPEATED)
+
+
+def test_removes_near_duplicates_but_keeps_different_sentences():
+    deduplicator = SentenceDeduplicator()
+    near = "Renewable energy adoption depends heavily on upfront installation costs, clearly."
+    
+    result = deduplicator.deduplicate([REPEATED, near, OTHER])
+    
+    assert result.texts == [REPEATED, "", OTHER]
+    assert result.removed_sentences == 1
+
+
+def test_keeps_short_sentences_even_when_repeated():
+    deduplicator = SentenceDeduplicator()
+    
+    result = deduplicator.deduplicate(["I agree.", "I agree."])
+    
+    assert result.texts == ["I agree.", "I agree."]
+    assert result.removed_sentences == 0
+
+
+def test_keeps_line_structure_around_removed_sentences():
+    deduplicator = SentenceDeduplicator()
+    
+    result = deduplicator.deduplicate([REPEATED, f"## Costs\n{REPEATED}\n{OTHER}"])
+    
+    assert result.texts[1] == f"## Costs\n{OTHER}"
+
+
+def test_cached_result_is_reused_per_key():
+    deduplicator = SentenceDeduplicator()
+    
+    first, first_cached = deduplicator.deduplicate_cached(("a", "b"), [REPEATED, REPEATED])
+    second, second_cached = deduplicator.deduplicate_cached(("a", "b"), [])
+    
+    assert not first_cached and second_cached
+    assert second is first
+
+
+def test_permutations_must_split_into_bands():
+    with pytest.raises(ValueError):
+        SentenceDeduplicator(permutations=10, bands=3)
@@ -0,0 +1,179 @@
+import asyncio
+
+import httpx
+import pytest
+
+from ollama_pool import CircuitState, OllamaPool
+
+HOSTS = ["http://a:11434", "http://b:11434", "http://c:11434"]
+
+
+def make_pool(hosts=HOSTS, **kwargs):
+    kwargs.setdefault("max_concurrent_requests", 2)
+    kwargs.setdefault("max_failures", 2)
+    kwargs.setdefault("cooldown", 60)
+    return OllamaPool(hosts, **kwargs)
+
+
+async def fail(pool, error, model="llama3"):
+    with pytest.raises(type(error)):
+        async with pool.acquire(model):
+            raise error
+
+
+def status_error(status_code):
+    request = httpx.Request("POST", "http://a:11434/api/chat")
+    return httpx.HTTPStatusError("error", request=request, response=httpx.Response(status_code, request=request))
+
+
+def test_requires_a_host():
+    with pytest.raises(ValueError):
+        OllamaPool([])
+
+
+def test_duplicate_hosts_are_merged():
+    pool = make_pool(HOSTS + HOSTS[:1])
+    
+    assert [backend.host for backend in pool.backends] == HOSTS
+
+
+def test_select_prefers_backend_with_model_loaded():
+    pool = make_pool()
+    a, b, c = pool.backends
+    b.loaded_models = {"llama3:latest"}
+    a.outstanding = 0
+    b.outstanding = 1
+    
+    assert all(pool.select("llama3") is b for _ in range(len(HOSTS)))
+
+
+def test_select_skips_full_backend_even_with_model_loaded():
+    pool = make_pool()
+    a, b, c = pool.backends
+    a.loaded_models = {"llama3"}
+    a.outstanding = 2
+    b.outstanding = 1
+    c.outstanding = 0
+    
+    assert pool.select("llama3") is c
+
+
+def test_select_prefers_host_holding_model_state():
+    pool = make_pool()
+    for backend in pool.backends:
+        backend.loaded_models = {"llama3"}
+    
+    assert all(pool.select("llama3", prefer=HOSTS[2]).host == HOSTS[2] for _ in range(len(HOSTS)))
+
+
+def test_select_prefers_least_outstanding_and_rotates_ties():
+    pool = make_pool()
+    a, b, c = pool.backends
+    a.outstanding = 1
+    
+    chosen = {pool.select("llama3") for _ in range(4)}
+    
+    assert chosen == {b, c}
+
+
+def test_select_avoids_excluded_backends_unless_nothing_else_is_left():
+    pool = make_pool(HOSTS[:2])
+    a, b = pool.backends
+    
+    assert pool.select("llama3", exclude=[a]) is b
+    assert pool.select("llama3", exclude=[a, b]) in (a, b)
+
+
+def test_circuit_opens_after_consecutive_failures():
+    async def scenario():
+        pool = make_pool(HOSTS[:2])
+        a, b = pool.backends
+        b.outstanding = 1
+        await fail(pool, httpx.ConnectError("refused"))
+        state_after_one = a.state
+        await fail(pool, httpx.ConnectError("refused"))
+        b.outstanding = 0
+        await pool.close()
+        return pool, state_after_one
+    
+    pool, state_after_one = asyncio.run(scenario())
+    a, b = pool.backends
+    
+    assert state_after_one == CircuitState.CLOSED
+    assert a.state == CircuitState.OPEN
+    assert not a.healthy
+    assert all(pool.select("llama3") is b for _ in range(4))
+
+
+def test_client_errors_do_not_count_against_backend():
+    async def scenario():
+        pool = make_pool(HOSTS[:1])
+        for _ in range(3):
+            await fail(pool, status_error(404))
+        await pool.close()
+        return pool.backends[0]
+    
+    backend = asyncio.run(scenario())
+    
+    assert backend.state == CircuitState.CLOSED
+    assert backend.errors == 0
+
+
+def test_success_resets_failure_count():
+    async def scenario():
+        pool = make_pool(HOSTS[:1])
+        await fail(pool, status_error(500))
+        async with pool.acquire("llama3"):
+            pass
+        await fail(pool, status_error(500))
+        await pool.close()
+        return pool.backends[0]
+    
+    backend = asyncio.run(scenario())
+    
+    assert backend.state == CircuitState.CLOSED
+    assert backend.has_model("llama3")
+
+
+def test_open_circuit_lets_one_trial_request_through_after_cooldown():
+    async def scenario():
+        pool = make_pool(HOSTS[:2], cooldown=0)
+        a, b = pool.backends
+        pool._open(a, "test")
+        b.outstanding = 1
+        
+        async with pool.acquire("llama3") as trial:
+            during_trial = (trial, a.state, pool.select("llama3"))
+        await pool.close()
+        return pool, during_trial
+    
+    pool, (trial, state, other) = asyncio.run(scenario())
+    a, b = pool.backends
+    
+    assert trial is a
+    assert state == CircuitState.HALF_OPEN
+    assert other is b
+    assert a.state == CircuitState.CLOSED
+
+
+def test_failed_trial_request_reopens_circuit():
+    async def scenario():
+        pool = make_pool(HOSTS[:1], cooldown=0, max_failures=5)
+        backend = pool.backends[0]
+        pool._open(backend, "test")
+        await fail(pool, asyncio.TimeoutError())
+        await pool.close()
+        return backend
+    
+    backend = asyncio.run(scenario())
+    
+    assert backend.state == CircuitState.OPEN
+    assert not backend.probing
+
+
+def test_select_falls_back_to_open_backends_when_none_is_available():
+    pool = make_pool(HOSTS[:2])
+    for backend in pool.backends:
+        pool._open(backend, "test")
+    
+    assert pool.select("llama3") in pool.backends
@@ -0,0 +1,75 @@
+from utils.reference_index import ReferenceChunk, ReferenceIndex, build_reference_index, chunk_text, tokenize
+
+
+def make_index():
+    return ReferenceIndex([
+        ReferenceChunk("a.md", "Solar panels convert sunlight into electricity."),
+        ReferenceChunk("b.md", "Wind turbines generate electricity from wind. Wind farms need wind."),
+        ReferenceChunk("c.md", "Bread is baked from flour, water and yeast."),
+    ])
+
+
+def test_tokenize_drops_stop_words_and_single_characters():
+    assert tokenize("What is the Cost of a 5 kW solar array?") == ["cost", "kw", "solar", "array"]
+
+
+def test_chunk_text_packs_paragraphs_up_to_chunk_size():
+    text = "one two\n\nthree four\n\n" + "x" * 30
+    
+    chunks = chunk_text(text, chunk_size=25, overlap=5)
+    
+    assert chunks[0] == "one two\n\nthree four"
+    assert all(len(chunk) <= 25 for chunk in chunks)
+
+
+def test_chunk_text_splits_long_paragraphs_into_overlapping_windows():
+    words = " ".join(f"word{i}" for i in range(40))
+    
+    chunks = chunk_text(words, chunk_size=60, overlap=15)
+    
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 60 for chunk in chunks)
+    for previous, current in zip(chunks, chunks[1:]):
+        assert current[:10] in previous
+
+
+def test_search_ranks_chunks_by_relevance():
+    index = make_index()
+    
+    results = index.search("how much wind electricity", top_k=3)
+    
+    assert [chunk for chunk, _ in results] == [1, 0]
+    assert results[0][1] > results[1][1] > 0
+
+
+def test_search_returns_nothing_without_matching_terms():
+    index = make_index()
+    
+    assert index.search("the of and", top_k=3) == []
+    assert index.search("quantum chromodynamics", top_k=3) == []
+    assert index.search("wind", top_k=0) == []
+
+
+def test_search_limits_results_to_top_k():
+    index = make_index()
+    
+    assert [chunk for chunk, _ in index.search("electricity wind", top_k=1)] == [1]
+
+
+def test_select_fits_budget_and_keeps_original_order():
+    index = make_index()
+    sizes = [len(chunk.text) for chunk in index.chunks]
+    
+    everything = index.select("electricity wind", budget=sum(sizes), top_k=3)
+    tight = index.select("electricity wind", budget=sizes[0], top_k=3)
+    
+    assert everything == [index.chunks[0], index.chunks[1]]
+    assert tight == [index.chunks[0]]
+
+
+def test_empty_index():
+    index = build_reference_index([])
+    
+    assert len(index) == 0
+    assert index.search("anything", top_k=5) == []
+    assert index.select("anything", budget=100, top_k=5) == []
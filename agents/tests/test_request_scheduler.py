@@ -0,0 +1,188 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+
+from request_scheduler import RequestScheduler, _Ticket
+
+
+def queue_of(*tickets):
+    clients = OrderedDict()
+    for ticket in tickets:
+        clients.setdefault(ticket.client_id, deque()).append(ticket)
+    return clients
+
+
+def test_pick_takes_turn_when_head_uses_running_model():
+    async def scenario():
+        scheduler = RequestScheduler(max_concurrent=1, model_affinity_wait=10)
+        scheduler._start("llama3")
+        head = _Ticket(0, "a", "llama3", None)
+        other = _Ticket(0, "b", "mistral", None)
+        return scheduler._pick(queue_of(head, other)) is head
+    
+    assert asyncio.run(scenario())
+
+
+def test_pick_passes_over_head_for_running_model():
+    async def scenario():
+        scheduler = RequestScheduler(max_concurrent=1, model_affinity_wait=10)
+        scheduler._start("llama3")
+        head = _Ticket(0, "a", "mistral", None)
+        same_model = _Ticket(0, "b", "llama3", None)
+        return scheduler._pick(queue_of(head, same_model)) is same_model
+    
+    assert asyncio.run(scenario())
+
+
+def test_pick_stops_passing_over_head_after_affinity_wait():
+    async def scenario():
+        scheduler = RequestScheduler(max_concurrent=1, model_affinity_wait=10)
+        scheduler._start("llama3")
+        head = _Ticket(0, "a", "mistral", None)
+        head.enqueued_at = time.monotonic() - 10
+        same_model = _Ticket(0, "b", "llama3", None)
+        return scheduler._pick(queue_of(head, same_model)) is head
+    
+    assert asyncio.run(scenario())
+
+
+def test_pick_groups_by_last_model_when_idle():
+    async def scenario():
+        scheduler = RequestScheduler(max_concurrent=1, model_affinity_wait=10)
+        scheduler._start("llama3")
+        scheduler._release("llama3")
+        head = _Ticket(0, "a", "mistral", None)
+        same_model = _Ticket(0, "b", "llama3", None)
+        return scheduler._pick(queue_of(head, same_model)) is same_model
+    
+    assert asyncio.run(scenario())
+
+
+def test_pick_takes_head_without_model_or_match():
+    async def scenario():
+        scheduler = RequestScheduler(max_concurrent=1, model_affinity_wait=10)
+        scheduler._start("llama3")
+        untyped = _Ticket(0, "a", None, None)
+        other = _Ticket(0, "b", "llama3", None)
+        unmatched = _Ticket(0, "a", "mistral", None)
+        return (
+            scheduler._pick(queue_of(untyped, other)) is untyped,
+            scheduler._pick(queue_of(unmatched, _Ticket(0, "b", "phi3", None))) is unmatched
+        )
+    
+    assert asyncio.run(scenario()) == (True, True)
+
+
+async def run_requests(scheduler, requests):
+    """Queue requests behind a held slot and return the order they run in"""
+    order = []
+    
+    async def request(name, priority, client_id, model):
+        async with scheduler.slot(priority, client_id, model=model):
+            order.append(name)
+    
+    blocker = asyncio.Event()
+    
+    async def hold():
+        async with scheduler.slot(0, "holder", model="llama3"):
+            await blocker.wait()
+    
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    tasks = []
+    for name, priority, client_id, model in requests:
+        tasks.append(asyncio.create_task(request(name, priority, client_id, model)))
+        await asyncio.sleep(0)
+    blocker.set()
+    await asyncio.gather(holder, *tasks)
+    return order
+
+
+def test_lower_priority_values_run_first():
+    scheduler = RequestScheduler(max_concurrent=1, model_affinity_wait=0)
+    
+    order = asyncio.run(run_requests(scheduler, [
+        ("late", 2, "a", None),
+        ("urgent", 0, "b", None),
+        ("normal", 1, "c", None),
+    ]))
+    
+    assert order == ["urgent", "normal", "late"]
+
+
+def test_clients_take_turns_within_a_priority():
+    scheduler = RequestScheduler(max_concurrent=1, model_affinity_wait=0)
+    
+    order = asyncio.run(run_requests(scheduler, [
+        ("a1", 1, "a", None),
+        ("a2", 1, "a", None),
+        ("a3", 1, "a", None),
+        ("b1", 1, "b", None),
+    ]))
+    
+    assert order == ["a1", "b1", "a2", "a3"]
+
+
+def test_requests_for_running_model_run_together():
+    scheduler = RequestScheduler(max_concurrent=1, model_affinity_wait=10)
+    
+    order = asyncio.run(run_requests(scheduler, [
+        ("a-mistral", 1, "a", "mistral"),
+        ("b-llama", 1, "b", "llama3"),
+        ("c-mistral", 1, "c", "mistral"),
+    ]))
+    
+    assert order == ["b-llama", "a-mistral", "c-mistral"]
+
+
+def test_queue_positions_are_reported_until_dispatch():
+    async def scenario():
+        scheduler = RequestScheduler(max_concurrent=1)
+        updates = []
+        release = asyncio.Event()
+        
+        async def hold():
+            async with scheduler.slot(0, "holder"):
+                await release.wait()
+        
+        async def wait():
+            async with scheduler.slot(1, "a", on_update=lambda position, waited: updates.append(position)):
+                pass
+        
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(wait())
+        await asyncio.sleep(0)
+        queued = scheduler.queued
+        release.set()
+        await asyncio.gather(holder, waiter)
+        return queued, updates
+    
+    assert asyncio.run(scenario()) == (1, [1, 0])
+
+
+def test_cancelled_request_leaves_the_queue():
+    async def scenario():
+        scheduler = RequestScheduler(max_concurrent=1)
+        release = asyncio.Event()
+        
+        async def hold():
+            async with scheduler.slot(0, "holder"):
+                await release.wait()
+        
+        async def wait():
+            async with scheduler.slot(1, "a"):
+                pass
+        
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(wait())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        queued = scheduler.queued
+        release.set()
+        await holder
+        return queued, scheduler.active
+    
+    assert asyncio.run(scenario()) == (0, 0)
@@ -0,0 +1,159 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import httpx
+
+from ollama_service import OllamaService
+from utils import response_cache
+from utils.response_cache import ResponseCache
+
+MESSAGES = [{"role": "user", "content": "Solar or nuclear?"}]
+
+
+def key(**overrides):
+    params = {
+        "model": "llama3",
+        "system_prompt": "system",
+        "messages": MESSAGES,
+        "temperature": 0.7,
+        "max_tokens": 1024,
+        **overrides
+    }
+    return ResponseCache.make_key(**params)
+
+
+def test_keys_differ_by_every_request_setting():
+    keys = {
+        key(),
+        key(model="mistral"),
+        key(system_prompt="other"),
+        key(messages=MESSAGES + [{"role": "assistant", "content": "Solar."}]),
+        key(temperature=0.2),
+        key(max_tokens=512),
+    }
+    
+    assert len(keys) == 6
+    assert key() == key()
+
+
+def test_memory_hit_after_set():
+    async def scenario():
+        cache = ResponseCache(path=None)
+        missed = await cache.get(key())
+        await cache.set(key(), "Solar.")
+        return missed, await cache.get(key()), cache.stats()
+    
+    missed, hit, stats = asyncio.run(scenario())
+    
+    assert missed is None and hit == "Solar."
+    assert (stats["memory_hits"], stats["misses"]) == (1, 1)
+
+
+def test_persistent_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "responses.sqlite3")
+    
+    async def scenario():
+        cache = ResponseCache(path=path)
+        await cache.set(key(), "Solar.")
+        cache.close()
+        
+        reopened = ResponseCache(path=path)
+        content = await reopened.get(key())
+        stats = reopened.stats()
+        reopened.close()
+        return content, stats
+    
+    content, stats = asyncio.run(scenario())
+    
+    assert content == "Solar."
+    assert stats["disk_hits"] == 1
+
+
+def test_least_recently_used_entry_is_evicted_from_memory():
+    async def scenario():
+        cache = ResponseCache(max_entries=2, path=None)
+        await cache.set("a", "A")
+        await cache.set("b", "B")
+        await cache.get("a")
+        await cache.set("c", "C")
+        return [await cache.get(k) for k in ("a", "b", "c")]
+    
+    assert asyncio.run(scenario()) == ["A", None, "C"]
+
+
+def test_entries_expire_in_both_tiers(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(response_cache, "time", SimpleNamespace(time=lambda: now[0]))
+    path = str(tmp_path / "responses.sqlite3")
+    
+    async def scenario():
+        cache = ResponseCache(ttl=60, path=path)
+        await cache.set(key(), "Solar.")
+        now[0] += 59
+        fresh = await cache.get(key())
+        now[0] += 2
+        expired = await cache.get(key())
+        cache.close()
+        
+        reopened = ResponseCache(ttl=60, path=path)
+        expired_on_disk = await reopened.get(key())
+        reopened.close()
+        return fresh, expired, expired_on_disk
+    
+    assert asyncio.run(scenario()) == ("Solar.", None, None)
+
+
+class CountingOllama:
+    """Answers chat requests with a numbered response"""
+    
+    def __init__(self, service):
+        self.bodies = []
+        for backend in service.pool.backends:
+            backend.client = httpx.AsyncClient(
+                base_url=backend.host, transport=httpx.MockTransport(self.handle)
+            )
+    
+    def handle(self, request):
+        self.bodies.append(json.loads(request.content))
+        content = f"response {len(self.bodies)}"
+        return httpx.Response(200, json={"message": {"role": "assistant", "content": content}, "done": True})
+
+
+def run_service(requests):
+    """Send (temperature, use_cache) requests through a service with a cache, returning responses and server calls"""
+    async def scenario():
+        service = OllamaService(["http://a:11434"])
+        service.cache = ResponseCache(path=None)
+        ollama = CountingOllama(service)
+        responses = [
+            await service.generate_response(
+                "llama3", "system", MESSAGES, temperature=temperature, use_cache=use_cache
+            )
+            for temperature, use_cache in requests
+        ]
+        await service.close()
+        return responses, len(ollama.bodies)
+    
+    return asyncio.run(scenario())
+
+
+def test_service_serves_repeated_request_from_cache():
+    responses, calls = run_service([(0.7, True), (0.7, True)])
+    
+    assert responses == ["response 1", "response 1"]
+    assert calls == 1
+
+
+def test_service_bypasses_cache_when_asked():
+    responses, calls = run_service([(0.7, True), (0.7, False), (0.7, True)])
+    
+    assert responses == ["response 1", "response 2", "response 1"]
+    assert calls == 2
+
+
+def test_service_does_not_share_responses_across_temperatures():
+    responses, calls = run_service([(0.7, True), (0.2, True)])
+    
+    assert responses == ["response 1", "response 2"]
+    assert calls == 2
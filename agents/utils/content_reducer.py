@@ -1,20 +1,184 @@
 import re
-from typing import Dict, List, Protocol, Optional, Callable
+from itertools import chain, islice
+from functools import cached_property
+from typing import Dict, Iterable, Iterator, List, Protocol, Optional, Callable, Pattern, Sequence, Tuple, Union
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
 from constants import COMMON_WORDS
 
+# Part of the reference cache key for reduced text; bump it whenever a change here
+# alters the output, so text reduced by an earlier version is not served from disk
+REDUCER_VERSION = 1
+
+# Content importance patterns, compiled once for every reduction
+CONTENT_PATTERNS: Dict[str, Pattern] = {
+    'headers': re.compile(r'^#+\s+.*$', re.MULTILINE),                # Markdown headers
+    'bullets': re.compile(r'^\s*[-*•]\s+.*$', re.MULTILINE),          # Bullet points
+    'numbered': re.compile(r'^\s*\d+\.\s+.*$', re.MULTILINE),         # Numbered lists
+    'code_blocks': re.compile(r'```[\s\S]*?```'),                      # Code blocks
+    'key_terms': re.compile(r'(important|note|warning|essential|critical|key|remember|significant)', re.IGNORECASE),  # Key indicator words
+    'definitions': re.compile(r'^.{1,50}:\s+.+$', re.MULTILINE)        # Short definitions
+}
+
+PARAGRAPH_BREAK = re.compile(r'\n\n+')
+SENTENCE_BREAK = re.compile(r'(?<=[.!?])\s+')
+QUOTE_START = re.compile(r'\s*>')
+LIST_MARKER = re.compile(r'^(\s*[-*•]\s+|"\s*|\'|^\s*\d+\.\s+)(.*)')
+REFERENCE_BLOCK = re.compile(r'<ReferenceMaterials>[\s\S]*?</ReferenceMaterials>')
+REFERENCE_PLACEHOLDER = re.compile(r'__REF_MATERIAL_(0|[1-9][0-9]*)__')
+MULTIPLE_SPACES = re.compile(r' {2,}')
+
+# Line-start patterns split into a match on the first line and a search for the others,
+# which can skip ahead to line breaks instead of trying every character of the paragraph
+HEADER_FIRST_LINE = re.compile(r'#+\s')
+HEADER_NEXT_LINE = re.compile(r'\n#+\s')
+HEADER_FIRST_LINE_TEXT = re.compile(r'#+[^\S\n].*')    # 'headers' within a single line
+HEADER_NEXT_LINE_TEXT = re.compile(r'\n(#+[^\S\n].*)')
+LIST_FIRST_LINE = re.compile(r'\s*(?:[-*•]|\d+\.)\s')    # 'bullets' or 'numbered'
+LIST_NEXT_LINE = re.compile(r'\n\s*(?:[-*•]|\d+\.)\s')
+QUOTED_FIRST_LINE = re.compile(r'\s*[-"\'*•]\s+.*$', re.MULTILINE)
+QUOTED_NEXT_LINE = re.compile(r'\n\s*[-"\'*•]\s+.*$', re.MULTILINE)
+
+# Shortest text ListReductionStrategy can emit for a list ("List: " and one item)
+MIN_LIST_SUMMARY = len("List: ")
+
+# Budget left below which streaming reduction stops reading, as hardly anything fits any more
+MIN_STREAM_PART = 80
+
+
+def _is_header(para: str) -> bool:
+    """Check whether a paragraph has a markdown header line"""
+    return bool(HEADER_FIRST_LINE.match(para) or ('\n' in para and HEADER_NEXT_LINE.search(para)))
+
+
+def _header_lines(para: str) -> Iterator[str]:
+    """Yield the lines of a paragraph that are markdown headers, in order"""
+    first = HEADER_FIRST_LINE_TEXT.match(para)
+    if first:
+        yield first.group(0)
+    if '\n' in para:
+        for match in HEADER_NEXT_LINE_TEXT.finditer(para):
+            yield match.group(1)
+
+
+def _is_list(para: str) -> bool:
+    """Check whether a paragraph has a bullet or numbered list line"""
+    return bool(LIST_FIRST_LINE.match(para) or ('\n' in para and LIST_NEXT_LINE.search(para)))
+
+
+def _count_quoted_lines(para: str, limit: int) -> int:
+    """Count lines starting like list items or quotes, as findall would, up to limit"""
+    first = QUOTED_FIRST_LINE.match(para)
+    if '\n' not in para:
+        return bool(first)
+    others = QUOTED_NEXT_LINE.finditer(para, first.end() if first else 0)
+    return bool(first) + len(list(islice(others, limit - bool(first))))
+
+
+def _build_trie_pattern(words: Sequence[str]) -> str:
+    """Build a regex alternation for the words with shared prefixes factored out"""
+    trie: Dict[str, dict] = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+    
+    def emit(node: Dict[str, dict]) -> str:
+        branches = [re.escape(char) + emit(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if '' in node:
+            return ('(?:' + body + ')' if len(branches) == 1 else body) + '?'
+        return body
+    
+    return emit(trie)
+
+
+def _compile_abbreviations(words: Dict[str, str]) -> Tuple[Pattern, Dict[str, str]]:
+    """
+    Compile the abbreviation dictionary into a single-pass matcher
+    
+    The dictionary used to be applied one word at a time, so a word could be rewritten
+    before its own turn ("post-traumatic" loses "traumatic" first) or be completed by an
+    earlier abbreviation ("wellness-being" becomes "well-being" and then "wellbeing").
+    Both cases are resolved here so one left-to-right pass gives the same text.
+    
+    Args:
+        words: Words mapped to their abbreviations, in the order they are applied
+        
+    Returns:
+        Pattern matching any word and a table from lowercased match to abbreviation
+    """
+    def bounded(word: str) -> Pattern:
+        return re.compile(rf'\b{re.escape(word)}\b', re.IGNORECASE)
+    
+    order = list(words)
+    table: Dict[str, str] = {}
+    for index, word in enumerate(order):
+        earlier = order[:index]
+        if any(words[e].lower() != e.lower() and bounded(e).search(word) for e in earlier):
+            continue
+        table.setdefault(word.lower(), words[word])
+        for e in earlier:
+            match = bounded(words[e]).search(word)
+            if match:
+                chained = word[:match.start()] + e + word[match.end():]
+                table.setdefault(chained.lower(), words[word])
+    
+    # (?<!\w) is the leading word boundary, as every word starts with a letter
+    return re.compile(r'(?<!\w)' + _build_trie_pattern(list(table)) + r'\b', re.IGNORECASE), table
+
+
+ABBREVIATION_PATTERN, ABBREVIATIONS = _compile_abbreviations(COMMON_WORDS)
+
+
+def _abbreviate(match: 're.Match') -> str:
+    """Replacement callback for ABBREVIATION_PATTERN"""
+    word = match.group(0)
+    abbr = ABBREVIATIONS.get(word.lower())
+    if abbr is None:
+        # Case-insensitive matches such as 'ſ' for 's' that str.lower() does not map back
+        abbr = next(
+            value for key, value in ABBREVIATIONS.items()
+            if re.fullmatch(re.escape(key), word, re.IGNORECASE)
+        )
+    return abbr
+
 # Value Object Pattern - immutable content representation
 @dataclass(frozen=True)
 class ContentContext:
-    """Immutable representation of content with context for reduction"""
-    text: str
+    """
+    Immutable representation of content with context for reduction
+    
+    The content is held as text or as the paragraphs it is made of, whichever the last
+    strategy produced, and the other form is only built when it is needed. Strategies
+    working paragraph by paragraph hand their parts on without joining and re-splitting.
+    """
+    source: Union[str, List[str]]
     max_length: int
-    patterns: Dict[str, str]
+    patterns: Dict[str, Pattern]
     
-    @property
+    @cached_property
+    def text(self) -> str:
+        """The content as text"""
+        if isinstance(self.source, str):
+            return self.source
+        return '\n\n'.join(self.source)
+    
+    @cached_property
+    def paragraphs(self) -> List[str]:
+        """The content split into paragraphs"""
+        if isinstance(self.source, str):
+            return PARAGRAPH_BREAK.split(self.source)
+        return self.source
+    
+    @cached_property
     def length(self) -> int:
-        return len(self.text)
+        if isinstance(self.source, str):
+            return len(self.source)
+        return sum(map(len, self.source)) + 2 * (len(self.source) - 1)
     
     @property
     def is_within_limits(self) -> bool:
@@ -28,7 +192,23 @@ class ContentContext:
     def with_text(self, new_text: str) -> 'ContentContext':
         """Create new context with updated text"""
         return ContentContext(
-            text=new_text,
+            source=new_text,
+            max_length=self.max_length,
+            patterns=self.patterns
+        )
+    
+    def with_paragraphs(self, parts: List[str]) -> 'ContentContext':
+        """
+        Create new context with the parts as paragraphs separated by blank lines
+        
+        Parts must not contain blank lines themselves, as is the case for paragraphs and
+        anything cut from them. The parts are joined right away when splitting the text
+        would not give them back, i.e. when a part is empty or starts or ends with a newline.
+        """
+        if not parts or not all(part and part[0] != '\n' and part[-1] != '\n' for part in parts):
+            return self.with_text('\n\n'.join(parts))
+        return ContentContext(
+            source=parts,
             max_length=self.max_length,
             patterns=self.patterns
         )
@@ -72,20 +252,16 @@ class HeaderPreservationStrategy:
         if context.is_within_limits:
             return context
             
-        paragraphs = re.split(r'\n\n+', context.text)
         high_priority = []
         normal_paragraphs = []
         remaining_chars = context.remaining_chars
         
         # Categorize paragraphs
-        for para in paragraphs:
-            if not para.strip():
+        for para in context.paragraphs:
+            if not para or para.isspace():
                 continue
                 
-            # Check if paragraph is a header, code block, etc.
-            if (re.search(context.patterns['headers'], para, re.MULTILINE) or 
-                re.search(context.patterns['code_blocks'], para) or
-                para.strip().startswith('>')):
+            if self.is_high_priority(para, context.patterns):
                 high_priority.append(para)
             else:
                 normal_paragraphs.append(para)
@@ -98,21 +274,23 @@ class HeaderPreservationStrategy:
                 remaining_chars -= len(para) + 2  # +2 for the '\n\n'
             else:
                 # Try to include headers even if paragraph doesn't fit
-                lines = para.split('\n')
-                for line in lines:
-                    if re.match(context.patterns['headers'], line) and len(line) <= remaining_chars:
+                for line in _header_lines(para):
+                    if len(line) <= remaining_chars:
                         result_parts.append(line)
                         remaining_chars -= len(line) + 1
         
-        # Reconstruct preserved content and add remaining paragraphs back for further processing
-        preserved_content = '\n\n'.join(result_parts)
-        remaining_paragraphs = '\n\n'.join(normal_paragraphs)
-        
         # Return both preserved content and pending content for further reduction
-        if preserved_content:
-            return context.with_text(preserved_content + "\n\n" + remaining_paragraphs)
-        else:
-            return context.with_text(remaining_paragraphs)
+        if result_parts and not normal_paragraphs:
+            return context.with_text('\n\n'.join(result_parts) + "\n\n")
+        return context.with_paragraphs(result_parts + normal_paragraphs)
+    
+    def is_high_priority(self, para: str, patterns: Dict[str, Pattern]) -> bool:
+        """Check if paragraph is a header, code block, etc."""
+        return bool(
+            ('#' in para and _is_header(para)) or 
+            ('`' in para and patterns['code_blocks'].search(para)) or
+            QUOTE_START.match(para)
+        )
 
 class ListReductionStrategy:
     """Reduces list content while preserving structure"""
@@ -121,101 +299,118 @@ class ListReductionStrategy:
         if context.is_within_limits:
             return context
             
-        paragraphs = re.split(r'\n\n+', context.text)
         result_parts = []
         remaining_chars = context.remaining_chars
         
-        for para in paragraphs:
+        for para in context.paragraphs:
             if remaining_chars <= 0:
                 break
-                
-            # Check if it's a list paragraph - more aggressive detection including multi-line lists
-            is_list = (re.search(context.patterns['bullets'], para, re.MULTILINE) or 
-                       re.search(context.patterns['numbered'], para, re.MULTILINE) or
-                       len(re.findall(r'^\s*[-"\'*•]\s+.*$', para, re.MULTILINE)) > 3)  # Detect lists with quotes
             
-            if is_list:
-                # Process list paragraph
-                lines = para.split('\n')
-                
-                # Extract list items with better pattern matching for quoted items
-                list_items = []
-                current_item = ""
-                
-                for line in lines:
-                    # Check for various list item formats including quoted items
-                    list_marker_match = re.match(r'^(\s*[-*•]\s+|"\s*|\'|^\s*\d+\.\s+)(.*)', line)
-                    
-                    if list_marker_match:
-                        # If we have a previous item being built, add it
-                        if current_item:
-                            list_items.append(current_item.strip())
-                            current_item = ""
-                        
-                        content = list_marker_match.group(2)
-                        current_item = content
-                    else:
-                        # This might be a continuation of the previous item
-                        if line.strip() and current_item:
-                            current_item += " " + line.strip()
-                        elif line.strip():
-                            # New content but not a list marker - might be a non-formatted list
-                            list_items.append(line.strip())
-                
-                # Add the last item if there is one
-                if current_item:
-                    list_items.append(current_item.strip())
-                
-                # Detect repetitive structures or patterns to compress further
-                if list_items and len(list_items) > 3:
-                    # Try to find common patterns
-                    patterns = self._find_patterns(list_items)
-                    if patterns:
-                        sample_items = [list_items[0], list_items[1], list_items[2]]
-                        formatted = f"List of {len(list_items)} similar items showing pattern: {patterns}. Examples: {' | '.join(sample_items)}..."
-                        if len(formatted) <= remaining_chars:
-                            result_parts.append(formatted)
-                            remaining_chars -= len(formatted) + 2
-                            continue
+            # Nothing is short enough to be added any more, except tiny plain paragraphs
+            if remaining_chars < MIN_LIST_SUMMARY and len(para) > remaining_chars:
+                continue
                 
-                # Normal list processing when no patterns found or pattern summary is too long
-                # Filter to keep only important items plus examples
-                if list_items:
-                    # Always include some examples (first and last)
-                    sample_size = min(3, len(list_items))
-                    samples = []
-                    
-                    # Take beginning samples
-                    samples.extend(list_items[:sample_size])
-                    
-                    # Take end samples if list is long
-                    if len(list_items) > 6:
-                        samples.append("...")
-                        samples.extend(list_items[-1:])
-                    
-                    # Add count if many items
-                    if len(list_items) > 4:
-                        prefix = f"List ({len(list_items)} items): "
-                    else:
-                        prefix = "List: "
-                    
-                    combined = " | ".join(samples)
-                    formatted = prefix + combined
-                    
-                    if len(formatted) <= remaining_chars:
-                        result_parts.append(formatted)
-                        remaining_chars -= len(formatted) + 2
-                    elif list_items and len(prefix + list_items[0]) <= remaining_chars:
-                        # If too long, just keep count and first item
-                        result_parts.append(f"List ({len(list_items)} items): {list_items[0]}...")
-                        remaining_chars -= len(prefix + list_items[0]) + 5  # +5 for "..."
+            if self.is_list(para):
+                summary = self.summarize(para, remaining_chars)
+                if summary:
+                    formatted, used_chars = summary
+                    result_parts.append(formatted)
+                    remaining_chars -= used_chars
             else:
                 # Keep non-list paragraphs for further processing
                 if len(para) <= remaining_chars:
                     result_parts.append(para)
                     remaining_chars -= len(para) + 2
         
-        return context.with_text('\n\n'.join(result_parts))
+        return context.with_paragraphs(result_parts)
+    
+    def is_list(self, para: str) -> bool:
+        """Check if it's a list paragraph - more aggressive detection including multi-line lists"""
+        return _is_list(para) or _count_quoted_lines(para, 4) > 3  # Detect lists with quotes
+    
+    def summarize(self, para: str, remaining_chars: int) -> Optional[Tuple[str, int]]:
+        """
+        Summarize a list paragraph so it fits the remaining characters
+        
+        Args:
+            para: List paragraph
+            remaining_chars: Characters still available
+            
+        Returns:
+            Tuple of (summary, characters it uses up), or None if no summary fits
+        """
+        # Process list paragraph
+        lines = para.split('\n')
+        
+        # Extract list items with better pattern matching for quoted items
+        list_items = []
+        current_item = ""
+        
+        for line in lines:
+            # Check for various list item formats including quoted items
+            list_marker_match = LIST_MARKER.match(line)
+            
+            if list_marker_match:
+                # If we have a previous item being built, add it
+                if current_item:
+                    list_items.append(current_item.strip())
+                    current_item = ""
+                
+                content = list_marker_match.group(2)
+                current_item = content
+            else:
+                # This might be a continuation of the previous item
+                if line.strip() and current_item:
+                    current_item += " " + line.strip()
+                elif line.strip():
+                    # New content but not a list marker - might be a non-formatted list
+                    list_items.append(line.strip())
+        
+        # Add the last item if there is one
+        if current_item:
+            list_items.append(current_item.strip())
+        
+        # Detect repetitive structures or patterns to compress further
+        if list_items and len(list_items) > 3:
+            # Try to find common patterns
+            patterns = self._find_patterns(list_items)
+            if patterns:
+                sample_items = [list_items[0], list_items[1], list_items[2]]
+                formatted = f"List of {len(list_items)} similar items showing pattern: {patterns}. Examples: {' | '.join(sample_items)}..."
+                if len(formatted) <= remaining_chars:
+                    return formatted, len(formatted) + 2
+        
+        # Normal list processing when no patterns found or pattern summary is too long
+        # Filter to keep only important items plus examples
+        if list_items:
+            # Always include some examples (first and last)
+            sample_size = min(3, len(list_items))
+            samples = []
+            
+            # Take beginning samples
+            samples.extend(list_items[:sample_size])
+            
+            # Take end samples if list is long
+            if len(list_items) > 6:
+                samples.append("...")
+                samples.extend(list_items[-1:])
+            
+            # Add count if many items
+            if len(list_items) > 4:
+                prefix = f"List ({len(list_items)} items): "
+            else:
+                prefix = "List: "
+            
+            combined = " | ".join(samples)
+            formatted = prefix + combined
+            
+            if len(formatted) <= remaining_chars:
+                return formatted, len(formatted) + 2
+            elif list_items and len(prefix + list_items[0]) <= remaining_chars:
+                # If too long, just keep count and first item
+                return f"List ({len(list_items)} items): {list_items[0]}...", len(prefix + list_items[0]) + 5  # +5 for "..."
+        
+        return None
     
     def _find_patterns(self, items: List[str]) -> str:
         """Identify common patterns in list items"""
@@ -270,43 +465,41 @@ class ParagraphReductionStrategy:
         if context.is_within_limits:
             return context
             
-        paragraphs = re.split(r'\n\n+', context.text)
         result_parts = []
         remaining_chars = context.remaining_chars
         
-        for para in paragraphs:
+        for para in context.paragraphs:
             if remaining_chars <= 0:
                 break
-                
-            # For normal paragraphs, prioritize those with key terms
-            has_key_terms = bool(re.search(context.patterns['key_terms'], para, re.IGNORECASE))
             
             # Skip lists, they should be processed by ListReductionStrategy
-            is_list = re.search(context.patterns['bullets'], para, re.MULTILINE) or re.search(context.patterns['numbered'], para, re.MULTILINE)
-            if is_list:
+            if _is_list(para):
                 # Pass through list items unchanged
                 if len(para) <= remaining_chars:
                     result_parts.append(para)
                     remaining_chars -= len(para) + 2
                 continue
                 
-            # Split into sentences
-            sentences = re.split(r'(?<=[.!?])\s+', para)
-            
-            # Take at least first sentence, more if it's an important paragraph
-            if has_key_terms and len(sentences) > 1:
-                # For important paragraphs, try to include more sentences
-                num_sentences = min(3, len(sentences))
-                shortened = ' '.join(sentences[:num_sentences])
-            else:
-                # For regular paragraphs, take just the first sentence
-                shortened = sentences[0] if sentences else ''
-            
+            shortened = self.shorten(para, context.patterns)
             if shortened and len(shortened) <= remaining_chars:
                 result_parts.append(shortened)
                 remaining_chars -= len(shortened) + 2
         
-        return context.with_text('\n\n'.join(result_parts))
+        return context.with_paragraphs(result_parts)
+    
+    def shorten(self, para: str, patterns: Dict[str, Pattern]) -> str:
+        """Keep the first sentence of a paragraph, or up to three if it has key terms"""
+        # Split into sentences, at most three are ever kept
+        sentences = SENTENCE_BREAK.split(para, maxsplit=3)
+        
+        # Take at least first sentence, more if it's an important paragraph with key terms
+        if len(sentences) > 1 and patterns['key_terms'].search(para):
+            # For important paragraphs, try to include more sentences
+            num_sentences = min(3, len(sentences))
+            return ' '.join(sentences[:num_sentences])
+        
+        # For regular paragraphs, take just the first sentence
+        return sentences[0] if sentences else ''
 
 class TextCompressionStrategy:
     """Applies aggressive text compression techniques while maintaining some readability"""
@@ -325,12 +518,11 @@ class TextCompressionStrategy:
             return f"__REF_MATERIAL_{len(reference_materials) - 1}__"
         
         # Find and temporarily replace <ReferenceMaterials> tags and their content
-        text = re.sub(r'<ReferenceMaterials>[\s\S]*?</ReferenceMaterials>', save_reference_materials, text)
+        has_placeholders = "__REF_MATERIAL_" in text
+        text = REFERENCE_BLOCK.sub(save_reference_materials, text)
         
-        # 1. Replace common words with abbreviations using the centralized dictionary
-        for word, abbr in COMMON_WORDS.items():
-            # Use word boundaries to avoid partial word replacements
-            text = re.sub(rf'\b{word}\b', abbr, text, flags=re.IGNORECASE)
+        # 1. Replace common words with abbreviations using the centralized dictionary, in one pass
+        text = ABBREVIATION_PATTERN.sub(_abbreviate, text)
         
         # 2. Remove articles and some prepositions in non-essential contexts
         # Be careful not to damage readability too much
@@ -338,14 +530,18 @@ class TextCompressionStrategy:
             text = text.replace(phrase, " ")
         
         # 3. Remove redundant spaces
-        text = re.sub(r' {2,}', ' ', text)
+        text = MULTIPLE_SPACES.sub(' ', text)
         
         # 4. Ensure paragraphs are separated by single newlines, not double
-        text = re.sub(r'\n\n+', '\n', text)
+        text = PARAGRAPH_BREAK.sub('\n', text)
         
-        # 5. Restore the <ReferenceMaterials> tags
-        for i, ref in enumerate(reference_materials):
-            text = text.replace(f"__REF_MATERIAL_{i}__", ref)
+        # 5. Restore the <ReferenceMaterials> tags, one at a time if the original text
+        # already looked like a placeholder somewhere
+        if has_placeholders:
+            for i, ref in enumerate(reference_materials):
+                text = text.replace(f"__REF_MATERIAL_{i}__", ref)
+        elif reference_materials:
+            text = REFERENCE_PLACEHOLDER.sub(lambda match: reference_materials[int(match.group(1))], text)
         
         # 6. Add notice about compression
         if not text.endswith("[Content compressed]"):
@@ -382,17 +578,7 @@ def reduce_content(content: str, max_length: int) -> str:
     if len(content) <= max_length:
         return content
         
-    # Define content importance patterns
-    patterns = {
-        'headers': r'^#+\s+.*$',                              # Markdown headers
-        'bullets': r'^\s*[-*•]\s+.*$',                        # Bullet points
-        'numbered': r'^\s*\d+\.\s+.*$',                       # Numbered lists
-        'code_blocks': r'```[\s\S]*?```',                     # Code blocks
-        'key_terms': r'(important|note|warning|essential|critical|key|remember|significant)',  # Key indicator words
-        'definitions': r'^.{1,50}:\s+.+$'                     # Short definitions
-    }
-    
-    context = ContentContext(content, max_length, patterns)
+    context = ContentContext(content, max_length, CONTENT_PATTERNS)
     
     pipeline = ReductionPipeline([
         HeaderPreservationStrategy(),
@@ -404,3 +590,115 @@ def reduce_content(content: str, max_length: int) -> str:
     
     reduced_context = pipeline.process(context)
     return reduced_context.text
+
+def iter_paragraphs(chunks: Iterable[str], max_paragraph: int) -> Iterator[str]:
+    """
+    Split text arriving in pieces into paragraphs, holding at most one paragraph at a time
+    
+    Paragraphs are the same as splitting the whole text on blank lines, except that a
+    paragraph longer than max_paragraph is cut to its first max_paragraph characters and
+    the rest of it is skipped, so memory stays bounded however long a paragraph runs.
+    
+    Args:
+        chunks: Pieces of the text, in order
+        max_paragraph: Maximum length of a yielded paragraph
+        
+    Yields:
+        Paragraphs of the text
+    """
+    buffer = ""
+    overflow = False  # Skipping the rest of a paragraph that was cut
+    
+    for chunk in chunks:
+        buffer += chunk
+        
+        if overflow:
+            match = PARAGRAPH_BREAK.search(buffer)
+            if not match:
+                # Keep a trailing newline, it may start a break continuing in the next chunk
+                buffer = buffer[-1:] if buffer.endswith('\n') else ""
+                continue
+            buffer = buffer[match.start():]
+            overflow = False
+        
+        # Trailing newlines may turn into a break with the next chunk, so the last
+        # paragraph is held back with them until more text arrives
+        body = buffer.rstrip('\n')
+        parts = PARAGRAPH_BREAK.split(body)
+        last = parts.pop()
+        for part in parts:
+            yield part[:max_paragraph]
+        
+        if len(last) > max_paragraph:
+            yield last[:max_paragraph]
+            last = last[max_paragraph:]
+            overflow = True
+        buffer = last + buffer[len(body):]
+    
+    if not overflow:
+        yield from PARAGRAPH_BREAK.split(buffer)
+
+def reduce_content_stream(chunks: Iterable[str], max_length: int) -> str:
+    """
+    Reduce content arriving in pieces, reading only as much of it as fits
+    
+    Unlike reduce_content() the content is never held whole. Paragraphs are taken in
+    order and each one goes through the same rules the pipeline applies: headers, code
+    blocks and quotes are kept whole or by their header lines, lists are summarized and
+    other paragraphs are kept whole or shortened to their first sentences. Reading stops
+    as soon as the remaining budget is too small for another paragraph.
+    
+    Args:
+        chunks: Pieces of the original content, in order
+        max_length: Maximum allowed length
+    
+    Returns:
+        Reduced content that fits within max_length
+    """
+    # Content that fits is returned unchanged, so read just past max_length to find out
+    chunks = iter(chunks)
+    head = []
+    head_length = 0
+    for chunk in chunks:
+        head.append(chunk)
+        head_length += len(chunk)
+        if head_length > max_length:
+            break
+    else:
+        return "".join(head)
+    
+    headers = HeaderPreservationStrategy()
+    lists = ListReductionStrategy()
+    paragraphs = ParagraphReductionStrategy()
+    result_parts = []
+    remaining_chars = max_length - 100  # Reserve 100 chars for notice, as ContentContext does
+    
+    for para in iter_paragraphs(chain(head, chunks), max_length):
+        if remaining_chars < MIN_STREAM_PART:
+            break
+        if not para or para.isspace():
+            continue
+        
+        if headers.is_high_priority(para, CONTENT_PATTERNS):
+            if len(para) <= remaining_chars:
+                result_parts.append(para)
+                remaining_chars -= len(para) + 2
+            else:
+                # Try to include headers even if paragraph doesn't fit
+                for line in _header_lines(para):
+                    if len(line) <= remaining_chars:
+                        result_parts.append(line)
+                        remaining_chars -= len(line) + 1
+        elif lists.is_list(para):
+            summary = lists.summarize(para, remaining_chars)
+            if summary:
+                formatted, used_chars = summary
+                result_parts.append(formatted)
+                remaining_chars -= used_chars
+        else:
+            shortened = para if len(para) <= remaining_chars else paragraphs.shorten(para, CONTENT_PATTERNS)
+            if shortened and len(shortened) <= remaining_chars:
+                result_parts.append(shortened)
+                remaining_chars -= len(shortened) + 2
+    
+    return '\n\n'.join(result_parts)
@@ -0,0 +1,96 @@
+import math
+import re
+from collections import Counter
+from dataclasses import dataclass
+from itertools import combinations
+from typing import Dict, List, Optional
+
+from constants import CONVERGENCE_THRESHOLD
+from utils.reference_index import tokenize
+
+# Agreement has to be stated about the other agents, so "I support the adoption of"
+# or "aligns with grid needs" in an agent's own argument does not count
+AGREEMENT_PATTERN = re.compile(
+    r"\b(i (fully |completely |strongly )?agree|we (all )?agree|in agreement with|i concur|"
+    r"(echo|share|support|align with|aligns? (well )?with) "
+    r"(what|(the )?other agents?|my colleagues?|\w+'s (view|point|position|conclusion)s?|"
+    r"the (view|point|position|conclusion)s? (of|made|raised|expressed|shared)))\b",
+    re.IGNORECASE
+)
+DISAGREEMENT_PATTERN = re.compile(
+    r"\b(disagree|not convinced|push back|on the other hand|in contrast|i differ|"
+    r"(would|must) challenge|however)\b",
+    re.IGNORECASE
+)
+
+
+@dataclass(frozen=True)
+class Convergence:
+    """Why a discussion is considered converged"""
+    reason: str  # "agreement", "stable" or "markers"
+    score: float
+    description: str
+
+
+def cosine_similarity(a: Counter, b: Counter) -> float:
+    """Cosine similarity of two term frequency vectors"""
+    if not a or not b:
+        return 0.0
+    dot = sum(count * b[term] for term, count in a.items() if term in b)
+    norm = math.sqrt(sum(c * c for c in a.values())) * math.sqrt(sum(c * c for c in b.values()))
+    return dot / norm
+
+
+def _mean(values: List[float]) -> float:
+    """Mean of a list of values, 0 when empty"""
+    return sum(values) / len(values) if values else 0.0
+
+
+def detect_convergence(
+    current: Dict[str, str],
+    previous: Optional[Dict[str, str]] = None,
+    threshold: float = CONVERGENCE_THRESHOLD
+) -> Optional[Convergence]:
+    """
+    Check whether the agents have converged after a round
+    
+    Three signals are checked in order:
+    - markers: after the opening round, every agent explicitly agrees and none pushes back
+    - agreement: the agents' latest messages are lexically similar to each other
+    - stable: each agent's latest message is lexically similar to its previous one
+    
+    Args:
+        current: Latest round's message content by agent id
+        previous: Previous round's message content by agent id, if any
+        threshold: Similarity from 0 to 1 at which agents are considered converged
+    
+    Returns:
+        The convergence found, or None if the discussion should go on
+    """
+    if not current:
+        return None
+    
+    # In the opening round the agents have not read each other, so there is nothing to agree with
+    if previous and len(current) > 1 and threshold <= 1 and all(
+        AGREEMENT_PATTERN.search(content) and not DISAGREEMENT_PATTERN.search(content)
+        for content in current.values()
+    ):
+        return Convergence("markers", 1.0, "All agents stated agreement")
+    
+    vectors = {agent_id: Counter(tokenize(content)) for agent_id, content in current.items()}
+    
+    if len(vectors) > 1:
+        score = _mean([cosine_similarity(a, b) for a, b in combinations(vectors.values(), 2)])
+        if score >= threshold:
+            return Convergence("agreement", score, f"Agents' responses are {score:.0%} similar")
+    
+    if previous:
+        scores = [
+            cosine_similarity(vector, Counter(tokenize(previous[agent_id])))
+            for agent_id, vector in vectors.items() if agent_id in previous
+        ]
+        score = _mean(scores)
+        if scores and score >= threshold:
+            return Convergence("stable", score, f"Agents' positions changed little since the last round ({score:.0%} similar)")
+    
+    return None
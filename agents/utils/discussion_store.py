@@ -0,0 +1,293 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from models import AgentMessage, Discussion, DiscussionStatus
+from constants import (
+    DISCUSSION_STORE_MAX_ENTRIES,
+    DISCUSSION_STORE_TTL,
+    DISCUSSION_STORE_PATH,
+    DISCUSSION_LOG_RETENTION,
+    DISCUSSION_LOG_PRUNE_INTERVAL
+)
+
+
+class DiscussionStore:
+    """
+    Bounded store of discussions
+    
+    Discussions in progress are kept in memory until they finish. Finished ones move
+    to an LRU with a TTL, so memory use depends on the number of running discussions
+    rather than on how many were served. Every change is appended to a SQLite event
+    log, from which evicted discussions are rebuilt when they are looked up again.
+    Discussions whose last event is older than the retention are pruned from the
+    log on startup and every prune_interval writes after that.
+    """
+    
+    def __init__(
+        self,
+        max_entries: int = DISCUSSION_STORE_MAX_ENTRIES,
+        ttl: float = DISCUSSION_STORE_TTL,
+        path: Optional[str] = DISCUSSION_STORE_PATH,
+        retention: float = DISCUSSION_LOG_RETENTION,
+        prune_interval: int = DISCUSSION_LOG_PRUNE_INTERVAL
+    ):
+        """
+        Initialize the store
+        
+        Args:
+            max_entries: Maximum number of finished discussions kept in memory
+            ttl: Seconds a finished discussion stays in memory after its last use
+            path: SQLite database file for the event log, None to keep discussions in memory only
+            retention: Seconds a discussion is kept in the log after its last event
+            prune_interval: Number of writes between pruning the log
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.retention = retention
+        self.prune_interval = prune_interval
+        self._writes = 0
+        self._active: Dict[str, Discussion] = {}
+        self._memory: "OrderedDict[str, Tuple[float, Discussion]]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        # A single writer thread keeps events in order without blocking the event loop
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="discussion-store")
+        
+        self.memory_hits = 0
+        self.log_hits = 0
+        self.misses = 0
+        
+        if path:
+            try:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                self._db = sqlite3.connect(path, check_same_thread=False)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute("PRAGMA synchronous=NORMAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS discussion_events "
+                    "(seq INTEGER PRIMARY KEY AUTOINCREMENT, discussion_id TEXT NOT NULL, "
+                    "created_at REAL NOT NULL, kind TEXT NOT NULL, payload TEXT NOT NULL)"
+                )
+                self._db.execute(
+                    "CREATE INDEX IF NOT EXISTS discussion_events_by_id "
+                    "ON discussion_events (discussion_id, seq)"
+                )
+                self._prune()
+                self._fail_interrupted()
+            except sqlite3.Error as e:
+                logger.error(f"Error opening discussion log at {path}: {str(e)}")
+                self._db = None
+    
+    def create(self, discussion: Discussion):
+        """
+        Add a new discussion, keeping it in memory until finish() is called
+        
+        Args:
+            discussion: Discussion that is starting
+        """
+        self._active[discussion.id] = discussion
+        self._append(
+            discussion.id,
+            "created",
+            discussion.model_dump(mode="json", exclude={"messages", "summaries"})
+        )
+    
+    def add_message(self, discussion: Discussion, message: AgentMessage):
+        """
+        Add an agent message to a discussion
+        
+        Args:
+            discussion: Discussion the message belongs to
+            message: Message to add
+        """
+        discussion.messages.append(message)
+        self._append(discussion.id, "message", message.model_dump(mode="json"))
+    
+    def add_summary(self, discussion: Discussion, round_num: int, summary: str):
+        """
+        Record the summary of a discussion's rounds up to round_num
+        
+        Args:
+            discussion: Discussion the summary belongs to
+            round_num: Last round the summary covers
+            summary: Summary text
+        """
+        discussion.summaries[round_num] = summary
+        self._append(discussion.id, "summary", {"round": round_num, "summary": summary})
+    
+    def finish(self, discussion: Discussion):
+        """
+        Record a discussion's final state and make it evictable
+        
+        Args:
+            discussion: Discussion that completed or failed
+        """
+        self._append(
+            discussion.id,
+            "finished",
+            discussion.model_dump(mode="json", include={"status", "consensus", "history_tokens_saved"})
+        )
+        self._active.pop(discussion.id, None)
+        self._remember(discussion)
+    
+    async def get(self, discussion_id: str) -> Optional[Discussion]:
+        """
+        Look up a discussion by id
+        
+        Args:
+            discussion_id: ID of the discussion
+        
+        Returns:
+            The discussion, or None if it is unknown or dropped from the log
+        """
+        discussion = self._active.get(discussion_id)
+        if discussion is not None:
+            self.memory_hits += 1
+            return discussion
+        
+        now = time.time()
+        entry = self._memory.get(discussion_id)
+        if entry is not None:
+            last_used, discussion = entry
+            if now - last_used <= self.ttl:
+                self._remember(discussion)
+                self.memory_hits += 1
+                return discussion
+            del self._memory[discussion_id]
+        
+        if self._db is not None:
+            loop = asyncio.get_event_loop()
+            # The writer thread runs the read after any pending appends
+            discussion = await loop.run_in_executor(self._writer, self._replay, discussion_id)
+            if discussion is not None:
+                self._remember(discussion)
+                self.log_hits += 1
+                return discussion
+        
+        self.misses += 1
+        return None
+    
+    def stats(self) -> Dict[str, Any]:
+        """Lookup counters and current size"""
+        return {
+            "active": len(self._active),
+            "memory_entries": len(self._memory),
+            "memory_hits": self.memory_hits,
+            "log_hits": self.log_hits,
+            "misses": self.misses,
+            "persistent": self._db is not None
+        }
+    
+    def close(self):
+        """Write pending events and close the log"""
+        self._writer.shutdown(wait=True)
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+    
+    def _remember(self, discussion: Discussion):
+        """Add a finished discussion to the in-memory LRU, evicting old or expired ones"""
+        now = time.time()
+        self._memory[discussion.id] = (now, discussion)
+        self._memory.move_to_end(discussion.id)
+        while self._memory:
+            last_used, _ = next(iter(self._memory.values()))
+            if len(self._memory) <= self.max_entries and now - last_used <= self.ttl:
+                break
+            self._memory.popitem(last=False)
+    
+    def _append(self, discussion_id: str, kind: str, payload: Dict[str, Any]):
+        """Queue an event for the log"""
+        if self._db is None:
+            return
+        event = (discussion_id, time.time(), kind, json.dumps(payload, separators=(",", ":")))
+        self._writer.submit(self._write, event)
+    
+    def _write(self, event: Tuple[str, float, str, str]):
+        """Append an event to SQLite"""
+        try:
+            self._db.execute(
+                "INSERT INTO discussion_events (discussion_id, created_at, kind, payload) VALUES (?, ?, ?, ?)",
+                event
+            )
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Error writing discussion log: {str(e)}")
+        
+        self._writes += 1
+        if self._writes % self.prune_interval == 0:
+            self._prune()
+    
+    def _prune(self):
+        """Drop the events of discussions whose last event is older than the retention"""
+        try:
+            self._db.execute(
+                "DELETE FROM discussion_events WHERE discussion_id IN ("
+                "SELECT discussion_id FROM discussion_events GROUP BY discussion_id HAVING MAX(created_at) < ?)",
+                (time.time() - self.retention,)
+            )
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Error pruning discussion log: {str(e)}")
+    
+    def _fail_interrupted(self):
+        """
+        Mark discussions that were still running when the server last stopped as failed
+        
+        Their tasks are gone, so without a finished event they would be rebuilt as
+        in progress forever.
+        """
+        try:
+            rows: List[Tuple[str]] = self._db.execute(
+                "SELECT discussion_id FROM discussion_events GROUP BY discussion_id "
+                "HAVING SUM(kind = 'created') > 0 AND SUM(kind = 'finished') = 0"
+            ).fetchall()
+            payload = json.dumps({"status": DiscussionStatus.FAILED.value}, separators=(",", ":"))
+            now = time.time()
+            self._db.executemany(
+                "INSERT INTO discussion_events (discussion_id, created_at, kind, payload) VALUES (?, ?, 'finished', ?)",
+                [(discussion_id, now, payload) for (discussion_id,) in rows]
+            )
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Error reconciling discussion log: {str(e)}")
+            return
+        
+        if rows:
+            logger.info(f"Marked {len(rows)} interrupted discussions as failed")
+    
+    def _replay(self, discussion_id: str) -> Optional[Discussion]:
+        """Rebuild a discussion from its logged events"""
+        try:
+            rows: List[Tuple[str, str]] = self._db.execute(
+                "SELECT kind, payload FROM discussion_events WHERE discussion_id = ? ORDER BY seq",
+                (discussion_id,)
+            ).fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"Error reading discussion log: {str(e)}")
+            return None
+        
+        fields: Optional[Dict[str, Any]] = None
+        messages: List[AgentMessage] = []
+        summaries: Dict[int, str] = {}
+        for kind, payload in rows:
+            data = json.loads(payload)
+            if kind == "created":
+                fields = data
+            elif kind == "message":
+                messages.append(AgentMessage(**data))
+            elif kind == "summary":
+                summaries[data["round"]] = data["summary"]
+            elif kind == "finished" and fields is not None:
+                fields.update(data)
+        
+        if fields is None:
+            return None
+        return Discussion(**fields, messages=messages, summaries=summaries)
@@ -0,0 +1,186 @@
+import asyncio
+from collections import deque
+from typing import Any, AsyncGenerator, Deque, Dict, Optional, Set
+
+from models import MessageType
+from constants import REPLAY_BUFFER_SIZE, RESUME_GRACE_PERIOD
+
+# Marks the end of the stream in subscriber queues
+_END = None
+
+# Updates about a message in progress, replaced by its agent_message or agent_error once it ends
+_TRANSIENT_TYPES = {MessageType.AGENT_TOKEN, MessageType.QUEUE_STATUS}
+_MESSAGE_END_TYPES = {MessageType.AGENT_MESSAGE, MessageType.AGENT_ERROR}
+
+
+class DiscussionStream:
+    """
+    Numbered updates of a running discussion, with a replay buffer and fan-out
+    
+    Every update gets the next sequence number and is kept in a bounded buffer, so a
+    client that reconnects can ask for the updates after the last one it received.
+    Once a message ends, its token and queue updates are dropped from the buffer,
+    so it holds completed messages rather than every token of them. A full buffer
+    also drops those updates first, since the message that ends them replaces them.
+    
+    The discussion is cancelled once nobody has been subscribed for the grace period,
+    which gives clients time to reconnect and resume. When no subscriber ever got an
+    update, nobody can resume it, so it is cancelled as soon as the last one leaves.
+    """
+    
+    def __init__(
+        self,
+        discussion_id: str,
+        max_events: int = REPLAY_BUFFER_SIZE,
+        grace_period: float = RESUME_GRACE_PERIOD
+    ):
+        """
+        Initialize the stream
+        
+        Args:
+            discussion_id: ID of the discussion the updates belong to
+            max_events: Maximum number of updates kept for replay
+            grace_period: Seconds the discussion keeps running without subscribers
+        """
+        self.discussion_id = discussion_id
+        self.grace_period = grace_period
+        self.task: Optional[asyncio.Task] = None
+        self.done = False
+        self._events: Deque[Dict[str, Any]] = deque(maxlen=max_events)
+        self._last_seq = 0
+        # Highest sequence number dropped because the buffer was full
+        self._evicted_seq = 0
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._delivered = False
+        self._idle_timer: Optional[asyncio.TimerHandle] = None
+    
+    @property
+    def last_seq(self) -> int:
+        """Sequence number of the latest update, 0 before the first one"""
+        return self._last_seq
+    
+    @property
+    def subscribers(self) -> int:
+        """Number of clients currently receiving updates"""
+        return len(self._subscribers)
+    
+    def publish(self, update: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Number an update, buffer it and send it to every subscriber
+        
+        Args:
+            update: Dictionary with update type and data
+        
+        Returns:
+            The update with its discussion_id and seq
+        """
+        self._last_seq += 1
+        event = {**update, "discussion_id": self.discussion_id, "seq": self._last_seq}
+        if update.get("type") in _MESSAGE_END_TYPES:
+            self._compact(update.get("data", {}).get("message_id"))
+        if len(self._events) == self._events.maxlen:
+            self._evict()
+        self._events.append(event)
+        for queue in self._subscribers:
+            queue.put_nowait(event)
+        return event
+    
+    def close(self):
+        """Mark the stream as finished and end every subscription"""
+        self.done = True
+        self._cancel_idle_timer()
+        for queue in self._subscribers:
+            queue.put_nowait(_END)
+    
+    def cancel(self):
+        """Cancel the discussion producing the updates"""
+        if self.task and not self.task.done():
+            self.task.cancel()
+    
+    def missed(self, last_seq: int) -> bool:
+        """Whether updates after last_seq were already dropped because the buffer was full"""
+        return last_seq < self._evicted_seq
+    
+    def subscribe(self, last_seq: int = 0) -> asyncio.Queue:
+        """
+        Register a subscriber, queueing the buffered updates after last_seq
+        
+        The subscriber is registered right away rather than once it starts reading,
+        so a discussion is never left running without anyone counted as listening.
+        Every subscription must end with unsubscribe().
+        
+        Args:
+            last_seq: Sequence number of the last update the client already has
+        
+        Returns:
+            Queue of the subscription, to pass to receive() and unsubscribe()
+        """
+        # Take the backlog and register in one step, so no update is missed or repeated
+        queue: asyncio.Queue = asyncio.Queue()
+        for event in self._events:
+            if event["seq"] > last_seq:
+                queue.put_nowait(event)
+        if self.done:
+            queue.put_nowait(_END)
+        else:
+            self._subscribers.add(queue)
+            self._cancel_idle_timer()
+        return queue
+    
+    async def receive(self, queue: asyncio.Queue) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Receive the updates of a subscription until the stream ends
+        
+        Args:
+            queue: Queue returned by subscribe()
+        
+        Yields:
+            Updates with their discussion_id and seq, in order
+        """
+        while (event := await queue.get()) is not _END:
+            yield event
+            # Asking for the next update means the subscriber handled this one
+            self._delivered = True
+    
+    def unsubscribe(self, queue: asyncio.Queue):
+        """
+        End a subscription, cancelling the discussion when it was the last one
+        
+        Args:
+            queue: Queue returned by subscribe()
+        """
+        if queue not in self._subscribers:
+            return
+        self._subscribers.discard(queue)
+        if self._subscribers or self.done:
+            return
+        if not self._delivered:
+            self.cancel()
+            return
+        self._idle_timer = asyncio.get_event_loop().call_later(self.grace_period, self.cancel)
+    
+    def _evict(self):
+        """Make room for an update, dropping the oldest token or queue update if there is one"""
+        for event in self._events:
+            if event.get("type") in _TRANSIENT_TYPES:
+                self._events.remove(event)
+                return
+        self._evicted_seq = self._events.popleft()["seq"]
+    
+    def _compact(self, message_id: Optional[str]):
+        """Drop the buffered token and queue updates of a message that ended"""
+        if message_id is None:
+            return
+        kept = [
+            event for event in self._events
+            if event.get("type") not in _TRANSIENT_TYPES
+            or event.get("data", {}).get("message_id") != message_id
+        ]
+        if len(kept) < len(self._events):
+            self._events = deque(kept, maxlen=self._events.maxlen)
+    
+    def _cancel_idle_timer(self):
+        """Stop a pending cancellation for lack of subscribers"""
+        if self._idle_timer is not None:
+            self._idle_timer.cancel()
+            self._idle_timer = None
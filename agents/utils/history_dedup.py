@@ -0,0 +1,172 @@
+import re
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, FrozenSet, List, Optional, Tuple
+
+import numpy as np
+
+from constants import (
+    HISTORY_DEDUP_THRESHOLD,
+    HISTORY_DEDUP_SHINGLE_SIZE,
+    HISTORY_DEDUP_MIN_WORDS,
+    HISTORY_DEDUP_PERMUTATIONS,
+    HISTORY_DEDUP_BANDS,
+    HISTORY_DEDUP_CACHE_SIZE
+)
+from utils.token_budget import estimate_tokens
+
+# Sentences end at terminal punctuation followed by spaces, or at line breaks
+SENTENCE_SPLIT = re.compile(r'((?<=[.!?])[ \t]+|\n+)')
+WORD_PATTERN = re.compile(r'[a-z0-9]+')
+SPACE_BEFORE_NEWLINE = re.compile(r'[ \t]+\n')
+MINHASH_PRIME = (1 << 32) - 5  # Largest prime below 2**32, keeps a * h + b within uint64
+MINHASH_SEED = 1  # Fixed so results are the same across runs and processes
+
+
+def sentence_shingles(sentence: str, size: int = HISTORY_DEDUP_SHINGLE_SIZE) -> FrozenSet[int]:
+    """
+    Hash the overlapping word n-grams of a sentence
+    
+    Args:
+        sentence: Sentence text
+        size: Words per shingle
+    
+    Returns:
+        Set of 32-bit shingle hashes, empty for sentences shorter than HISTORY_DEDUP_MIN_WORDS
+    """
+    words = WORD_PATTERN.findall(sentence.lower())
+    if len(words) < HISTORY_DEDUP_MIN_WORDS:
+        return frozenset()
+    return frozenset(
+        zlib.crc32(" ".join(words[i:i + size]).encode())
+        for i in range(max(len(words) - size + 1, 1))
+    )
+
+
+@dataclass(frozen=True)
+class DedupResult:
+    """Texts with near-duplicate sentences removed"""
+    texts: List[str]
+    removed_sentences: int
+    tokens_saved: int
+
+
+class SentenceDeduplicator:
+    """
+    Removes sentences that nearly repeat an earlier one, without any model calls
+    
+    Sentences are compared by the Jaccard similarity of their word shingles. MinHash
+    signatures split into LSH bands find the candidate pairs, so each sentence is only
+    compared exactly with the few earlier sentences likely to match.
+    """
+    
+    def __init__(
+        self,
+        threshold: float = HISTORY_DEDUP_THRESHOLD,
+        permutations: int = HISTORY_DEDUP_PERMUTATIONS,
+        bands: int = HISTORY_DEDUP_BANDS,
+        count_tokens: Optional[Callable[[str], int]] = None
+    ):
+        """
+        Initialize the deduplicator
+        
+        Args:
+            threshold: Shingle similarity at which a later sentence is removed
+            permutations: Number of MinHash functions, a multiple of bands
+            bands: Number of LSH bands the signature is split into
+            count_tokens: Function counting the tokens of a text, used to report savings
+        """
+        if permutations % bands:
+            raise ValueError("MinHash permutations must be a multiple of the LSH bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.count_tokens = count_tokens or estimate_tokens
+        rng = np.random.default_rng(MINHASH_SEED)
+        self._a = rng.integers(1, MINHASH_PRIME, permutations, dtype=np.uint64)
+        self._b = rng.integers(0, MINHASH_PRIME, permutations, dtype=np.uint64)
+        self._cache: "OrderedDict[Tuple[str, ...], DedupResult]" = OrderedDict()
+    
+    def _band_keys(self, shingles: FrozenSet[int]) -> List[Tuple[int, bytes]]:
+        """LSH bucket keys of a shingle set, one per band of its MinHash signature"""
+        hashes = np.fromiter(shingles, dtype=np.uint64, count=len(shingles))
+        signature = ((np.outer(hashes, self._a) + self._b) % MINHASH_PRIME).min(axis=0)
+        return [
+            (band, rows.tobytes())
+            for band, rows in enumerate(signature.reshape(self.bands, -1))
+        ]
+    
+    def deduplicate(self, texts: List[str]) -> DedupResult:
+        """
+        Remove sentences that nearly repeat an earlier sentence in any of the texts
+        
+        Texts are processed in order, so the first occurrence is always kept. Short
+        sentences, such as headings or brief agreement, are never removed.
+        
+        Args:
+            texts: Texts in chronological order
+        
+        Returns:
+            The texts without repeated sentences, with counts of what was removed
+        """
+        buckets: Dict[Tuple[int, bytes], List[int]] = {}
+        seen: List[FrozenSet[int]] = []
+        results = []
+        removed: List[str] = []
+        
+        for text in texts:
+            parts = SENTENCE_SPLIT.split(text)
+            output: List[str] = []
+            for i in range(0, len(parts), 2):
+                sentence = parts[i]
+                separator = parts[i + 1] if i + 1 < len(parts) else ""
+                shingles = sentence_shingles(sentence)
+                
+                if shingles:
+                    keys = self._band_keys(shingles)
+                    candidates = {index for key in keys for index in buckets.get(key, ())}
+                    if any(
+                        len(shingles & seen[index]) / len(shingles | seen[index]) >= self.threshold
+                        for index in candidates
+                    ):
+                        removed.append(sentence)
+                        # Keep line breaks so the surrounding structure survives
+                        if "\n" in separator and output and not output[-1].endswith("\n"):
+                            output.append(separator)
+                        continue
+                    
+                    for key in keys:
+                        buckets.setdefault(key, []).append(len(seen))
+                    seen.append(shingles)
+                
+                output.append(sentence + separator)
+            
+            results.append(SPACE_BEFORE_NEWLINE.sub("\n", "".join(output)).strip())
+        
+        return DedupResult(
+            texts=results,
+            removed_sentences=len(removed),
+            tokens_saved=sum(self.count_tokens(sentence) for sentence in removed)
+        )
+    
+    def deduplicate_cached(self, key: Tuple[str, ...], texts: List[str]) -> Tuple[DedupResult, bool]:
+        """
+        Deduplicate texts, reusing the result for a key seen recently
+        
+        Args:
+            key: Identifies the texts, for example the ids of the messages they come from
+            texts: Texts in chronological order
+        
+        Returns:
+            Tuple of (result, whether it came from the cache)
+        """
+        result = self._cache.get(key)
+        if result is not None:
+            self._cache.move_to_end(key)
+            return result, True
+        
+        result = self.deduplicate(texts)
+        self._cache[key] = result
+        while len(self._cache) > HISTORY_DEDUP_CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return result, False
@@ -0,0 +1,43 @@
+import math
+from collections import deque
+from typing import Deque, Optional
+
+from constants import HEDGE_LATENCY_WINDOW, HEDGE_MIN_SAMPLES
+
+
+class LatencyTracker:
+    """Recent latencies of one kind of request, for deciding when a request is late"""
+    
+    def __init__(self, window: int = HEDGE_LATENCY_WINDOW, min_samples: int = HEDGE_MIN_SAMPLES):
+        """
+        Initialize the tracker
+        
+        Args:
+            window: Number of most recent latencies kept
+            min_samples: Latencies needed before quantiles are reported
+        """
+        self.min_samples = min_samples
+        self._samples: Deque[float] = deque(maxlen=window)
+    
+    def __len__(self) -> int:
+        """Number of latencies kept"""
+        return len(self._samples)
+    
+    def record(self, seconds: float):
+        """Add a latency"""
+        self._samples.append(seconds)
+    
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Latency below which a share q of the recent requests finished
+        
+        Args:
+            q: Share from 0 to 1, for example 0.95 for the p95
+        
+        Returns:
+            The latency in seconds, or None until min_samples latencies were recorded
+        """
+        if len(self._samples) < max(self.min_samples, 1):
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(max(math.ceil(q * len(ordered)) - 1, 0), len(ordered) - 1)]
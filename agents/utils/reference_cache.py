@@ -0,0 +1,167 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from typing import Callable, List, Optional, Tuple
+
+from loguru import logger
+
+from constants import REFERENCE_CACHE_DIR
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def hash_file(filepath: str) -> str:
+    """SHA-256 digest of a file's contents"""
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ReferenceCache:
+    """
+    Persistent, content-addressed cache of reference text
+    
+    Extracted text is stored once per content hash, so identical files in several
+    agent folders share an entry. A manifest records each file's size and mtime with
+    its hash, letting unchanged files skip hashing as well as extraction. Derived
+    results, such as reduced reference content, are stored under caller-built keys.
+    """
+    
+    def __init__(self, root: str = REFERENCE_CACHE_DIR):
+        """
+        Initialize the cache
+        
+        Args:
+            root: Directory holding the manifest and cached text
+        """
+        self.root = root
+        self._text_dir = os.path.join(root, "text")
+        self._derived_dir = os.path.join(root, "derived")
+        os.makedirs(self._text_dir, exist_ok=True)
+        os.makedirs(self._derived_dir, exist_ok=True)
+        
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(root, "manifest.sqlite3"), check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS files "
+            "(path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, digest TEXT NOT NULL)"
+        )
+        self._db.commit()
+    
+    @staticmethod
+    def derived_key(kind: str, digests: List[str], **params) -> str:
+        """
+        Build a key for a result derived from one or more cached files
+        
+        Args:
+            kind: Name of the derivation
+            digests: Content hashes of the inputs, in order
+            params: Settings the derivation depends on
+        
+        Returns:
+            Hex digest identifying the derived result
+        """
+        payload = json.dumps({"kind": kind, "inputs": digests, "params": params}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    def file_digest(self, filepath: str) -> str:
+        """
+        Content hash of a file, reusing the manifest entry when size and mtime match
+        
+        Args:
+            filepath: Path of the file
+        
+        Returns:
+            SHA-256 hex digest of the file
+        """
+        path = os.path.abspath(filepath)
+        stat = os.stat(path)
+        
+        with self._lock:
+            row = self._db.execute(
+                "SELECT size, mtime_ns, digest FROM files WHERE path = ?", (path,)
+            ).fetchone()
+        if row and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return row[2]
+        
+        digest = hash_file(path)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO files (path, size, mtime_ns, digest) VALUES (?, ?, ?, ?)",
+                (path, stat.st_size, stat.st_mtime_ns, digest)
+            )
+            self._db.commit()
+        return digest
+    
+    def get_text(self, filepath: str, extract: Callable[[str], str]) -> Tuple[str, str]:
+        """
+        Get the text of a reference file, extracting it only if it is not cached
+        
+        Args:
+            filepath: Path of the reference file
+            extract: Function extracting text from the file, called on a miss
+        
+        Returns:
+            Tuple of (content hash, text)
+        """
+        digest = self.file_digest(filepath)
+        text_path = os.path.join(self._text_dir, f"{digest}.txt")
+        
+        text = self._read(text_path)
+        if text is None:
+            text = extract(filepath)
+            self._write(text_path, text)
+        
+        return digest, text
+    
+    def get_derived(self, key: str, produce: Callable[[], str]) -> str:
+        """
+        Get a derived result, producing and storing it on a miss
+        
+        Args:
+            key: Key from derived_key()
+            produce: Function computing the result
+        
+        Returns:
+            The derived text
+        """
+        derived_path = os.path.join(self._derived_dir, f"{key}.txt")
+        
+        text = self._read(derived_path)
+        if text is None:
+            text = produce()
+            self._write(derived_path, text)
+        
+        return text
+    
+    def close(self):
+        """Close the manifest database"""
+        with self._lock:
+            self._db.close()
+    
+    def _read(self, path: str) -> Optional[str]:
+        """Read a cached text file, or None if it is missing"""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"Error reading reference cache entry {path}: {str(e)}")
+            return None
+    
+    def _write(self, path: str, text: str):
+        """Write a cache entry atomically"""
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Error writing reference cache entry {path}: {str(e)}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
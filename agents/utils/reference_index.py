@@ -0,0 +1,230 @@
+import re
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+from constants import REFERENCE_CHUNK_SIZE, REFERENCE_CHUNK_OVERLAP
+
+PARAGRAPH_PATTERN = re.compile(r'\n\s*\n')
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+STOP_WORDS = frozenset({
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "can", "do", "for", "from",
+    "has", "have", "how", "i", "if", "in", "is", "it", "its", "me", "my", "not", "of",
+    "on", "or", "our", "so", "that", "the", "their", "them", "there", "these", "they",
+    "this", "to", "was", "we", "what", "when", "which", "who", "will", "with", "you", "your"
+})
+
+
+@dataclass(frozen=True)
+class ReferenceChunk:
+    """A piece of reference material that can be retrieved on its own"""
+    source: str
+    text: str
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase index terms, dropping stop words"""
+    return [
+        token for token in TOKEN_PATTERN.findall(text.lower())
+        if len(token) > 1 and token not in STOP_WORDS
+    ]
+
+
+def chunk_text(
+    text: str,
+    chunk_size: int = REFERENCE_CHUNK_SIZE,
+    overlap: int = REFERENCE_CHUNK_OVERLAP
+) -> List[str]:
+    """
+    Split text into chunks of about chunk_size characters
+    
+    Paragraphs are packed together until a chunk is full. Paragraphs longer than a
+    chunk are cut into overlapping windows, breaking at whitespace where possible.
+    
+    Args:
+        text: Text to split
+        chunk_size: Target maximum chunk length in characters
+        overlap: Characters shared between consecutive windows of a long paragraph
+    
+    Returns:
+        List of chunk strings
+    """
+    chunks = []
+    current: List[str] = []
+    current_length = 0
+    
+    def flush():
+        nonlocal current, current_length
+        if current:
+            chunks.append("\n\n".join(current))
+        current = []
+        current_length = 0
+    
+    for para in PARAGRAPH_PATTERN.split(text):
+        para = para.strip()
+        if not para:
+            continue
+        
+        if len(para) > chunk_size:
+            flush()
+            start = 0
+            while start < len(para):
+                end = min(start + chunk_size, len(para))
+                if end < len(para):
+                    space = para.rfind(" ", start + chunk_size // 2, end)
+                    if space != -1:
+                        end = space
+                chunks.append(para[start:end].strip())
+                if end >= len(para):
+                    break
+                start = max(end - overlap, start + 1)
+            continue
+        
+        if current and current_length + len(para) + 2 > chunk_size:
+            flush()
+        current.append(para)
+        current_length += len(para) + 2
+    
+    flush()
+    return chunks
+
+
+class ReferenceIndex:
+    """
+    BM25 index over reference chunks
+    
+    Postings are stored as NumPy arrays in a compressed sparse column layout: for
+    term t, the chunks containing it are doc_ids[indptr[t]:indptr[t + 1]] with the
+    matching term frequencies in term_freqs.
+    """
+    
+    def __init__(self, chunks: List[ReferenceChunk], k1: float = 1.5, b: float = 0.75):
+        """
+        Build the index
+        
+        Args:
+            chunks: Chunks to index
+            k1: BM25 term frequency saturation
+            b: BM25 length normalization
+        """
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+        self.vocabulary: Dict[str, int] = {}
+        
+        term_ids: List[int] = []
+        doc_ids: List[int] = []
+        term_freqs: List[int] = []
+        doc_lengths = np.zeros(len(chunks), dtype=np.float32)
+        
+        for doc_id, chunk in enumerate(chunks):
+            tokens = tokenize(chunk.text)
+            doc_lengths[doc_id] = len(tokens)
+            
+            counts: Dict[int, int] = {}
+            for token in tokens:
+                term_id = self.vocabulary.setdefault(token, len(self.vocabulary))
+                counts[term_id] = counts.get(term_id, 0) + 1
+            
+            for term_id, count in counts.items():
+                term_ids.append(term_id)
+                doc_ids.append(doc_id)
+                term_freqs.append(count)
+        
+        terms = np.asarray(term_ids, dtype=np.int32)
+        order = np.argsort(terms, kind="stable")
+        self._doc_ids = np.asarray(doc_ids, dtype=np.int32)[order]
+        self._term_freqs = np.asarray(term_freqs, dtype=np.float32)[order]
+        
+        doc_freqs = np.bincount(terms, minlength=len(self.vocabulary))
+        self._indptr = np.zeros(len(self.vocabulary) + 1, dtype=np.int64)
+        np.cumsum(doc_freqs, out=self._indptr[1:])
+        
+        num_docs = len(chunks)
+        self._idf = np.log1p((num_docs - doc_freqs + 0.5) / (doc_freqs + 0.5)).astype(np.float32)
+        
+        average_length = float(doc_lengths.mean()) if num_docs else 0.0
+        self._length_norm = k1 * (1 - b + b * doc_lengths / max(average_length, 1.0))
+    
+    def __len__(self) -> int:
+        return len(self.chunks)
+    
+    def search(self, query: str, top_k: int) -> List[Tuple[int, float]]:
+        """
+        Rank chunks against a query
+        
+        Args:
+            query: Query text
+            top_k: Maximum number of results
+        
+        Returns:
+            (chunk index, score) pairs with a positive score, best first
+        """
+        if not self.chunks or top_k <= 0:
+            return []
+        
+        scores = np.zeros(len(self.chunks), dtype=np.float32)
+        for token in set(tokenize(query)):
+            term_id = self.vocabulary.get(token)
+            if term_id is None:
+                continue
+            
+            start, end = self._indptr[term_id], self._indptr[term_id + 1]
+            docs = self._doc_ids[start:end]
+            freqs = self._term_freqs[start:end]
+            scores[docs] += self._idf[term_id] * freqs * (self.k1 + 1) / (freqs + self._length_norm[docs])
+        
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > top_k:
+            candidates = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+        ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+        
+        return [(int(index), float(scores[index])) for index in ranked]
+    
+    def select(
+        self,
+        query: str,
+        budget: int,
+        top_k: int,
+        measure: Callable[[str], int] = len
+    ) -> List[ReferenceChunk]:
+        """
+        Pick the chunks most relevant to a query that fit in a budget
+        
+        Args:
+            query: Query text
+            budget: Maximum combined chunk size, in the units returned by measure
+            top_k: Maximum number of chunks
+            measure: Size of a chunk's text, its length in characters by default
+        
+        Returns:
+            Selected chunks in their original order
+        """
+        selected = []
+        remaining = budget
+        for index, _ in self.search(query, top_k):
+            size = measure(self.chunks[index].text)
+            if size <= remaining:
+                selected.append(index)
+                remaining -= size
+        
+        return [self.chunks[index] for index in sorted(selected)]
+
+
+def build_reference_index(documents: List[Tuple[str, str]]) -> ReferenceIndex:
+    """
+    Chunk and index reference documents
+    
+    Args:
+        documents: (source name, text) pairs
+    
+    Returns:
+        Index over the documents' chunks
+    """
+    chunks = [
+        ReferenceChunk(source, chunk)
+        for source, text in documents
+        for chunk in chunk_text(text)
+    ]
+    return ReferenceIndex(chunks)
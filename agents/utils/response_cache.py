@@ -0,0 +1,195 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from constants import (
+    RESPONSE_CACHE_MAX_ENTRIES,
+    RESPONSE_CACHE_TTL,
+    RESPONSE_CACHE_PATH
+)
+
+
+class ResponseCache:
+    """
+    Two-tier cache of LLM responses
+    
+    Entries live in an in-memory LRU and, when a path is configured, in a SQLite
+    database that survives restarts. Both tiers expire entries after the TTL.
+    """
+    
+    def __init__(
+        self,
+        max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+        ttl: float = RESPONSE_CACHE_TTL,
+        path: Optional[str] = RESPONSE_CACHE_PATH
+    ):
+        """
+        Initialize the cache
+        
+        Args:
+            max_entries: Maximum number of entries kept in memory
+            ttl: Seconds an entry stays valid
+            path: SQLite database file for the persistent tier, None to disable it
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        
+        if path:
+            try:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                self._db = sqlite3.connect(path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS responses "
+                    "(key TEXT PRIMARY KEY, created_at REAL NOT NULL, content TEXT NOT NULL)"
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Error opening response cache at {path}: {str(e)}")
+                self._db = None
+    
+    @staticmethod
+    def make_key(
+        model: str,
+        system_prompt: str,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int
+    ) -> str:
+        """
+        Build the cache key for a generation request
+        
+        Args:
+            model: Name of the model
+            system_prompt: System instructions for the model
+            messages: Formatted conversation messages
+            temperature: Sampling temperature
+            max_tokens: Maximum response length
+            
+        Returns:
+            Hex digest identifying the request
+        """
+        payload = json.dumps(
+            {
+                "model": model,
+                "system": hashlib.sha256(system_prompt.encode("utf-8")).hexdigest(),
+                "messages": messages,
+                "temperature": temperature,
+                "max_tokens": max_tokens
+            },
+            sort_keys=True,
+            separators=(",", ":")
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    async def get(self, key: str) -> Optional[str]:
+        """
+        Look up a cached response
+        
+        Args:
+            key: Cache key from make_key()
+            
+        Returns:
+            Cached response text, or None on a miss
+        """
+        now = time.time()
+        entry = self._memory.get(key)
+        if entry is not None:
+            created_at, content = entry
+            if now - created_at <= self.ttl:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return content
+            del self._memory[key]
+        
+        if self._db is not None:
+            loop = asyncio.get_event_loop()
+            row = await loop.run_in_executor(None, self._read, key)
+            if row is not None and now - row[0] <= self.ttl:
+                self._remember(key, row[0], row[1])
+                self.disk_hits += 1
+                return row[1]
+        
+        self.misses += 1
+        return None
+    
+    async def set(self, key: str, content: str):
+        """
+        Store a response in both tiers
+        
+        Args:
+            key: Cache key from make_key()
+            content: Response text
+        """
+        created_at = time.time()
+        self._remember(key, created_at, content)
+        
+        if self._db is not None:
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(None, self._write, key, created_at, content)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size"""
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "persistent": self._db is not None
+        }
+    
+    def close(self):
+        """Close the persistent tier"""
+        if self._db is not None:
+            with self._lock:
+                self._db.close()
+            self._db = None
+    
+    def _remember(self, key: str, created_at: float, content: str):
+        """Add an entry to the in-memory LRU, evicting the oldest if full"""
+        self._memory[key] = (created_at, content)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+    
+    def _read(self, key: str) -> Optional[Tuple[float, str]]:
+        """Read an entry from SQLite"""
+        try:
+            with self._lock:
+                return self._db.execute(
+                    "SELECT created_at, content FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Error reading response cache: {str(e)}")
+            return None
+    
+    def _write(self, key: str, created_at: float, content: str):
+        """Write an entry to SQLite and drop expired ones"""
+        try:
+            with self._lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, created_at, content) VALUES (?, ?, ?)",
+                    (key, created_at, content)
+                )
+                self._db.execute(
+                    "DELETE FROM responses WHERE created_at < ?", (created_at - self.ttl,)
+                )
+                self._db.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Error writing response cache: {str(e)}")
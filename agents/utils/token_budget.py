@@ -0,0 +1,200 @@
+import math
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from loguru import logger
+
+from constants import (
+    MODEL_CONTEXT_WINDOW,
+    TOKENIZER_ENCODING,
+    CHARS_PER_TOKEN,
+    MESSAGE_TOKEN_OVERHEAD,
+    CONTEXT_SAFETY_MARGIN,
+    REFERENCE_CONTEXT_SHARE,
+    MIN_OUTPUT_TOKENS
+)
+
+try:
+    import tiktoken
+except ImportError:  # Optional, counts fall back to the estimate
+    tiktoken = None
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of tokens in a text from its length, rounding up"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def tokens_to_chars(tokens: int) -> int:
+    """Number of characters that fit in a token budget, for limits applied to text length"""
+    return int(tokens * CHARS_PER_TOKEN)
+
+
+class TokenCounter:
+    """Counts tokens exactly with tiktoken when it is installed, or estimates them"""
+    
+    def __init__(self, encoding: Optional[str] = TOKENIZER_ENCODING):
+        """
+        Initialize the counter
+        
+        Args:
+            encoding: tiktoken encoding to count with, None always estimates
+        """
+        self._encoding = None
+        if tiktoken is not None and encoding:
+            try:
+                self._encoding = tiktoken.get_encoding(encoding)
+            except Exception as e:
+                logger.warning(f"Tokenizer '{encoding}' unavailable, estimating token counts: {str(e)}")
+    
+    @property
+    def exact(self) -> bool:
+        """Whether counts come from a tokenizer rather than the estimate"""
+        return self._encoding is not None
+    
+    def count(self, text: str) -> int:
+        """Number of tokens in a text"""
+        if self._encoding is None:
+            return estimate_tokens(text)
+        return len(self._encoding.encode(text, disallowed_special=()))
+    
+    def count_message(self, message: Dict[str, str]) -> int:
+        """Number of tokens a chat message takes, including its template overhead"""
+        return self.count(message["content"]) + MESSAGE_TOKEN_OVERHEAD
+    
+    def count_messages(self, messages: List[Dict[str, str]]) -> int:
+        """Number of tokens a list of chat messages takes"""
+        return sum(self.count_message(message) for message in messages)
+
+
+@dataclass(frozen=True)
+class PromptBudget:
+    """Split of the context window between the parts of a request, in tokens"""
+    output: int
+    system: int
+    references: int
+    history: int
+
+
+class TokenBudgetManager:
+    """
+    Splits a model's context window between the system prompt, reference material,
+    discussion history and the expected output
+    
+    Prompts are fitted before they are sent, so the server neither truncates them
+    silently nor spends prefill on context that would be dropped.
+    """
+    
+    def __init__(
+        self,
+        context_window: int = MODEL_CONTEXT_WINDOW,
+        counter: Optional[TokenCounter] = None,
+        safety_margin: int = CONTEXT_SAFETY_MARGIN
+    ):
+        """
+        Initialize the budget manager
+        
+        Args:
+            context_window: Context length of the model in tokens
+            counter: Token counter, a default one is created if omitted
+            safety_margin: Tokens kept free to absorb counting error
+        """
+        self.context_window = context_window
+        self.counter = counter or TokenCounter()
+        self.safety_margin = safety_margin
+    
+    def count(self, text: str) -> int:
+        """Number of tokens in a text"""
+        return self.counter.count(text)
+    
+    def count_messages(self, messages: List[Dict[str, str]]) -> int:
+        """Number of tokens a list of chat messages takes"""
+        return self.counter.count_messages(messages)
+    
+    def output_budget(self, max_tokens: int) -> int:
+        """Tokens reserved for a response, capped at half the context window"""
+        return max(min(max_tokens, self.context_window // 2), 1)
+    
+    def prompt_budget(self, max_tokens: int) -> int:
+        """Tokens left for the whole prompt once the response is reserved"""
+        return max(self.context_window - self.output_budget(max_tokens) - self.safety_margin, 0)
+    
+    def plan(self, system_tokens: int, max_tokens: int, reference_tokens: int) -> PromptBudget:
+        """
+        Split the context window for a request
+        
+        References get at most REFERENCE_CONTEXT_SHARE of the space left after the
+        system prompt and the response, and discussion history gets the rest.
+        
+        Args:
+            system_tokens: Tokens of the system prompt without reference material
+            max_tokens: Requested maximum response length
+            reference_tokens: Reference material wanted, in tokens
+        
+        Returns:
+            Token budget of each part
+        """
+        output = self.output_budget(max_tokens)
+        available = max(self.prompt_budget(max_tokens) - system_tokens, 0)
+        references = min(reference_tokens, int(available * REFERENCE_CONTEXT_SHARE))
+        return PromptBudget(
+            output=output,
+            system=system_tokens,
+            references=references,
+            history=available - references
+        )
+    
+    def history_budget(self, system_prompt: str, max_tokens: int) -> int:
+        """Tokens left for messages next to a system prompt and a response"""
+        return max(self.prompt_budget(max_tokens) - self.count(system_prompt) - MESSAGE_TOKEN_OVERHEAD, 0)
+    
+    def fit_messages(
+        self,
+        messages: List[Dict[str, str]],
+        budget: int,
+        keep_first: int = 1
+    ) -> List[Dict[str, str]]:
+        """
+        Drop the oldest messages that do not fit in a budget
+        
+        The first keep_first messages, which carry the query, are always kept. The
+        remaining space is filled with the most recent messages.
+        
+        Args:
+            messages: Chat messages in order
+            budget: Maximum tokens the messages may take
+            keep_first: Number of leading messages that are always kept
+        
+        Returns:
+            Messages that fit, in their original order
+        """
+        head = messages[:keep_first]
+        remaining = budget - self.count_messages(head)
+        tail = []
+        for message in reversed(messages[keep_first:]):
+            tokens = self.counter.count_message(message)
+            if tokens > remaining:
+                break
+            tail.append(message)
+            remaining -= tokens
+        
+        dropped = len(messages) - len(head) - len(tail)
+        if dropped:
+            logger.debug(f"Dropped {dropped} of {len(messages)} messages to fit {budget} tokens")
+        return head + tail[::-1]
+    
+    def fit_output(self, prompt_tokens: int, max_tokens: int) -> int:
+        """
+        Response length that fits next to a prompt in the context window
+        
+        Args:
+            prompt_tokens: Tokens of the full prompt
+            max_tokens: Requested maximum response length
+        
+        Returns:
+            max_tokens, lowered if the prompt leaves less room, but never below MIN_OUTPUT_TOKENS
+        """
+        available = self.context_window - prompt_tokens - self.safety_margin
+        if available < max_tokens:
+            logger.warning(f"Prompt of {prompt_tokens} tokens leaves {max(available, 0)} of {max_tokens} response tokens in a {self.context_window} token context")
+        return max(min(max_tokens, available), MIN_OUTPUT_TOKENS)
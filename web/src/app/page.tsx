@@ -16,6 +16,8 @@ export default function Home() {
     isDiscussing, 
     messages, 
     consensus, 
+    queue,
+    convergence,
     startDiscussion, 
     resetDiscussion 
   } = useDiscussionStore();
@@ -55,6 +57,8 @@ export default function Home() {
               messages={messages} 
               isLoading={isLoading} 
               isDiscussing={isDiscussing} 
+              queue={Object.values(queue)}
+              convergence={convergence}
             />
           </div>
           
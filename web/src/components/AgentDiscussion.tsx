@@ -1,18 +1,22 @@
 import React, { useEffect, useRef } from "react";
 import { UI_CONSTANTS, AGENT_CONSTANTS } from "../constants";
-import { Message } from "../types/discussion";
+import { Convergence, Message, QueueStatus } from "../types/discussion";
 import ReactMarkdown from "react-markdown";
 
 interface AgentDiscussionProps {
   messages: Message[];
   isLoading: boolean;
   isDiscussing: boolean;
+  queue: QueueStatus[];
+  convergence: Convergence | null;
 }
 
 const AgentDiscussion: React.FC<AgentDiscussionProps> = ({
   messages,
   isLoading,
   isDiscussing,
+  queue,
+  convergence,
 }) => {
   const messagesEndRef = useRef<HTMLDivElement>(null);
   const messagesContainerRef = useRef<HTMLDivElement>(null);
@@ -24,6 +28,11 @@ const AgentDiscussion: React.FC<AgentDiscussionProps> = ({
     }
   }, [messages]);
 
+  // Closest place in line of any request still waiting for a model server
+  const queuePosition = queue.length > 0
+    ? Math.min(...queue.map(status => status.position))
+    : null;
+
   const getAgentAvatar = (agentName: string) => {
     const lowerName = agentName.toLowerCase();
     for (const [key, value] of Object.entries(AGENT_CONSTANTS.AVATARS)) {
@@ -78,6 +87,11 @@ const AgentDiscussion: React.FC<AgentDiscussionProps> = ({
               <div className="prose prose-sm max-w-none" style={{ color: "var(--text-primary)" }}>
                 <ReactMarkdown>{message.content}</ReactMarkdown>
               </div>
+              {message.error && (
+                <div className="text-sm mt-1 text-red-600 dark:text-red-400">
+                  {UI_CONSTANTS.AGENT_ERROR_MESSAGE} {message.error}
+                </div>
+              )}
               <div className="text-xs mt-1" style={{ color: "var(--text-secondary)" }}>
                 {new Date(message.timestamp).toLocaleTimeString()}
               </div>
@@ -87,11 +101,19 @@ const AgentDiscussion: React.FC<AgentDiscussionProps> = ({
           
         ))}
 
+        {convergence && (
+          <div className="text-sm text-center" style={{ color: "var(--text-secondary)" }}>
+            {UI_CONSTANTS.CONVERGED_MESSAGE} {convergence.round}: {convergence.description}
+          </div>
+        )}
+
         {isDiscussing && (
           <div className="flex items-center p-3 bg-blue-50 dark:bg-blue-900/30 rounded-lg animate-pulse">
             <div className="mr-3 text-2xl">💭</div>
             <div style={{ color: "var(--primary)" }}>
-              {UI_CONSTANTS.THINKING_MESSAGE}
+              {queuePosition !== null
+                ? `${UI_CONSTANTS.QUEUED_MESSAGE} ${queuePosition}`
+                : UI_CONSTANTS.THINKING_MESSAGE}
             </div>
           </div>
         )}
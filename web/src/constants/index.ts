@@ -7,6 +7,9 @@ export const UI_CONSTANTS = {
   RESET_BUTTON: "Reset Discussion",
   LOADING_MESSAGE: "Initializing agents...",
   THINKING_MESSAGE: "Agents are discussing...",
+  QUEUED_MESSAGE: "Waiting for a model server, position",
+  CONVERGED_MESSAGE: "Agents converged after round",
+  AGENT_ERROR_MESSAGE: "This agent could not respond:",
   AGENT_SECTION_TITLE: "Agent Dialogue",
   CONSENSUS_SECTION_TITLE: "Final Consensus",
   DEFAULT_ERROR_MESSAGE: "An error occurred while communicating with the agents."
@@ -20,9 +23,19 @@ export const API_CONSTANTS = {
     GET_AGENTS: "/agents",
     GET_DISCUSSION: "/discussions/",
   },
+  RECONNECT_DELAY_MS: 1000,
+  MAX_RECONNECT_ATTEMPTS: 5,
   MESSAGE_TYPES: {
     QUERY: "query",
+    RESUME: "resume",
+    CANCEL: "cancel",
+    DISCUSSION_STARTED: "discussion_started",
+    DISCUSSION_CANCELLED: "discussion_cancelled",
     AGENT_MESSAGE: "agent_message",
+    AGENT_TOKEN: "agent_token",
+    QUEUE_STATUS: "queue_status",
+    AGENT_ERROR: "agent_error",
+    CONVERGED: "converged",
     CONSENSUS: "consensus",
     ERROR: "error"
   }
@@ -1,123 +1,364 @@
 import { create } from "zustand";
-import { Message } from "../types/discussion";
+import { Convergence, Message, QueueStatus } from "../types/discussion";
 import { API_CONSTANTS, UI_CONSTANTS } from "../constants";
 
 interface DiscussionState {
   discussionId: string | null;
+  lastSeq: number;
   isLoading: boolean;
   isDiscussing: boolean;
   messages: Message[];
   consensus: string | null;
+  queue: Record<string, QueueStatus>;
+  convergence: Convergence | null;
   error: string | null;
   websocket: WebSocket | null;
   startDiscussion: (query: string, systemInstruction?: string) => Promise<void>;
   resetDiscussion: () => void;
 }
 
-export const useDiscussionStore = create<DiscussionState>((set, get) => ({
-  discussionId: null,
-  isLoading: false,
-  isDiscussing: false,
-  messages: [],
-  consensus: null,
-  error: null,
-  websocket: null,
+// Forget the queue position of a request once it is dispatched or its response starts
+const dequeue = (queue: Record<string, QueueStatus>, key: string) => {
+  if (!(key in queue)) {
+    return queue;
+  }
+  const rest = { ...queue };
+  delete rest[key];
+  return rest;
+};
 
-  startDiscussion: async (query: string, systemInstruction?: string) => {
-    try {
-      set({ 
-        isLoading: true, 
-        error: null, 
-        messages: [], 
-        consensus: null 
-      });
-      
-      // Close existing WebSocket connection if any
-      const currentWs = get().websocket;
-      if (currentWs) {
-        currentWs.close();
-      }
-      
-      // Create new WebSocket connection
-      const ws = new WebSocket(API_CONSTANTS.WEBSOCKET_URL);
-      
-      ws.onopen = () => {
-        ws.send(JSON.stringify({
-          type: API_CONSTANTS.MESSAGE_TYPES.QUERY,
-          data: {
-            query,
-            systemInstruction: systemInstruction || undefined
+export const useDiscussionStore = create<DiscussionState>((set, get) => {
+  // Set while a resume request awaits its first update, so its errors fall back to the stored discussion
+  let resuming = false;
+
+  // Stop the running discussion on the server rather than leaving it to finish unseen
+  const cancelDiscussion = () => {
+    const { websocket, discussionId, isDiscussing } = get();
+    if (websocket && websocket.readyState === WebSocket.OPEN && isDiscussing) {
+      // Without an id, which the server has not sent yet, every discussion of the connection is cancelled
+      websocket.send(JSON.stringify({
+        type: API_CONSTANTS.MESSAGE_TYPES.CANCEL,
+        data: { discussionId: discussionId || undefined }
+      }));
+    }
+  };
+
+  // Stop using a connection without letting its close trigger a reconnect
+  const disconnect = () => {
+    const currentWs = get().websocket;
+    set({ websocket: null });
+    if (currentWs) {
+      currentWs.close();
+    }
+  };
+
+  const handleMessage = (data: any) => {
+    if (data.type === API_CONSTANTS.MESSAGE_TYPES.DISCUSSION_STARTED) {
+      set({ discussionId: data.data.discussion_id });
+    }
+    else if (data.type === API_CONSTANTS.MESSAGE_TYPES.QUEUE_STATUS) {
+      const key = data.data.message_id || data.data.stage;
+      set(state => {
+        if (data.data.position === 0) {
+          return { queue: dequeue(state.queue, key) };
+        }
+        return {
+          queue: {
+            ...state.queue,
+            [key]: {
+              stage: data.data.stage,
+              agentName: data.data.agent_name,
+              position: data.data.position,
+              waitMs: data.data.wait_ms
+            }
           }
-        }));
-        
-        set({ 
-          isLoading: false,
-          isDiscussing: true,
-          websocket: ws
-        });
-      };
-      
-      ws.onmessage = (event) => {
-        const data = JSON.parse(event.data);
-        
-        if (data.type === API_CONSTANTS.MESSAGE_TYPES.AGENT_MESSAGE) {
-          set(state => ({
+        };
+      });
+    }
+    else if (data.type === API_CONSTANTS.MESSAGE_TYPES.AGENT_TOKEN) {
+      set(state => {
+        const queue = dequeue(state.queue, data.data.message_id);
+        const index = state.messages.findIndex(m => m.messageId === data.data.message_id);
+        if (index === -1) {
+          return {
+            queue,
             messages: [...state.messages, {
+              messageId: data.data.message_id,
               agentName: data.data.agent_id,
-              content: data.data.content,
+              content: data.data.delta,
               timestamp: Date.now()
             }]
-          }));
-        } 
-        else if (data.type === API_CONSTANTS.MESSAGE_TYPES.CONSENSUS) {
-          set({ 
-            consensus: data.data.content,
-            isDiscussing: false
-          });
+          };
         }
-        else if (data.type === API_CONSTANTS.MESSAGE_TYPES.ERROR) {
-          set({ 
-            error: data.data.message,
-            isDiscussing: false
-          });
+        const messages = [...state.messages];
+        messages[index] = {
+          ...messages[index],
+          content: messages[index].content + data.data.delta
+        };
+        return { queue, messages };
+      });
+    }
+    else if (data.type === API_CONSTANTS.MESSAGE_TYPES.AGENT_MESSAGE) {
+      set(state => {
+        const queue = dequeue(state.queue, data.data.message_id);
+        const message = {
+          messageId: data.data.message_id,
+          agentName: data.data.agent_id,
+          content: data.data.content,
+          timestamp: Date.now()
+        };
+        const index = state.messages.findIndex(m => m.messageId === data.data.message_id);
+        if (index === -1) {
+          return { queue, messages: [...state.messages, message] };
+        }
+        const messages = [...state.messages];
+        messages[index] = message;
+        return { queue, messages };
+      });
+    }
+    else if (data.type === API_CONSTANTS.MESSAGE_TYPES.AGENT_ERROR) {
+      // Keep whatever the agent streamed before it failed and show why it stopped
+      set(state => {
+        const queue = dequeue(state.queue, data.data.message_id);
+        const index = state.messages.findIndex(m => m.messageId === data.data.message_id);
+        if (index === -1) {
+          return {
+            queue,
+            messages: [...state.messages, {
+              messageId: data.data.message_id,
+              agentName: data.data.agent_id,
+              content: "",
+              timestamp: Date.now(),
+              error: data.data.message
+            }]
+          };
+        }
+        const messages = [...state.messages];
+        messages[index] = { ...messages[index], error: data.data.message };
+        return { queue, messages };
+      });
+    }
+    else if (data.type === API_CONSTANTS.MESSAGE_TYPES.CONVERGED) {
+      set({
+        convergence: {
+          round: data.data.round,
+          skippedRounds: data.data.skipped_rounds,
+          description: data.data.description
+        }
+      });
+    }
+    else if (data.type === API_CONSTANTS.MESSAGE_TYPES.CONSENSUS) {
+      set({
+        consensus: data.data.content,
+        queue: {},
+        isDiscussing: false
+      });
+    }
+    else if (data.type === API_CONSTANTS.MESSAGE_TYPES.DISCUSSION_CANCELLED) {
+      set({
+        queue: {},
+        isDiscussing: false
+      });
+    }
+    else if (data.type === API_CONSTANTS.MESSAGE_TYPES.ERROR) {
+      const discussionId = get().discussionId;
+      if (resuming && !data.discussion_id && discussionId) {
+        // Updates the server no longer buffers are read from the stored discussion instead
+        resuming = false;
+        loadDiscussion(discussionId);
+        return;
+      }
+      set({
+        error: data.data.message,
+        queue: {},
+        isDiscussing: false
+      });
+    }
+  };
+
+  // Merge the stored state of a discussion, for updates that can no longer be replayed
+  const loadDiscussion = async (discussionId: string) => {
+    try {
+      const response = await fetch(
+        `${API_CONSTANTS.HTTP_BASE_URL}${API_CONSTANTS.ENDPOINTS.GET_DISCUSSION}${discussionId}`
+      );
+      if (!response.ok) {
+        throw new Error(response.statusText);
+      }
+      const discussion = await response.json();
+      if (get().discussionId !== discussionId) {
+        return;
+      }
+
+      const finished = discussion.status !== "pending" && discussion.status !== "in_progress";
+      set(state => {
+        const stored: Message[] = discussion.messages.map((m: any) => ({
+          messageId: m.message_id,
+          agentName: m.agent_id,
+          content: m.content,
+          timestamp: m.timestamp
+        }));
+        const storedIds = new Set(stored.map(m => m.messageId));
+        return {
+          // Messages still being streamed are not stored yet, so keep them
+          messages: [...stored, ...state.messages.filter(m => !storedIds.has(m.messageId))],
+          consensus: discussion.consensus ?? state.consensus,
+          queue: finished ? {} : state.queue,
+          isDiscussing: state.isDiscussing && !finished
+        };
+      });
+      if (finished) {
+        disconnect();
+      }
+    } catch (error) {
+      set({
+        error: UI_CONSTANTS.DEFAULT_ERROR_MESSAGE,
+        queue: {},
+        isDiscussing: false
+      });
+    }
+  };
+
+  // Open a connection that sends its first message with onOpen and resumes the discussion if it drops
+  const connect = (onOpen: (ws: WebSocket) => void, attempt: number = 0) => {
+    const ws = new WebSocket(API_CONSTANTS.WEBSOCKET_URL);
+    let opened = false;
+
+    ws.onopen = () => {
+      opened = true;
+      onOpen(ws);
+    };
+
+    ws.onmessage = (event) => {
+      if (get().websocket !== ws) {
+        return;
+      }
+      const data = JSON.parse(event.data);
+
+      if (typeof data.seq === "number") {
+        resuming = false;
+        // A resumed connection can replay updates that arrived just before the old one dropped
+        if (data.seq <= get().lastSeq) {
+          return;
+        }
+        set({ lastSeq: data.seq });
+      }
+      handleMessage(data);
+    };
+
+    // A failed connection also closes, and onclose decides whether to try again
+    ws.onerror = () => {};
+
+    ws.onclose = () => {
+      if (get().websocket !== ws) {
+        return;
+      }
+      const { isDiscussing, discussionId } = get();
+      const nextAttempt = opened ? 1 : attempt + 1;
+      if (isDiscussing && discussionId && nextAttempt <= API_CONSTANTS.MAX_RECONNECT_ATTEMPTS) {
+        setTimeout(() => resumeDiscussion(discussionId, nextAttempt), API_CONSTANTS.RECONNECT_DELAY_MS * nextAttempt);
+        return;
+      }
+
+      const lost = get().isLoading || isDiscussing;
+      set(state => ({
+        error: lost ? UI_CONSTANTS.DEFAULT_ERROR_MESSAGE : state.error,
+        isLoading: false,
+        isDiscussing: false,
+        websocket: null
+      }));
+    };
+
+    set({ websocket: ws });
+  };
+
+  // Reconnect to a running discussion and ask for the updates after the last one received
+  const resumeDiscussion = (discussionId: string, attempt: number) => {
+    if (get().discussionId !== discussionId || !get().isDiscussing) {
+      return;
+    }
+    connect(ws => {
+      resuming = true;
+      ws.send(JSON.stringify({
+        type: API_CONSTANTS.MESSAGE_TYPES.RESUME,
+        data: {
+          discussionId,
+          lastSeq: get().lastSeq
         }
-      };
-      
-      ws.onerror = () => {
-        set({ 
+      }));
+    }, attempt);
+  };
+
+  return {
+    discussionId: null,
+    lastSeq: 0,
+    isLoading: false,
+    isDiscussing: false,
+    messages: [],
+    consensus: null,
+    queue: {},
+    convergence: null,
+    error: null,
+    websocket: null,
+
+    startDiscussion: async (query: string, systemInstruction?: string) => {
+      try {
+        // Cancel the previous discussion and close its WebSocket connection if any
+        cancelDiscussion();
+        disconnect();
+
+        set({
+          discussionId: null,
+          lastSeq: 0,
+          isLoading: true,
+          error: null,
+          messages: [],
+          consensus: null,
+          queue: {},
+          convergence: null
+        });
+
+        // Create new WebSocket connection
+        connect(ws => {
+          ws.send(JSON.stringify({
+            type: API_CONSTANTS.MESSAGE_TYPES.QUERY,
+            data: {
+              query,
+              systemInstruction: systemInstruction || undefined
+            }
+          }));
+
+          set({
+            isLoading: false,
+            isDiscussing: true
+          });
+        });
+
+      } catch (error) {
+        set({
           error: UI_CONSTANTS.DEFAULT_ERROR_MESSAGE,
           isLoading: false,
           isDiscussing: false
         });
-      };
-      
-      ws.onclose = () => {
-        set({ isDiscussing: false });
-      };
-      
-    } catch (error) {
-      set({ 
-        error: UI_CONSTANTS.DEFAULT_ERROR_MESSAGE,
+      }
+    },
+
+    resetDiscussion: () => {
+      cancelDiscussion();
+      disconnect();
+
+      set({
+        discussionId: null,
+        lastSeq: 0,
         isLoading: false,
-        isDiscussing: false
+        isDiscussing: false,
+        messages: [],
+        consensus: null,
+        queue: {},
+        convergence: null,
+        error: null,
+        websocket: null
       });
     }
-  },
-  
-  resetDiscussion: () => {
-    const currentWs = get().websocket;
-    if (currentWs) {
-      currentWs.close();
-    }
-    
-    set({
-      discussionId: null,
-      isLoading: false,
-      isDiscussing: false,
-      messages: [],
-      consensus: null,
-      error: null,
-      websocket: null
-    });
-  }
-}));
+  };
+});
@@ -1,7 +1,22 @@
 export interface Message {
+  messageId?: string;
   agentName: string;
   content: string;
   timestamp: number;
+  error?: string;
+}
+
+export interface QueueStatus {
+  stage: 'agent' | 'consensus';
+  agentName?: string;
+  position: number;
+  waitMs: number;
+}
+
+export interface Convergence {
+  round: number;
+  skippedRounds: number;
+  description: string;
 }
 
 export interface Discussion {